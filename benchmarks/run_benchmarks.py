@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+#
+# Filename: run_benchmarks.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: Time the hot paths of the library against SutaBleSimulator, and compare with a baseline.
+#
+#   python benchmarks/run_benchmarks.py --output bench.json
+#   python benchmarks/run_benchmarks.py --baseline bench.json
+#
+#   Every result is in seconds per operation, so lower is better. The simulated link has no
+#   latency, so what is measured is the library's own overhead. Results over the budgets
+#   documented in the library fail the run, whether or not there is a baseline.
+#
+
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bleak import AdvertisementData
+from bleak.backends.device import BLEDevice
+
+from suta_ble_bed.suta_ble_consts import BED_LOCAL_NAME, BedCommands
+from suta_ble_bed.suta_ble_scanner import SutaBleScanner
+from suta_ble_bed.suta_ble_simulator import SutaBleSimulator
+from suta_ble_bed.suta_ble_sync import SutaBleSyncClient
+from suta_ble_bed.suta_ble_trace import SutaBleTraceRecorder
+
+# How much slower than the baseline a result may be before it counts as a regression
+DEFAULT_TOLERANCE = 0.25
+# Most seconds per operation. The scanner's are documented in suta_ble_bed.suta_ble_scanner.
+# Importing the CLI is mostly argparse and logging; anything which pulls in bleak or asyncio blows it.
+BUDGETS = {
+    "scanner_advertisement": 5e-6,
+    "scanner_new_bed": 50e-6,
+    "cli_import": 0.15,
+}
+
+def bench_scanner_advertisements(devices: int = 5000, beds: int = 100, recorded: bool = False) -> float:
+    '''
+    Seconds per advertisement through SutaBleScanner's discovery callback,
+    with a crowd of other devices around a few beds.
+
+    @param recorded: Also record every advertisement to a trace
+    '''
+    with tempfile.TemporaryDirectory() as directory:
+        recorder = SutaBleTraceRecorder(os.path.join(directory, "trace.bin")) if recorded else None
+        try:
+            return _scanner_advertisements(SutaBleScanner(None, max_pending=beds, recorder=recorder), devices, beds)
+        finally:
+            if recorder is not None:
+                recorder.close()
+
+def _scanner_advertisements(scanner: SutaBleScanner, devices: int, beds: int) -> float:
+    advertisements = []
+    for index in range(devices):
+        address = ":".join(f"{byte:02X}" for byte in index.to_bytes(6, "big"))
+        name = BED_LOCAL_NAME if index < beds else f"Device {index}"
+        advertisements.append((BLEDevice(address, name, None), AdvertisementData(name, {}, {}, [], None, -70, ())))
+
+    callback = scanner._scanner_discovery_callback
+    start = time.perf_counter()
+    for _ in range(3):
+        for device, advertisement in advertisements:
+            callback(device, advertisement)
+    return (time.perf_counter() - start) / (3 * devices)
+
+def bench_scanner_new_beds(beds: int = 1000) -> float:
+    '''
+    Seconds per bed to discover a fleet of beds, all at once.
+    '''
+    scanner = SutaBleScanner(None)
+    advertisements = [
+        (BLEDevice(":".join(f"{byte:02X}" for byte in index.to_bytes(6, "big")), BED_LOCAL_NAME, None),
+         AdvertisementData(BED_LOCAL_NAME, {}, {}, [], None, -70, ()))
+        for index in range(beds)
+    ]
+    callback = scanner._scanner_discovery_callback
+    logging.disable(logging.WARNING)
+    try:
+        start = time.perf_counter()
+        for device, advertisement in advertisements:
+            callback(device, advertisement)
+        return (time.perf_counter() - start) / beds
+    finally:
+        logging.disable(logging.NOTSET)
+
+async def bench_first_bed() -> float:
+    '''
+    Seconds from entering the controller until the first bed is handed out.
+    '''
+    simulator = SutaBleSimulator()
+    simulator.add_bed("AA:BB:CC:DD:EE:01")
+    start = time.perf_counter()
+    async with simulator.controller() as controller:
+        await controller.get_bed()
+        return time.perf_counter() - start
+
+async def bench_write(connected: bool, writes: int = 200) -> float:
+    '''
+    Seconds per _write, either over an existing connection or connecting for each one.
+    '''
+    simulator = SutaBleSimulator()
+    simulator.add_bed("AA:BB:CC:DD:EE:01")
+    async with simulator.controller() as controller:
+        bed = await controller.get_bed()
+        await bed.flat()
+        elapsed = 0.0
+        for _ in range(writes):
+            if not connected:
+                # As if the idle timeout had closed the connection
+                bed._expected_disconnect = True
+                simulator.disconnect(bed.device.address)
+            start = time.perf_counter()
+            await bed._write_command(BedCommands.THREE_BEEP1)
+            elapsed += time.perf_counter() - start
+        return elapsed / writes
+
+async def bench_lock_contention(callers: int = 50) -> float:
+    '''
+    Seconds per command when many callers send to the same bed at once.
+    Commands alternate, so that the queue cannot merge them.
+    '''
+    simulator = SutaBleSimulator()
+    simulator.add_bed("AA:BB:CC:DD:EE:01")
+    async with simulator.controller() as controller:
+        bed = await controller.get_bed()
+        await bed.flat()
+        commands = [BedCommands.VIBRATE_HEAD, BedCommands.VIBRATE_FEET] * (callers // 2)
+        start = time.perf_counter()
+        await asyncio.gather(*(bed.send_command(command) for command in commands))
+        return (time.perf_counter() - start) / len(commands)
+
+def bench_sync_client(threads: int = 8, commands: int = 400) -> float:
+    '''
+    Seconds per command sent through SutaBleSyncClient, from several threads at once.
+    '''
+    simulator = SutaBleSimulator()
+    simulator.add_bed("AA:BB:CC:DD:EE:01")
+    with SutaBleSyncClient(simulator.controller) as client:
+        client.send_command(BedCommands.FLAT).result()
+        commands_per_thread = [[BedCommands.VIBRATE_HEAD, BedCommands.VIBRATE_FEET] * (commands // threads // 2)] * threads
+
+        def send(commands: list[BedCommands]) -> None:
+            for command in commands:
+                client.send_command(command).result()
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            start = time.perf_counter()
+            list(executor.map(send, commands_per_thread))
+            return (time.perf_counter() - start) / commands
+
+def bench_asyncio_run_per_command(commands: int = 20) -> float:
+    '''
+    Seconds per command for a synchronous caller without SutaBleSyncClient,
+    which needs a new event loop, scan and connection every time.
+    '''
+    simulator = SutaBleSimulator()
+    simulator.add_bed("AA:BB:CC:DD:EE:01")
+
+    async def send() -> None:
+        async with simulator.controller() as controller:
+            bed = await controller.get_bed()
+            await bed.send_command(BedCommands.FLAT)
+
+    start = time.perf_counter()
+    for _ in range(commands):
+        asyncio.run(send())
+    return (time.perf_counter() - start) / commands
+
+def bench_cli_help() -> float:
+    '''
+    Seconds for the CLI to start, print its help and exit.
+    '''
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "suta_ble_bed", "--help"], check=True, stdout=subprocess.DEVNULL,
+                   cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return time.perf_counter() - start
+
+def bench_cli_import() -> float:
+    '''
+    Seconds to import suta_ble_bed.cli in a new interpreter, as measured by -X importtime.
+    '''
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import suta_ble_bed.cli"],
+                            check=True, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    cumulative = re.search(r"\|\s*(\d+) \| suta_ble_bed\.cli$", result.stderr, re.MULTILINE)
+    return int(cumulative.group(1)) / 1e6
+
+BENCHMARKS = {
+    "scanner_advertisement": bench_scanner_advertisements,
+    "scanner_advertisement_recorded": lambda: bench_scanner_advertisements(recorded=True),
+    "scanner_new_bed": bench_scanner_new_beds,
+    "first_bed": lambda: asyncio.run(bench_first_bed()),
+    "write_connected": lambda: asyncio.run(bench_write(connected=True)),
+    "write_reconnecting": lambda: asyncio.run(bench_write(connected=False)),
+    "lock_contention": lambda: asyncio.run(bench_lock_contention()),
+    "sync_client": bench_sync_client,
+    "asyncio_run_per_command": bench_asyncio_run_per_command,
+    "cli_help": bench_cli_help,
+    "cli_import": bench_cli_import,
+}
+
+def run(names: list[str], rounds: int) -> dict:
+    results = {}
+    for name in names:
+        samples = [BENCHMARKS[name]() for _ in range(rounds)]
+        results[name] = {
+            "median": statistics.median(samples),
+            "min": min(samples),
+            "rounds": rounds,
+        }
+        print(f"{name:32} {results[name]['median'] * 1e6:12.1f} us")
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.time(),
+        "results": results,
+    }
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    '''
+    @return: A description of every benchmark which got slower than the tolerance allows
+    '''
+    regressions = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None or not before["median"]:
+            continue
+        ratio = result["median"] / before["median"]
+        print(f"{name:32} {ratio:6.2f}x baseline")
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name} is {ratio:.2f}x slower than the baseline")
+    return regressions
+
+def over_budget(current: dict) -> list[str]:
+    '''
+    @return: A description of every benchmark which took longer than its budget
+    '''
+    return [
+        f"{name} took {current['results'][name]['median'] * 1e6:.1f} us, over its budget of {budget * 1e6:.1f} us"
+        for name, budget in BUDGETS.items()
+        if name in current["results"] and current["results"][name]["median"] > budget
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the suta_ble_bed hot paths against a simulated Bluetooth stack.")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with results saved by an earlier --output, and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Fraction slower than the baseline which still passes")
+    parser.add_argument("--rounds", type=int, default=5, help="Times to run each benchmark. The median is kept.")
+    parser.add_argument("benchmarks", nargs="*", metavar="benchmark",
+                        help=f"Benchmarks to run, out of {', '.join(BENCHMARKS)}. Defaults to all of them.")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    # Dropped connections are logged as warnings, which would drown out the results
+    logging.disable(logging.WARNING)
+
+    current = run(args.benchmarks or list(BENCHMARKS), args.rounds)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(current, output, indent=2)
+
+    regressions = over_budget(current)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions += compare(current, json.load(baseline), args.tolerance)
+    if regressions:
+        parser.exit(1, "\n".join(regressions) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,7 @@ with open('README.rst') as readme_file:
 with open('HISTORY.rst') as history_file:
     history = history_file.read()
 
-requirements = [ "bleak>=0.19.5", "bleak_retry_connector>=3.0.0" ]
+requirements = [ "bleak>=0.19.5", "bleak_retry_connector>=3.0.0", "tomli; python_version < '3.11'" ]
 
 test_requirements = [ ]
 
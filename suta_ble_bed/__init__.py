@@ -8,10 +8,16 @@
 #
 #
 
-from .suta_ble_bed import BleSutaBed
-
 __all__ = ('BleSutaBed',)
 
+def __getattr__(name):
+    # Importing BleSutaBed pulls in bleak, so only do it when somebody asks for it.
+    # This keeps "import suta_ble_bed.cli" cheap.
+    if name == 'BleSutaBed':
+        from .suta_ble_bed import BleSutaBed
+        return BleSutaBed
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 __author__ = """Simon Redman"""
 __email__ = 'simon@ergotech.com'
 __version__ = '0.3.6'
@@ -7,65 +7,173 @@
 # Description: Scuffed CLI to control your bed. Mostly for testing.
 #
 
-import asyncio
 import argparse
 from argparse import Namespace
 import logging
 
-from .suta_ble_bed import BleSutaBed
-from .suta_ble_bed_controller import SutaBleBedController
+# Only what is needed to parse arguments and talk to a daemon is imported up front.
+# The Bluetooth stack is imported by worker() and serve(), once it is actually needed.
 from .suta_ble_consts import BedCommands
+from .suta_ble_daemon_client import ALL_BEDS, DEFAULT_SOCKET_PATH, DaemonError, command_from_name, command_name, send_requests
 
 logger = logging.getLogger(__name__)
 
-async def worker(args: Namespace):
+async def worker(args: Namespace) -> bool:
+    import asyncio
+    from .suta_ble_bed_controller import SutaBleBedController
+    from .suta_ble_device_cache import SutaBleDeviceCache
 
-    async with SutaBleBedController() as controller:
-        async for bed in controller.devices():
+    command = command_from_name(args.command)
+    async with SutaBleBedController(device_cache=SutaBleDeviceCache()) as controller:
+        if args.all:
+            # Give every bed in range a chance to advertise
+            await asyncio.sleep(args.scan_time)
+            beds = controller.devices().beds()
+        elif args.MAC:
+            # Beds we have connected to before don't need to be discovered first
+            beds = await asyncio.gather(*(controller.get_bed(mac) for mac in args.MAC))
+        else:
+            bed = await controller.get_bed()
             logger.info(f"Discovered {bed.device}")
+            beds = [bed]
 
-            if (args.MAC is None or bed.device.address == args.MAC):
-                match args.command:
-                    case "feet-up":
-                        await bed.raise_feet()
-                    case "feet-down":
-                        await bed.lower_feet()
-                    case "head-up":
-                        await bed.raise_head()
-                    case "head-down":
-                        await bed.lower_head()
-                    case "vibrate-head":
-                        await bed.vibrate_head()
-                    case "vibrate-feet":
-                        await bed.vibrate_feet()
-                    case "zero-gravity":
-                        await bed.zero_gravity()
-                    case "flat":
-                        await bed.flat()
-                    case "lounge":
-                        await bed.lounge()
-                break
-            else:
-                logger.info(f"Skipping because MAC did not match.")
+        results = await controller.fan_out(command, beds)
+
+    for result in results:
+        if result.error is not None:
+            logger.error(f"{result.bed.device.address}: {result.error}")
+        else:
+            logger.info(f"{result.bed.device.address}: Done in {result.elapsed:.2f}s")
+    return bool(results) and all(result.error is None for result in results)
+
+async def serve(args: Namespace):
+    from .suta_ble_bed_controller import SutaBleBedController
+    from .suta_ble_daemon import SutaBleDaemon
+    from .suta_ble_device_cache import SutaBleDeviceCache
+    from .suta_ble_metrics import SutaBleMetricsExporter
+    from .suta_ble_prewarm import PrewarmPolicy
+    from .suta_ble_trace import SutaBleTraceRecorder
+
+    recorder = SutaBleTraceRecorder(args.trace) if args.trace else None
+    try:
+        # Keep connections open for as long as the daemon runs, so commands never wait for a connection
+        async with SutaBleBedController(
+            idle_timeout=None,
+            device_cache=SutaBleDeviceCache(),
+            prewarm_policy=PrewarmPolicy(on_discovery=args.prewarm),
+            recorder=recorder,
+        ) as controller:
+            exporter = None
+            if args.metrics_port is not None:
+                exporter = SutaBleMetricsExporter(controller.metrics, port=args.metrics_port)
+                await exporter.start()
+            try:
+                async with SutaBleDaemon(controller, socket_path=args.socket) as daemon:
+                    await daemon.serve_forever()
+            finally:
+                if exporter is not None:
+                    await exporter.close()
+    finally:
+        if recorder is not None:
+            recorder.close()
+
+def client(args: Namespace) -> bool:
+    '''
+    Hand the command to a running daemon.
+
+    @return: False if there is no daemon to talk to
+    @raise DaemonError: If the daemon could not send the command to every bed
+    '''
+    if args.all:
+        addresses = [ALL_BEDS]
+    else:
+        addresses = args.MAC or [None]
+
+    try:
+        results = send_requests(command_from_name(args.command), addresses, socket_path=args.socket)
+    except OSError:
+        logger.debug("No daemon listening on %s", args.socket)
+        return False
+    errors = [error for error in results if error is not None]
+    if errors:
+        raise DaemonError("; ".join(errors))
+    return True
 
 def main():
     parser = argparse.ArgumentParser(
         prog="SUTA BLE Control",
         description="Control your Bluetooth-enabled SUTA (and other) bed.")
 
-    parser.add_argument(
+    targets = parser.add_mutually_exclusive_group()
+    targets.add_argument(
         "--MAC",
-        required=False,
-        help="MAC Address of your bed. May be ommitted, in which case we will attempt auto-discovery.")
-    
+        action="append",
+        help="MAC Address of your bed. May be given several times to control several beds at once. "
+             "May be ommitted, in which case we will attempt auto-discovery.")
+
+    targets.add_argument(
+        "--all",
+        action="store_true",
+        help="Send the command to every bed in range.")
+
+    parser.add_argument(
+        "--scan-time",
+        type=float,
+        default=5.0,
+        help="With --all, seconds to listen for beds before sending the command.")
+
+    parser.add_argument(
+        "--socket",
+        default=DEFAULT_SOCKET_PATH,
+        help="Control socket of the daemon started by 'serve'.")
+
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="With serve, expose metrics for Prometheus on this port of localhost.")
+
+    parser.add_argument(
+        "--prewarm",
+        action="store_true",
+        help="With serve, connect to every bed as soon as it is discovered, rather than on its first command.")
+
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="With serve, append everything sent to and received from the beds to this file. "
+             "Replay it with 'python -m suta_ble_bed.suta_ble_trace FILE'.")
+
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Talk to the bed directly, even if a daemon is running.")
+
     parser.add_argument(
         "command",
-        choices=[command.name.lower().replace("_", "-") for command in BedCommands],
-        help="Action to perform")
-    
+        choices=[command_name(command) for command in BedCommands] + ["serve"],
+        help="Action to perform, or 'serve' to run a daemon which keeps the beds connected")
+
     args = parser.parse_args()
-    
-    asyncio.run(worker(args))
+
+    if args.command != "serve" and not args.no_daemon:
+        try:
+            if client(args):
+                return
+        except DaemonError as e:
+            parser.exit(1, f"{parser.prog}: {e}\n")
+
+    # Nobody to hand the command to, so we need the Bluetooth stack after all
+    import asyncio
+
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if not asyncio.run(worker(args)):
+        parser.exit(1, f"{parser.prog}: Failed to send {args.command}\n")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
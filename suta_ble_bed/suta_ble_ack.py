@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_ack.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: Send commands over the ACK_CMD service, and wait for the bed to acknowledge them
+#
+#   Frames written to ACK_CMD_CMD are acknowledged by the bed notifying the same frame on
+#   ACK_CMD_ACK. Frames carry no sequence number, so acknowledgements are matched to the
+#   oldest unacknowledged frame with the same opcode.
+#
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+import logging
+import typing
+
+from bleak import BleakClient, BleakError
+from bleak.backends.characteristic import BleakGATTCharacteristic
+
+from .suta_ble_codec import COMMAND_FRAMES, FrameError, decode_all, opcode
+from .suta_ble_consts import BedCharacteristic, BedCommands, BedServices
+
+if typing.TYPE_CHECKING:
+    from .suta_ble_bed import BleSutaBed
+
+logger = logging.getLogger(__name__)
+
+# How many commands may be waiting for an acknowledgement at once
+DEFAULT_ACK_WINDOW = 4
+# Seconds to wait for an acknowledgement before sending the frame again
+DEFAULT_ACK_TIMEOUT = 1.0
+DEFAULT_ACK_RETRIES = 2
+
+class AckTimeoutError(BleakError):
+    '''
+    Raised when the bed did not acknowledge a command, even after retransmitting it.
+    '''
+
+class SutaBleAckChannel:
+    '''
+    Acknowledged commands for one bed.
+
+    Up to window commands are in flight at once, rather than waiting for each
+    acknowledgement before writing the next frame. A frame which is not acknowledged
+    within timeout is written again, up to max_retries times.
+
+    Beware that a retransmitted notch command moves the bed twice if it was only the
+    acknowledgement which got lost.
+    '''
+
+    def __init__(
+        self,
+        bed: BleSutaBed,
+        window: int = DEFAULT_ACK_WINDOW,
+        timeout: float = DEFAULT_ACK_TIMEOUT,
+        max_retries: int = DEFAULT_ACK_RETRIES,
+    ) -> None:
+        """
+        Constructor
+
+        @param bed: The bed to which the commands are sent
+        @param window: How many commands may be waiting for an acknowledgement at once
+        @param timeout: Seconds to wait for an acknowledgement before retransmitting
+        @param max_retries: How many times to retransmit a frame before giving up on it
+        """
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.bed = bed
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+        self._window = asyncio.Semaphore(window)
+        # Futures waiting for an acknowledgement, oldest first, by opcode
+        self._in_flight: dict[int, deque[asyncio.Future[None]]] = {}
+        self._subscribed_client: BleakClient | None = None
+
+        self.acknowledged = 0
+        self.retransmits = 0
+        self.lost = 0
+        self.unmatched = 0  # Acknowledgements which did not match anything in flight
+
+    def in_flight(self) -> int:
+        return sum(len(futures) for futures in self._in_flight.values())
+
+    async def send(self, command: BedCommands) -> float:
+        '''
+        Send a command, and wait for the bed to acknowledge it.
+
+        @return: Seconds between the last write of the frame and its acknowledgement
+        @raise AckTimeoutError: If the bed never acknowledged the command
+        @raise BleakError: If the bed could not be reached
+        '''
+        frame = COMMAND_FRAMES[command]
+        loop = asyncio.get_running_loop()
+
+        async with self._window:
+            future: asyncio.Future[None] = loop.create_future()
+            waiting = self._in_flight.setdefault(opcode(command), deque())
+            waiting.append(future)
+            try:
+                for attempt in range(self.max_retries + 1):
+                    if attempt:
+                        self.retransmits += 1
+                        logger.debug("%s: No acknowledgement for %s, sending it again", self.bed.device, command.name)
+                    await self._subscribe()
+                    await self.bed._write(BedServices.ACK_CMD, BedCharacteristic.ACK_CMD_CMD, frame,
+                                          self.bed.write_mode_for(command))
+                    sent_at = loop.time()
+                    try:
+                        await asyncio.wait_for(asyncio.shield(future), self.timeout)
+                    except asyncio.TimeoutError:
+                        continue
+                    self.acknowledged += 1
+                    return loop.time() - sent_at
+
+                self.lost += 1
+                raise AckTimeoutError(f"{self.bed.device} did not acknowledge {command.name}")
+            finally:
+                if future in waiting:
+                    waiting.remove(future)
+
+    def close(self) -> None:
+        '''
+        Stop waiting for any acknowledgements still outstanding.
+        '''
+        for waiting in self._in_flight.values():
+            for future in waiting:
+                future.cancel()
+
+    async def _subscribe(self) -> None:
+        await self.bed._ensure_connection()
+        client = self.bed._client
+        if self._subscribed_client is client:
+            return
+        # Claim it before awaiting, so that concurrent senders don't subscribe twice
+        self._subscribed_client = client
+        try:
+            await client.start_notify(BedCharacteristic.ACK_CMD_ACK.value, self._ack_callback)
+        except BleakError:
+            self._subscribed_client = None
+            raise
+
+    def _ack_callback(self, characteristic: BleakGATTCharacteristic, data: bytearray) -> None:
+        if self.bed.recorder is not None:
+            self.bed.recorder.notification(self.bed.device.address, BedCharacteristic.ACK_CMD_ACK.value, bytes(data))
+        try:
+            frames = decode_all(bytes(data))
+        except FrameError as e:
+            logger.debug("%s: %s", self.bed.device, e)
+            return
+
+        for frame in frames:
+            waiting = self._in_flight.get(frame.opcode)
+            future = next((future for future in waiting or () if not future.done()), None)
+            if future is None:
+                # Most likely the second acknowledgement for a frame we retransmitted
+                self.unmatched += 1
+                continue
+            future.set_result(None)
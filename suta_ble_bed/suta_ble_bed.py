@@ -22,6 +22,7 @@ from __future__ import annotations
 
 import asyncio
 import contextlib
+import time
 
 from bleak import BleakClient, BleakError, BleakScanner
 from bleak.backends.characteristic import BleakGATTCharacteristic
@@ -34,17 +35,119 @@ import logging
 
 if typing.TYPE_CHECKING:
     from .suta_ble_bed_controller import SutaBleBedController
+    from .suta_ble_trace import SutaBleTraceRecorder
 
-from .suta_ble_consts import BedServices, BedCommands, BedCharacteristic
+from .suta_ble_ack import SutaBleAckChannel
+from .suta_ble_codec import COMMAND_FRAMES, FrameError, decode_all
+from .suta_ble_command_queue import SutaBleCommandQueue
+from .suta_ble_consts import BedServices, BedCommands, BedCharacteristic, FRAME_LENGTH
+from .suta_ble_metrics import SutaBleMetrics
+from .suta_ble_prewarm import link_counters
+from .suta_ble_motion import DEFAULT_HOLD_INTERVAL, MotionJitter, MotionModel, SutaBleMotionStream, SutaBleMove
+from .suta_ble_state import BedState, SutaBleStateStream
+from .suta_ble_writes import WriteMode, WriteStats
 
 logger = logging.getLogger(__name__)
 
+class _BedLock(asyncio.Lock):
+    '''
+    An asyncio.Lock which calls on_release every time it is released, so that the connection
+    pool can tell when a busy bed may be evicted after all.
+    '''
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.on_release: Callable[[], None] | None = None
+
+    def release(self) -> None:
+        super().release()
+        if self.on_release is not None:
+            self.on_release()
+
+class _Lazy:
+    '''
+    An attribute which is only created, by factory(bed), the first time it is used.
+    Most beds the scanner hears are never commanded, so they should not pay for locks and queues.
+    '''
+
+    __slots__ = ("slot_name", "factory", "slot")
+
+    def __init__(self, slot_name: str, factory: Callable[[BleSutaBed], Any]) -> None:
+        self.slot_name = slot_name
+        self.factory = factory
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.slot = owner.__dict__[self.slot_name]
+
+    def __get__(self, bed: BleSutaBed | None, owner: type | None = None) -> Any:
+        if bed is None:
+            return self
+        try:
+            return self.slot.__get__(bed, owner)
+        except AttributeError:
+            value = self.factory(bed)
+            self.slot.__set__(bed, value)
+            return value
+
+    def __set__(self, bed: BleSutaBed, value: Any) -> None:
+        self.slot.__set__(bed, value)
+
+class _BedInstruments:
+    '''
+    The bed's handles on the controller's metrics, looked up on its first write.
+    '''
+
+    __slots__ = ("write_latency", "write_errors", "operation_lock_wait", "warm_links", "cold_links")
+
+    def __init__(self, metrics: SutaBleMetrics, address: str) -> None:
+        self.write_latency = metrics.histogram(
+            "suta_ble_write_seconds", "Time taken by write_gatt_char", bed=address)
+        self.write_errors = metrics.counter(
+            "suta_ble_write_errors_total", "Writes which raised BleakError", bed=address)
+        self.operation_lock_wait = metrics.histogram(
+            "suta_ble_lock_wait_seconds", "Time spent waiting for a lock", lock="operation")
+        self.warm_links, self.cold_links = link_counters(metrics)
+
+# Shared by every bed until it reports, or is given, something else
+_UNKNOWN_STATE = BedState()
+_DEFAULT_MOTION_MODEL = MotionModel()
+
 class BleSutaBed:
+    '''
+    One bed, as known to the scanner, and the means to command it.
+
+    Beds are kept small until they are used: the locks, command queue, ACK channel, write
+    statistics and metrics which commanding a bed needs are created on first use, so that
+    hearing many beds which nobody commands costs little. See _Lazy.
+    '''
+
+    __slots__ = (
+        "__weakref__",
+        "device", "controller", "recorder", "rssi", "last_seen", "adapter", "motion_model",
+        "write_mode", "pack_frames",
+        "_metrics", "_client", "_expected_disconnect", "_state", "_notifying_client",
+        "_move", "_move_task", "_motion", "_sightings", "_command_write_modes",
+        "_without_response_rejected", "_packing_rejected",
+        "_lazy_connect_lock", "_lazy_operation_lock", "_lazy_commands", "_lazy_acks",
+        "_lazy_write_stats", "_lazy_state_subscribers", "_lazy_instruments",
+    )
+
+    _connect_lock: _BedLock = _Lazy("_lazy_connect_lock", lambda bed: _BedLock())
+    _operation_lock: _BedLock = _Lazy("_lazy_operation_lock", lambda bed: _BedLock())
+    _commands: SutaBleCommandQueue = _Lazy("_lazy_commands", SutaBleCommandQueue)
+    acks: SutaBleAckChannel = _Lazy("_lazy_acks", SutaBleAckChannel)
+    write_stats: dict[WriteMode, WriteStats] = _Lazy(
+        "_lazy_write_stats", lambda bed: {mode: WriteStats() for mode in WriteMode})
+    _state_subscribers: set[SutaBleStateStream] = _Lazy("_lazy_state_subscribers", lambda bed: set())
+    _instruments: _BedInstruments = _Lazy(
+        "_lazy_instruments", lambda bed: _BedInstruments(bed._metrics, bed.device.address.upper()))
 
     def __init__(
         self,
         ble_device: BLEDevice,
         controller: SutaBleBedController,
+        metrics: SutaBleMetrics | None = None,
+        recorder: SutaBleTraceRecorder | None = None,
         **kwargs: Any,
     ) -> None:
         """
@@ -52,102 +155,379 @@ class BleSutaBed:
 
         @param ble_device: The bleak.BLEDevice which represents the connection to the bed
         @param controller: The SutaBleBedController which controls this connection
+        @param metrics: Where to record write latency and errors, usually the controller's
+        @param recorder: Where to record writes and notifications, if anywhere
         """
         self.device = ble_device
         self.controller: SutaBleBedController = controller
+        self.recorder = recorder
+        self._metrics = metrics if metrics is not None else SutaBleMetrics()
 
         self._client: BleakClient = None  # type: ignore[assignment]
-        self._connect_lock = asyncio.Lock()
-        self._operation_lock = asyncio.Lock()
         self._expected_disconnect = False
 
+        self.rssi: int | None = None
+        self.last_seen: float | None = None  # time.monotonic() of the most recent advertisement
+
+        self._state = _UNKNOWN_STATE
+        self._notifying_client: BleakClient | None = None
+
+        # Used by move_to() to pace commands, and when the bed does not report its position
+        self.motion_model = _DEFAULT_MOTION_MODEL
+        self._move: SutaBleMove | None = None
+        self._move_task: asyncio.Task | None = None
+        self._motion: SutaBleMotionStream | None = None
+
+        # The adapter we connect through, once the controller has picked one
+        self.adapter: str | None = None
+        # The most recent BLEDevice and RSSI heard through each adapter
+        self._sightings: dict[str | None, tuple[BLEDevice, int | None]] = {}
+
+        # How CONTROL_COMMAND is written. See set_write_mode().
+        self.write_mode = WriteMode.AUTO
+        self._command_write_modes: dict[BedCommands, WriteMode] | None = None
+        # Pack several repeats of a notch command into one write, up to the MTU
+        self.pack_frames = False
+        # Set once the bed has turned down one of the above, so we stop trying
+        self._without_response_rejected = False
+        self._packing_rejected = False
+
     def is_connected(self) -> bool:
         return self._client is not None and self._client.is_connected
 
+    @property
+    def state(self) -> BedState:
+        '''
+        The most recent state reported by the bed. Reading it does not involve the radio.
+        '''
+        return self._state
+
+    def state_updates(self) -> SutaBleStateStream:
+        '''
+        Subscribe to the bed's state, as an async iterator. The current state is delivered first.
+        If the consumer is slow, it only sees the latest state and never a backlog.
+
+            async with bed.state_updates() as updates:
+                async for state in updates:
+                    ...
+        '''
+        return SutaBleStateStream(self._state_subscribers, self._state)
+
+    def set_write_mode(self, mode: WriteMode, commands: typing.Iterable[BedCommands] | None = None) -> None:
+        '''
+        Choose whether commands are written with or without a response.
+
+        Writing without a response saves a round trip per frame, which matters most for
+        motion. If the bed turns it down, writes fall back to AUTO for the rest of the session.
+
+        @param mode: The WriteMode to use
+        @param commands: Only use this mode for these commands, or None to set the default for all of them
+        '''
+        if commands is None:
+            self.write_mode = mode
+        else:
+            if self._command_write_modes is None:
+                self._command_write_modes = {}
+            for command in commands:
+                self._command_write_modes[command] = mode
+
+    def write_mode_for(self, command: BedCommands) -> WriteMode:
+        modes = self._command_write_modes
+        mode = modes.get(command, self.write_mode) if modes else self.write_mode
+        if mode is WriteMode.WITHOUT_RESPONSE and self._without_response_rejected:
+            return WriteMode.AUTO
+        return mode
+
+    def _frames_per_write(self) -> int:
+        '''
+        How many frames fit in one write to the bed, if packing is enabled.
+        '''
+        if not self.pack_frames or self._packing_rejected or self._client is None:
+            return 1
+        # The ATT header takes 3 bytes out of the MTU
+        return max(1, (self._client.mtu_size - 3) // FRAME_LENGTH)
+
+    def _is_busy(self) -> bool:
+        return any(lock is not None and lock.locked() for lock in (
+            getattr(self, "_lazy_operation_lock", None), getattr(self, "_lazy_connect_lock", None)))
+
+    def _is_untouched(self) -> bool:
+        '''
+        Whether the bed has only ever been heard: never connected, commanded or subscribed to.
+        '''
+        return self._client is None and all(getattr(self, slot, None) is None for slot in (
+            "_lazy_connect_lock", "_lazy_operation_lock", "_lazy_commands", "_lazy_acks", "_lazy_state_subscribers"))
+
+    def _write_totals(self) -> tuple[int, int]:
+        '''
+        Successful and failed writes, in every WriteMode.
+        '''
+        stats = getattr(self, "_lazy_write_stats", None)
+        if stats is None:
+            return 0, 0
+        return sum(mode.writes for mode in stats.values()), sum(mode.errors for mode in stats.values())
+
+    async def _close(self) -> None:
+        '''
+        Stop the command queue and ACK channel, if they were ever started.
+        '''
+        commands = getattr(self, "_lazy_commands", None)
+        if commands is not None:
+            await commands.close()
+        acks = getattr(self, "_lazy_acks", None)
+        if acks is not None:
+            acks.close()
+
+    async def send_command(self, command: BedCommands) -> bool:
+        '''
+        Send any of the known BedCommands to the bed.
+
+        Commands are queued and sent one at a time. Repeated notch commands which are still
+        waiting are merged, and presets replace any motion which has not been sent yet.
+
+        @return: True once sent, or False if a later command replaced this one before it was sent
+        '''
+        return await self._commands.submit(command)
+
+    async def send_acknowledged(self, command: BedCommands) -> float:
+        '''
+        Send a command over the ACK_CMD service, and wait for the bed to acknowledge it.
+
+        Unlike send_command(), these are not merged or replaced, and several may be in flight
+        at once. Frames the bed does not acknowledge are sent again. See SutaBleAckChannel.
+
+        @return: Seconds until the bed acknowledged the command
+        @raise AckTimeoutError: If the bed never acknowledged it
+        '''
+        return await self.acks.send(command)
+
+    async def stop(self) -> None:
+        '''
+        Drop any motion commands which have not been sent yet.
+        '''
+        await self._commands.stop()
+
+    async def move_to(self, head: int | None = None, feet: int | None = None, tolerance: int = 0) -> bool:
+        '''
+        Move the bed to a position, in notches above flat, using as few commands as possible.
+
+        Progress is tracked from what the bed reports, falling back to motion_model if it does not,
+        and the move stops as soon as the bed is within tolerance. Calling move_to() again,
+        or sending a preset, replaces a move in progress.
+
+        @param head: Target head position, or None to leave it where it is
+        @param feet: Target feet position, or None to leave it where it is
+        @param tolerance: How many notches off the target is close enough
+        @return: True if the target was reached, False if the move was replaced or gave up
+        @raise ValueError: If the current position is unknown and not both head and feet were given
+        '''
+        if self._move_task is not None and not self._move_task.done():
+            self._move.superseded = True
+            self._move_task.cancel()
+            await self._commands.stop()
+
+        move = self._move = SutaBleMove(self, head, feet, tolerance, self.motion_model)
+        task = self._move_task = asyncio.create_task(move.run())
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if move.superseded:
+                return False
+            raise
+
+    def hold(self, command: BedCommands, interval: float = DEFAULT_HOLD_INTERVAL) -> SutaBleMotionStream:
+        '''
+        Keep the bed moving for as long as the returned context manager is held.
+
+            async with bed.hold(BedCommands.HEAD_UP) as motion:
+                await button_released.wait()
+            print(motion.jitter)
+
+        @param command: A notch command, like BedCommands.HEAD_UP
+        @param interval: Seconds between frames
+        '''
+        return SutaBleMotionStream(self, command, interval)
+
+    async def start_motion(self, command: BedCommands, interval: float = DEFAULT_HOLD_INTERVAL) -> None:
+        '''
+        Start moving the bed until stop_motion() is called. Replaces any motion already running.
+        '''
+        await self.stop_motion()
+        motion = SutaBleMotionStream(self, command, interval)
+        await motion.start()
+        self._motion = motion
+
+    async def stop_motion(self) -> MotionJitter | None:
+        '''
+        Stop the motion started by start_motion().
+
+        @return: How steadily frames were sent, or None if nothing was moving
+        '''
+        motion, self._motion = self._motion, None
+        if motion is None:
+            return None
+        return await motion.stop()
+
     async def raise_feet(self) -> None:
         '''
         Raise the feet of the bed a notch.
         '''
-        await self._write(BedServices.CONTROL, BedCharacteristic.CONTROL_COMMAND, data=BedCommands.FEET_UP.to_bytes(5, 'big'))
+        await self.send_command(BedCommands.FEET_UP)
 
     async def lower_feet(self) -> None:
         '''
         Lower the feet of the bed a notch.
         '''
-        await self._write(BedServices.CONTROL, BedCharacteristic.CONTROL_COMMAND, data=BedCommands.FEET_DOWN.to_bytes(5, 'big'))
+        await self.send_command(BedCommands.FEET_DOWN)
 
     async def raise_head(self) -> None:
         '''
         Raise the head of the bed a notch.
         '''
-        await self._write(BedServices.CONTROL, BedCharacteristic.CONTROL_COMMAND, data=BedCommands.HEAD_UP.to_bytes(5, 'big'))
+        await self.send_command(BedCommands.HEAD_UP)
 
     async def lower_head(self) -> None:
         '''
         Lower the head of the bed a notch.
         '''
-        await self._write(BedServices.CONTROL, BedCharacteristic.CONTROL_COMMAND, data=BedCommands.HEAD_DOWN.to_bytes(5, 'big'))
+        await self.send_command(BedCommands.HEAD_DOWN)
 
     async def raise_head_and_feet(self) -> None:
         '''
         Raise the head and feet of the bed a notch.
         '''
-        await self._write(BedServices.CONTROL, BedCharacteristic.CONTROL_COMMAND, data=BedCommands.HEAD_AND_FEET_UP.to_bytes(5, 'big'))
+        await self.send_command(BedCommands.HEAD_AND_FEET_UP)
 
     async def lower_head_and_feet(self) -> None:
         '''
         Lower the head and feet of the bed a notch.
         '''
-        await self._write(BedServices.CONTROL, BedCharacteristic.CONTROL_COMMAND, data=BedCommands.HEAD_AND_FEET_DOWN.to_bytes(5, 'big'))
+        await self.send_command(BedCommands.HEAD_AND_FEET_DOWN)
 
     async def beep(self) -> None:
         '''
         Beep the bed.
         '''
-        await self._write(BedServices.CONTROL, BedCharacteristic.CONTROL_COMMAND, data=BedCommands.THREE_BEEP1.to_bytes(5, 'big'))
+        await self.send_command(BedCommands.THREE_BEEP1)
 
     async def vibrate_head(self) -> None:
         '''
         Toggle vibration on the head of the bed.
         '''
-        await self._write(BedServices.CONTROL, BedCharacteristic.CONTROL_COMMAND, data=BedCommands.VIBRATE_HEAD.to_bytes(5, 'big'))
+        await self.send_command(BedCommands.VIBRATE_HEAD)
 
     async def vibrate_feet(self) -> None:
         '''
         Toggle vibration on the feet of the bed.
         '''
-        await self._write(BedServices.CONTROL, BedCharacteristic.CONTROL_COMMAND, data=BedCommands.VIBRATE_FEET.to_bytes(5, 'big'))
+        await self.send_command(BedCommands.VIBRATE_FEET)
 
     async def flat(self) -> None:
         '''
         Set the bed to flat.
         '''
-        await self._write(BedServices.CONTROL, BedCharacteristic.CONTROL_COMMAND, data=BedCommands.FLAT.to_bytes(5, 'big'))
+        await self.send_command(BedCommands.FLAT)
 
     async def zero_gravity(self) -> None:
         '''
         Set the bed to zero gravity.
         '''
-        await self._write(BedServices.CONTROL, BedCharacteristic.CONTROL_COMMAND, data=BedCommands.ZERO_GRAVITY.to_bytes(5, 'big'))
+        await self.send_command(BedCommands.ZERO_GRAVITY)
 
     async def lounge(self) -> None:
         '''
         Set the bed to lounge.
         '''
-        await self._write(BedServices.CONTROL, BedCharacteristic.CONTROL_COMMAND, data=BedCommands.LOUNGE.to_bytes(5, 'big'))
+        await self.send_command(BedCommands.LOUNGE)
+
+    def _update_advertisement(self, ble_device: BLEDevice, rssi: int | None, seen: float, adapter: str | None = None) -> None:
+        """Record a fresh advertisement from this bed."""
+        self._sightings[adapter] = (ble_device, rssi)
+        # A BLEDevice is specific to the adapter which saw it
+        if self.adapter is None or self.adapter == adapter:
+            self.device = ble_device
+        self.rssi = rssi
+        self.last_seen = seen
+
+    def _assign_adapter(self, adapter: str | None) -> None:
+        """Connect through this adapter from now on."""
+        self.adapter = adapter
+        sighting = self._sightings.get(adapter)
+        if sighting is not None:
+            self.device = sighting[0]
+
+    async def _write_command(self, command: BedCommands, count: int = 1) -> None:
+        '''
+        Write a command to the bed.
+
+        @param count: How many copies of the frame to pack into the write. See _frames_per_write().
+        '''
+        mode = self.write_mode_for(command)
+        if count == 1:
+            await self._write(BedServices.CONTROL, BedCharacteristic.CONTROL_COMMAND, COMMAND_FRAMES[command], mode)
+            return
 
-    async def _write(self, service: BedServices, characteristic: BedCharacteristic, data: bytearray) -> None:
+        try:
+            await self._write(BedServices.CONTROL, BedCharacteristic.CONTROL_COMMAND, COMMAND_FRAMES[command] * count, mode)
+        except BleakError:
+            if not self.is_connected():
+                raise
+            # Still connected, so it was the packed write which the bed did not like
+            logger.info("%s: Bed rejected %d packed frames, sending one frame per write from now on", self.device, count)
+            self._packing_rejected = True
+            for _ in range(count):
+                await self._write_command(command)
+
+    async def _write(
+        self,
+        service: BedServices,
+        characteristic: BedCharacteristic,
+        data: bytes,
+        mode: WriteMode = WriteMode.AUTO,
+    ) -> None:
         """Helper to write characteristic."""
         if self._operation_lock.locked():
             logger.debug("Operation already in progress. Waiting for it to complete")
+        instruments = self._instruments
+        wait_started = time.perf_counter()
         async with self._operation_lock:
+            instruments.operation_lock_wait.observe(time.perf_counter() - wait_started)
+            (instruments.warm_links if self.is_connected() else instruments.cold_links).inc()
             await self._ensure_connection()
             try:
-                await self._client.write_gatt_char(characteristic.value, data)
+                await self._send(self._client, characteristic, data, mode)
                 logger.debug("Wrote '%s' to attribute '%s'", data, characteristic)
             except BleakError as e:
                 logger.error("Failed to write '%s' to attribute '%s': %s", data, characteristic, e)
                 raise
+            finally:
+                self.controller._touch(self)
+
+    async def _send(self, client: BleakClient, characteristic: BedCharacteristic, data: bytes, mode: WriteMode) -> None:
+        '''
+        Write to the client, which the caller must already hold the operation lock for.
+        Falls back to AUTO if the bed will not take a write without response.
+        '''
+        if self.recorder is not None:
+            self.recorder.write(self.device.address, characteristic.value, data, mode.value)
+        start = time.perf_counter()
+        try:
+            await client.write_gatt_char(characteristic.value, data, response=mode.value)
+        except BleakError:
+            self.write_stats[mode].errors += 1
+            self._instruments.write_errors.inc()
+            if mode is not WriteMode.WITHOUT_RESPONSE or not client.is_connected:
+                raise
+            logger.info("%s: Bed rejected a write without response, falling back to %s", self.device, WriteMode.AUTO.name)
+            self._without_response_rejected = True
+            mode = WriteMode.AUTO
+            if self.recorder is not None:
+                self.recorder.write(self.device.address, characteristic.value, data, mode.value)
+            start = time.perf_counter()
+            await client.write_gatt_char(characteristic.value, data, response=mode.value)
+        elapsed = time.perf_counter() - start
+        self.write_stats[mode].record(max(1, len(data) // FRAME_LENGTH), elapsed)
+        self._instruments.write_latency.observe(elapsed)
 
     async def _ensure_connection(self) -> None:
         """Connect to bed."""
@@ -159,4 +539,38 @@ class BleSutaBed:
 
         self._client = await self.controller.connect(self)
         self._expected_disconnect = False
+        await self._start_notifications()
         return
+
+    async def _start_notifications(self) -> None:
+        client = self._client
+        if self._notifying_client is client:
+            return
+        # Claim it before awaiting, so that concurrent callers don't subscribe twice
+        self._notifying_client = client
+        try:
+            await client.start_notify(BedCharacteristic.CONTROL_READ.value, self._control_read_callback)
+        except BleakError as e:
+            # Commands still work without it, we just can't follow along
+            logger.warning("%s: Could not subscribe to bed state: %s", self.device, e)
+            self._notifying_client = None
+
+    def _control_read_callback(self, characteristic: BleakGATTCharacteristic, data: bytearray) -> None:
+        raw = bytes(data)
+        if self.recorder is not None:
+            self.recorder.notification(self.device.address, BedCharacteristic.CONTROL_READ.value, raw)
+        try:
+            frames = decode_all(raw)
+        except FrameError as e:
+            logger.debug("%s: %s", self.device, e)
+            state = self._state.unparsed(raw)
+        else:
+            state = self._state
+            for frame in frames:
+                state = state.apply(frame, raw)
+
+        self._state = state
+        subscribers = getattr(self, "_lazy_state_subscribers", None)
+        if subscribers:
+            for subscriber in list(subscribers):
+                subscriber._publish(state)
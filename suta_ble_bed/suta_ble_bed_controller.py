@@ -8,80 +8,419 @@
 #
 
 import asyncio
-from bleak import BleakClient, BleakError, BleakScanner
+from bleak import AdvertisementData, BleakClient, BleakError, BleakScanner
 from bleak.backends.device import BLEDevice
 from bleak_retry_connector import establish_connection
 from contextlib import AbstractAsyncContextManager
 
 import logging
+import time
 from types import TracebackType
+from typing import Awaitable, Callable, Iterable, Sequence
 
 from .suta_ble_bed import BleSutaBed
-from .suta_ble_scanner import SutaBleScanner
-from .suta_ble_consts import BED_LOCAL_NAME
+from .suta_ble_device_cache import SutaBleDeviceCache
+from .suta_ble_fleet import FanOutResult, fan_out
+from .suta_ble_health import BreakerPolicy, SutaBleHealthMonitor
+from .suta_ble_metrics import SutaBleMetrics
+from .suta_ble_connection_pool import DEFAULT_IDLE_TIMEOUT, DEFAULT_MAX_CONNECTIONS, SutaBleConnectionPool
+from .suta_ble_prewarm import PrewarmPolicy, SutaBleConnectionPrewarmer
+from .suta_ble_scan_policy import ScanFilter, ScanPolicy, SutaBleScanDutyCycle, scanner_kwargs
+from .suta_ble_reconnect import DEFAULT_MAX_CONCURRENT_RECONNECTS, ReconnectPolicy, SutaBleReconnectSupervisor
+from .suta_ble_scanner import ScannerLimits, SutaBleScanner
+from .suta_ble_trace import SutaBleTraceRecorder
+from .suta_ble_consts import BED_LOCAL_NAME, BedCommands
 
 logger = logging.getLogger(__name__)
 
+# Seconds to wait for a bed to advertise when connecting to it from the device cache failed
+DEFAULT_DISCOVERY_TIMEOUT = 30.0
+# Seconds to wait after the device cache changes before saving it, so that changes are saved together
+DEFAULT_CACHE_SAVE_DELAY = 10.0
+
 class SutaBleBedController(AbstractAsyncContextManager):
 
-    def __init__(self, adapter: str = None) -> None:
+    def __init__(
+        self,
+        adapter: str = None,
+        adapters: Sequence[str] | None = None,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        idle_timeout: float | None = DEFAULT_IDLE_TIMEOUT,
+        reconnect_policy: ReconnectPolicy = ReconnectPolicy(),
+        max_concurrent_reconnects: int = DEFAULT_MAX_CONCURRENT_RECONNECTS,
+        device_cache: SutaBleDeviceCache | None = None,
+        discovery_timeout: float | None = DEFAULT_DISCOVERY_TIMEOUT,
+        metrics: SutaBleMetrics | None = None,
+        scanner_class: Callable[..., BleakScanner] = BleakScanner,
+        connector: Callable[..., Awaitable[BleakClient]] | None = None,
+        scan_filter: ScanFilter = ScanFilter.NONE,
+        scan_policy: ScanPolicy | None = None,
+        prewarm_policy: PrewarmPolicy = PrewarmPolicy(),
+        recorder: SutaBleTraceRecorder | None = None,
+        breaker_policy: BreakerPolicy = BreakerPolicy(),
+        scanner_limits: ScannerLimits = ScannerLimits(),
+        cache_save_delay: float = DEFAULT_CACHE_SAVE_DELAY,
+    ) -> None:
         """
         Constructor
 
         @param adapter: The Bluetooth adapter to use, like "hci0"
+        @param adapters: Several Bluetooth adapters to use at once, like ["hci0", "hci1"]. Replaces adapter.
+            Each bed is connected through whichever adapter hears it best and has a connection to spare.
+        @param max_connections: Maximum number of beds to be connected to at once, per adapter
+        @param idle_timeout: Seconds after which an unused connection is closed, or None to keep it open
+        @param reconnect_policy: Default policy for reconnecting beds which drop unexpectedly
+        @param max_concurrent_reconnects: Maximum number of background reconnects per adapter
+        @param device_cache: If given, beds we have seen before are connected to without waiting for them to be discovered
+        @param discovery_timeout: Seconds to wait for a bed to advertise if connecting to it from the cache failed
+        @param metrics: Where to record latencies and counts. A new SutaBleMetrics is created if not given.
+        @param scanner_class: Called like BleakScanner to create each adapter's scanner
+        @param connector: Called like bleak_retry_connector.establish_connection to connect to a bed.
+            Together with scanner_class, lets SutaBleSimulator stand in for a real Bluetooth stack.
+        @param scan_filter: How early to drop advertisements from devices which are not beds
+        @param scan_policy: When to scan. By default, scanning is continuous.
+        @param prewarm_policy: When to connect to beds before they are used. By default, only on demand.
+        @param recorder: Where to record advertisements, connects, writes, notifications and disconnects, if anywhere.
+            Closing it is up to the caller.
+        @param breaker_policy: When to stop trying to connect to beds which are down, and when to check on them again
+        @param scanner_limits: How many beds, and announcements of new beds, to keep track of at most
+        @param cache_save_delay: Seconds after a connect before saving the device cache. It is also saved on exit.
         """
         super().__init__()
 
-        self._bed_scanner = SutaBleScanner(self)
-        self._bleak_scanner = BleakScanner(
-            detection_callback=self._bed_scanner._scanner_discovery_callback,
-            adapter=adapter)
+        self.metrics = metrics if metrics is not None else SutaBleMetrics()
+        self._connect_lock_wait = self.metrics.histogram(
+            "suta_ble_lock_wait_seconds", "Time spent waiting for a lock", lock="connect")
+        self._adapters: list[str | None] = list(adapters) if adapters else [adapter]
+        self._device_cache = device_cache
+        self._cache_save_delay = cache_save_delay
+        self._cache_save: asyncio.Task | None = None
+        self._discovery_timeout = discovery_timeout
+        self._connector = connector
+        self._max_connections = max_connections
+        self._pools: dict[str | None, SutaBleConnectionPool] = {
+            adapter: SutaBleConnectionPool(max_connections=max_connections, idle_timeout=idle_timeout)
+            for adapter in self._adapters
+        }
+        # Consecutive failed connection attempts per adapter, so that a broken adapter is tried last
+        self._adapter_failures: dict[str | None, int] = {adapter: 0 for adapter in self._adapters}
+        self.health = SutaBleHealthMonitor(self, breaker_policy)
+        self.reconnector = SutaBleReconnectSupervisor(
+            self,
+            default_policy=reconnect_policy,
+            max_concurrent=max_concurrent_reconnects)
+
+        self.recorder = recorder
+        self._bed_scanner = SutaBleScanner(
+            self,
+            max_pending=scanner_limits.max_pending,
+            metrics=self.metrics,
+            recorder=recorder,
+            overflow=scanner_limits.overflow,
+            max_beds=scanner_limits.max_beds,
+            forget_after=scanner_limits.forget_after)
+        self._bleak_scanners: dict[str | None, BleakScanner] = {
+            adapter: scanner_class(
+                detection_callback=self._discovery_callback_for(adapter),
+                **scanner_kwargs(scan_filter, adapter))
+            for adapter in self._adapters
+        }
         self._scanner_running: bool = False
+        # Number of connects in progress, which the duty cycle pauses scanning for
+        self._connecting = 0
+        self.duty_cycle = SutaBleScanDutyCycle(self, scan_policy) if scan_policy is not None else None
+        if self.duty_cycle is not None:
+            self._bed_scanner.on_waiting = self.duty_cycle.wake
+        self.prewarmer = SutaBleConnectionPrewarmer(self, prewarm_policy)
+        self._bed_scanner.on_discovered = self.prewarmer.bed_discovered
 
     async def __aenter__(self):
-        await self._bleak_scanner.start()
+        results = await asyncio.gather(
+            *(scanner.start() for scanner in self._bleak_scanners.values()),
+            return_exceptions=True)
+        failed = [
+            adapter for adapter, result in zip(list(self._bleak_scanners), results) if isinstance(result, BaseException)]
+        if len(failed) == len(self._bleak_scanners):
+            raise results[0]
+        for adapter, result in zip(list(self._bleak_scanners), results):
+            if isinstance(result, BaseException):
+                # Carry on with the adapters which do work, and never try to connect through this one
+                logger.error("Failed to start scanning on %s: %s", adapter or "the default adapter", result)
+                del self._bleak_scanners[adapter]
+                self._adapters.remove(adapter)
+                del self._pools[adapter]
+                del self._adapter_failures[adapter]
         self._scanner_running = True
+        if self.duty_cycle is not None:
+            self.duty_cycle.start()
+        self.prewarmer.start()
         return self
     
     async def __aexit__(self, __exc_type: type[BaseException] | None, __exc_value: BaseException | None, __traceback: TracebackType | None) -> bool | None:
         self._scanner_running = False
-        await self._bleak_scanner.stop()
+        await self.prewarmer.close()
+        await self.reconnector.close()
+        await self.health.close()
+        if self.duty_cycle is not None:
+            await self.duty_cycle.close()
+        if self.duty_cycle is None or self.duty_cycle.scanning:
+            await asyncio.gather(*(scanner.stop() for scanner in self._bleak_scanners.values()))
+        await asyncio.gather(*(bed._close() for bed in self._bed_scanner.beds() if not bed._is_untouched()))
+        await asyncio.gather(*(pool.close() for pool in self._pools.values()))
+        if self._device_cache is not None:
+            if self._cache_save is not None:
+                self._cache_save.cancel()
+                await asyncio.gather(self._cache_save, return_exceptions=True)
+            for bed in self._bed_scanner.beds():
+                if bed.last_seen is not None:
+                    self._device_cache.remember(bed.device, self._adapter_for(bed))
+            await self._save_cache()
         return await super().__aexit__(__exc_type, __exc_value, __traceback)
     
     def devices(self):
         return self._bed_scanner
 
+    async def get_bed(self, address: str | None = None, timeout: float | None = None) -> BleSutaBed:
+        '''
+        Find a bed, waiting for it to be discovered if need be.
+
+        @param address: MAC address of the bed, or None for whichever bed is found first
+        @param timeout: Seconds to wait for discovery, or None to wait forever
+        @raise asyncio.TimeoutError: If the bed was not discovered in time
+        '''
+        if address is not None and address not in self._bed_scanner and self._device_cache is not None:
+            cached = self._device_cache.get(address)
+            adapter = cached.adapter if cached is not None and cached.adapter in self._adapters else self._adapters[0]
+            device = self._device_cache.ble_device(address, adapter)
+            if device is not None:
+                # Seen before, so don't wait for discovery. If the cached device does not work out,
+                # connect() will fall back to waiting for the bed to advertise.
+                logger.debug("Using cached %s", device)
+                return self._bed_scanner.adopt(device, adapter)
+
+        return await asyncio.wait_for(self._bed_scanner.wait_for(address), timeout)
+
+    async def fan_out(
+        self,
+        command: BedCommands,
+        beds: Iterable[BleSutaBed] | None = None,
+        selector: Callable[[BleSutaBed], bool] | None = None,
+        parallelism: int | None = None,
+        timeout: float | None = None,
+    ) -> list[FanOutResult]:
+        '''
+        Send one command to many beds at once.
+
+        Beds which are already connected are used as-is, and the others are connected to in parallel.
+
+        @param command: What to send
+        @param beds: Which beds to send it to. Defaults to every bed which has been discovered.
+        @param selector: Only send to beds for which this returns True, like suta_ble_fleet.seen_within(60)
+        @param parallelism: Maximum number of beds to work on at once on each adapter.
+            Defaults to the maximum number of connections.
+        @param timeout: Seconds to allow each bed, or None for no limit
+        @return: One FanOutResult per bed, with any error and how long that bed took
+        '''
+        if beds is None:
+            beds = self._bed_scanner.beds()
+        if selector is not None:
+            beds = [bed for bed in beds if selector(bed)]
+        if parallelism is None:
+            parallelism = self._max_connections
+        return await fan_out(self, command, beds, parallelism, timeout)
+
+    def _discovery_callback_for(self, adapter: str | None) -> Callable[[BLEDevice, AdvertisementData], None]:
+        # bleak insists on a callback with exactly two parameters
+        callback = self._bed_scanner._scanner_discovery_callback
+        return lambda device, advertising_data: callback(device, advertising_data, adapter)
+
+    def adapters(self) -> list[str | None]:
+        '''
+        The Bluetooth adapters which are in use. None stands for the system's default adapter.
+        '''
+        return list(self._bleak_scanners)
+
+    def _touch(self, bed: BleSutaBed) -> None:
+        """The bed's connection was just used."""
+        pool = self._pools.get(bed.adapter)
+        if pool is not None:
+            pool.touch(bed)
+        self.prewarmer.bed_used(bed)
+
+    def _adapter_for(self, bed: BleSutaBed) -> str | None:
+        """The adapter which the bed connects through, or would if it connected now."""
+        if bed.is_connected() and bed.adapter in self._pools:
+            return bed.adapter
+        return self._rank_adapters(bed)[0]
+
+    def _has_free_slot(self, bed: BleSutaBed) -> bool:
+        """Whether the bed could be connected without evicting another."""
+        return any(self._pools[adapter].has_free_slot() for adapter in self._rank_adapters(bed))
+
+    def _rank_adapters(self, bed: BleSutaBed) -> list[str | None]:
+        """
+        Adapters through which we could connect to the bed, best first.
+
+        Prefer adapters with a free connection slot, then ones which have not been failing,
+        then the one which hears the bed the loudest.
+        """
+        candidates = [adapter for adapter in self._adapters if adapter in bed._sightings] or list(self._adapters)
+
+        def score(adapter: str | None) -> tuple:
+            rssi = bed._sightings[adapter][1] if adapter in bed._sightings else None
+            return (
+                not self._pools[adapter].has_free_slot(),
+                self._adapter_failures[adapter],
+                -rssi if rssi is not None else 0,
+            )
+
+        return sorted(candidates, key=score)
+
     def _disconnect_callback(self, device: BleSutaBed, client: BleakClient) -> None:
         """Disconnected from device."""
+        if self.recorder is not None:
+            self.recorder.disconnect(device.device.address, device._expected_disconnect)
+        # The bed may have moved adapters since this client connected, so check every pool
+        for pool in self._pools.values():
+            pool.discard(device, client)
         if device._expected_disconnect:
             logger.debug("Disconnect callback called")
         else:
             logger.warning("Unexpectedly disconnected")
+            if self._scanner_running:
+                self.reconnector.bed_disconnected(device)
+            if self.duty_cycle is not None:
+                self.duty_cycle.wake()
 
     async def connect(self, bed: BleSutaBed) -> BleakClient:
         """
         Establish a connection to the device, which should be one controlled by this controller.
 
         @param device: The BleSutaBed device to which we should attach
+        @raise CircuitOpenError: Straight away, if the bed has been failing to connect. See self.health.
         """
         if not self._scanner_running:
-            raise "Cannot attempt to connect to a device while the scanner is not running"
+            raise BleakError("Cannot attempt to connect to a device while the scanner is not running")
+
+        self.health.before_connect(bed)
+        try:
+            client = await self._connect(bed)
+        except (asyncio.TimeoutError, BleakError) as e:
+            self.health.connect_failed(bed, e)
+            raise
+        except BaseException:
+            self.health.connect_abandoned(bed)
+            raise
+        self.health.connect_succeeded(bed)
+        return client
 
+    async def _connect(self, bed: BleSutaBed) -> BleakClient:
+        wait_started = time.perf_counter()
         async with bed._connect_lock:
+            self._connect_lock_wait.observe(time.perf_counter() - wait_started)
             # Check if the device is already connected
             if bed.is_connected():
-                return
+                # Not _touch(), since this is not a use of the bed
+                pool = self._pools.get(bed.adapter)
+                if pool is not None:
+                    pool.touch(bed)
+                return bed._client
+
+            tried: set[str | None] = set()
+            error: BaseException | None = None
+            while True:
+                adapters = [adapter for adapter in self._rank_adapters(bed) if adapter not in tried]
+                if not adapters:
+                    logger.error("%s: Failed to connect to the bed: %s", bed.device, error)
+                    raise error
+                adapter = adapters[0]
+                tried.add(adapter)
+                pool = self._pools[adapter]
+
+                # Wait for a free link slot, evicting the least recently used idle bed if need be
+                await pool.reserve()
+                bed._assign_adapter(adapter)
+                labels = {"adapter": adapter or "default"}
+                self.metrics.counter("suta_ble_connect_attempts_total", "Connections attempted", **labels).inc()
+                started = time.perf_counter()
+                self._set_connecting(1)
+                try:
+                    client = await self._establish_connection(bed)
+                except (asyncio.TimeoutError, BleakError) as e:
+                    pool.cancel_reservation()
+                    self.metrics.counter("suta_ble_connect_failures_total", "Connections which failed", **labels).inc()
+                    self._adapter_failures[adapter] += 1
+                    logger.warning("%s: Failed to connect through %s: %s", bed.device, adapter or "the default adapter", e)
+                    error = e
+                    continue
+                except BaseException:
+                    pool.cancel_reservation()
+                    raise
+                finally:
+                    self._set_connecting(-1)
+                break
+
+            self.metrics.histogram(
+                "suta_ble_connect_seconds", "Time taken to connect, including retries", **labels,
+            ).observe(time.perf_counter() - started)
+            self._adapter_failures[adapter] = 0
+            pool.add(bed, client)
+            if self.recorder is not None:
+                self.recorder.connect(bed.device.address, adapter)
+
+            if self._device_cache is not None:
+                self._device_cache.remember(bed.device, adapter, client)
+                self._cache_changed()
+            return client
+
+    def _cache_changed(self) -> None:
+        if self._cache_save is None or self._cache_save.done():
+            self._cache_save = asyncio.create_task(self._save_cache_later())
+
+    async def _save_cache_later(self) -> None:
+        # Anything remembered while saving, or which failed to save, is saved next time round
+        while self._device_cache.dirty:
+            await asyncio.sleep(self._cache_save_delay)
+            await self._save_cache()
+
+    async def _save_cache(self) -> None:
+        try:
+            await self._device_cache.save_async()
+        except OSError as e:
+            # Only costs a scan next time
+            logger.warning("Failed to save the device cache to %s: %s", self._device_cache.path, e)
+
+    def _set_connecting(self, change: int) -> None:
+        self._connecting += change
+        if self.duty_cycle is not None:
+            self.duty_cycle.wake()
+
+    async def _establish_connection(self, bed: BleSutaBed) -> BleakClient:
+        if bed.last_seen is None:
+            # Adopted from the device cache and never heard from. Try it once,
+            # and if that does not work, wait for it to turn up in the scan after all.
             try:
-                logger.debug(f"Connecting to {bed.device}")
-                client = await establish_connection(
-                    client_class=BleakClient,
-                    device=bed.device,
-                    name=f'{bed.device.name} ({bed.device.address})',
-                    use_services_cache=True,
-                    disconnected_callback=lambda client: self._disconnect_callback(bed, client),  # type: ignore
-                    ble_device_callback=lambda: bed.device,
-                )
-                return client
+                return await self._establish_connection_to_device(bed, max_attempts=1)
             except (asyncio.TimeoutError, BleakError) as error:
-                logger.error("%s: Failed to connect to the bed: %s", bed.device, error)
-                raise
+                logger.info("%s: Direct connection failed (%s). Waiting for the bed to advertise.", bed.device, error)
+                self.metrics.counter(
+                    "suta_ble_connect_retries_total", "Connections retried after a direct connection from the cache failed",
+                ).inc()
+            await asyncio.wait_for(
+                self._bed_scanner.wait_for(bed.device.address, advertised=True),
+                self._discovery_timeout)
+
+        return await self._establish_connection_to_device(bed)
+
+    async def _establish_connection_to_device(self, bed: BleSutaBed, **kwargs) -> BleakClient:
+        logger.debug(f"Connecting to {bed.device}")
+        connect = self._connector or establish_connection
+        return await connect(
+            client_class=BleakClient,
+            device=bed.device,
+            name=f'{bed.device.name} ({bed.device.address})',
+            use_services_cache=True,
+            disconnected_callback=lambda client: self._disconnect_callback(bed, client),  # type: ignore
+            ble_device_callback=lambda: bed.device,
+            **kwargs,
+        )
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_codec.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: Encode and decode the frames which are written to and notified by the bed
+#
+
+from __future__ import annotations
+
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
+
+from .suta_ble_consts import BedCommands, FRAME_HEADER, FRAME_LENGTH
+
+class FrameError(ValueError):
+    '''
+    Raised when a frame received from the bed is not one we know how to read.
+    '''
+
+class Frame(NamedTuple):
+    opcode: int
+    payload: bytes = b''
+
+    @property
+    def command(self) -> BedCommands | None:
+        '''
+        The BedCommands this frame corresponds to, if any.
+        '''
+        return _COMMANDS_BY_OPCODE.get(self.opcode) if not self.payload else None
+
+def checksum(data: bytes) -> int:
+    '''
+    Compute the checksum byte for the given frame contents.
+    '''
+    return sum(data) & 0xFF
+
+def encode(opcode: int, payload: bytes = b'') -> bytes:
+    '''
+    Build a complete frame for an arbitrary opcode.
+
+    @param opcode: The single-byte opcode to send
+    @param payload: Any additional bytes which go between the opcode and the checksum
+    '''
+    if not 0 <= opcode <= 0xFF:
+        raise ValueError(f"Opcode {opcode:#x} does not fit in one byte")
+    body = FRAME_HEADER + bytes((opcode,)) + payload
+    return body + bytes((checksum(body),))
+
+def decode(frame: bytes | bytearray) -> Frame:
+    '''
+    Validate and unpack a frame received from the bed, for example as a
+    notification from CONTROL_READ or ACK_CMD_ACK.
+
+    @raise FrameError: If the header or checksum is wrong, or the frame is truncated
+    '''
+    if len(frame) < FRAME_LENGTH:
+        raise FrameError(f"Frame {bytes(frame).hex()} is too short")
+    if frame[:len(FRAME_HEADER)] != FRAME_HEADER:
+        raise FrameError(f"Frame {bytes(frame).hex()} has an unknown header")
+    if checksum(frame[:-1]) != frame[-1]:
+        raise FrameError(f"Frame {bytes(frame).hex()} has a bad checksum")
+    return Frame(frame[len(FRAME_HEADER)], bytes(frame[len(FRAME_HEADER) + 1:-1]))
+
+def decode_all(data: bytes | bytearray) -> list[Frame]:
+    '''
+    Decode a notification, which may hold one frame or several back-to-back.
+
+    @raise FrameError: If the data is neither a whole number of command-sized frames nor a single longer frame
+    '''
+    if len(data) > FRAME_LENGTH and len(data) % FRAME_LENGTH == 0:
+        try:
+            return [decode(data[start:start + FRAME_LENGTH]) for start in range(0, len(data), FRAME_LENGTH)]
+        except FrameError:
+            pass
+    return [decode(data)]
+
+def opcode(command: BedCommands) -> int:
+    '''
+    Extract the opcode byte from one of the BedCommands.
+    '''
+    return (command >> 8) & 0xFF
+
+# Built once at import so that sending a command never needs to allocate a frame
+COMMAND_FRAMES: Mapping[BedCommands, bytes] = MappingProxyType({
+    command: encode(opcode(command)) for command in BedCommands
+})
+
+_COMMANDS_BY_OPCODE: Mapping[int, BedCommands] = MappingProxyType({
+    opcode(command): command for command in BedCommands
+})
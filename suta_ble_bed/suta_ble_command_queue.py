@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_command_queue.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: Per-bed queue of commands waiting to be sent, drained by a single writer task.
+#   Repeated notch commands are merged, and presets replace any motion still waiting,
+#   so that button-mashing cannot build up an unbounded backlog.
+#
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+import logging
+import typing
+
+from .suta_ble_consts import BedCommands, MOTION_COMMANDS, NOTCH_COMMANDS, PRESET_COMMANDS
+
+if typing.TYPE_CHECKING:
+    from .suta_ble_bed import BleSutaBed
+
+logger = logging.getLogger(__name__)
+
+class _PendingCommand:
+    __slots__ = ("command", "repeat", "sent", "superseded", "futures", "done")
+
+    def __init__(self, command: BedCommands) -> None:
+        self.command = command
+        self.repeat = 0
+        self.sent = 0
+        self.superseded = False
+        self.futures: list[asyncio.Future[bool]] = []
+        # Set once the writer is finished with this entry, whether or not anybody is still waiting on it
+        self.done = asyncio.Event()
+
+    def add_caller(self) -> asyncio.Future[bool]:
+        future = asyncio.get_running_loop().create_future()
+        self.repeat += 1
+        self.futures.append(future)
+        return future
+
+    def finish(self, result: bool) -> None:
+        for future in self.futures:
+            if not future.done():
+                future.set_result(result)
+        self.done.set()
+
+    def fail(self, error: Exception) -> None:
+        for future in self.futures:
+            if not future.done():
+                future.set_exception(error)
+        self.done.set()
+
+    def cancel(self) -> None:
+        for future in self.futures:
+            future.cancel()
+        self.done.set()
+
+class SutaBleCommandQueue:
+    '''
+    Commands for one bed, sent in order by a single writer task.
+
+    Each submitted command gets a future, which resolves to True once the command
+    was sent, or False if it was dropped because a later command made it moot.
+    Cancelling the future takes the command back, unless it is already being written.
+    '''
+
+    def __init__(self, bed: BleSutaBed) -> None:
+        """
+        Constructor
+
+        @param bed: The bed to which the commands are sent
+        """
+        self.bed = bed
+
+        self._pending: deque[_PendingCommand] = deque()
+        self._current: _PendingCommand | None = None
+        self._writer: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def submit(self, command: BedCommands) -> asyncio.Future[bool]:
+        '''
+        Queue a command to be sent.
+
+        Notch commands are merged with an identical notch command at the back of the queue
+        (or one being sent right now). Presets drop every motion command still waiting.
+        '''
+        tail = self._pending[-1] if self._pending else self._current
+        if (command in NOTCH_COMMANDS
+                and tail is not None
+                and tail.command is command
+                and not tail.superseded):
+            future = tail.add_caller()
+        else:
+            if command in PRESET_COMMANDS:
+                self._supersede_motion()
+            entry = _PendingCommand(command)
+            future = entry.add_caller()
+            self._pending.append(entry)
+        future.add_done_callback(lambda future: self._withdraw(entry, future) if future.cancelled() else None)
+
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._run())
+        return future
+
+    async def stop(self) -> None:
+        '''
+        Drop every motion command which has not yet been sent, and wait for the frame
+        currently being written, if any. The motors stop once frames stop arriving.
+        '''
+        self._supersede_motion()
+        if self._current is not None:
+            await self._current.done.wait()
+
+    async def close(self) -> None:
+        '''
+        Stop the writer, and cancel everything which has not been sent.
+        '''
+        if self._writer is not None:
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+            self._writer = None
+        while self._pending:
+            self._pending.popleft().cancel()
+
+    def _withdraw(self, entry: _PendingCommand, future: asyncio.Future[bool]) -> None:
+        # A caller gave up, for instance on a timeout, so its frame should not go out after all
+        if entry.done.is_set() or future not in entry.futures:
+            return
+        entry.futures.remove(future)
+        if entry.repeat > entry.sent:
+            entry.repeat -= 1
+        if entry.futures:
+            return
+        if entry is self._current:
+            # Stops after the frames being written now
+            entry.superseded = True
+        else:
+            logger.debug("%s: Withdrawing %s", self.bed.device, entry.command.name)
+            self._pending.remove(entry)
+            entry.done.set()
+
+    def _supersede_motion(self) -> None:
+        if self._current is not None and self._current.command in MOTION_COMMANDS:
+            self._current.superseded = True
+
+        kept: deque[_PendingCommand] = deque()
+        for entry in self._pending:
+            if entry.command in MOTION_COMMANDS:
+                logger.debug("%s: Dropping %d x %s", self.bed.device, entry.repeat, entry.command.name)
+                entry.finish(False)
+            else:
+                kept.append(entry)
+        self._pending = kept
+
+    async def _run(self) -> None:
+        while self._pending:
+            entry = self._current = self._pending.popleft()
+            try:
+                while entry.sent < entry.repeat and not entry.superseded:
+                    count = min(entry.repeat - entry.sent, self.bed._frames_per_write())
+                    await self.bed._write_command(entry.command, count)
+                    entry.sent += count
+            except Exception as e:
+                entry.fail(e)
+            except BaseException:
+                entry.cancel()
+                raise
+            else:
+                entry.finish(entry.sent == entry.repeat)
+            finally:
+                self._current = None
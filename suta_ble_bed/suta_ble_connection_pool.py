@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_connection_pool.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: Keep track of live connections to beds, so that we stay within the number
+#   of simultaneous links the Bluetooth adapter can support.
+#
+
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+import logging
+import typing
+
+from bleak import BleakClient, BleakError
+
+if typing.TYPE_CHECKING:
+    from .suta_ble_bed import BleSutaBed
+
+logger = logging.getLogger(__name__)
+
+# BlueZ adapters commonly top out somewhere between 5 and 10 LE links
+DEFAULT_MAX_CONNECTIONS = 5
+# Seconds a connection may sit unused before we hang up on it
+DEFAULT_IDLE_TIMEOUT = 60.0
+
+class SutaBleConnectionPool:
+    '''
+    Bounded set of live bed connections, with least-recently-used eviction.
+
+    When every slot is taken, the least-recently-used bed which is not in the
+    middle of an operation is disconnected to make room. If every connected bed
+    is busy, callers wait until a slot frees up, or one of the beds finishes its operation.
+    '''
+
+    def __init__(
+        self,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        idle_timeout: float | None = DEFAULT_IDLE_TIMEOUT,
+    ) -> None:
+        """
+        Constructor
+
+        @param max_connections: Maximum number of simultaneous connections
+        @param idle_timeout: Seconds after which an unused connection is closed, or None to keep it forever
+        """
+        if max_connections < 1:
+            raise ValueError("max_connections must be at least 1")
+
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+
+        # Most recently used last
+        self._links: OrderedDict[str, tuple[BleSutaBed, BleakClient]] = OrderedDict()
+        self._idle_timers: dict[str, asyncio.TimerHandle] = {}
+        self._reserved = 0
+        self._slot_freed = asyncio.Event()
+        self._tasks: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._links)
+
+    def __contains__(self, bed: BleSutaBed) -> bool:
+        return bed.device.address in self._links
+
+    def in_use(self) -> int:
+        '''
+        Number of slots which are either connected or being connected.
+        '''
+        return len(self._links) + self._reserved
+
+    def has_free_slot(self) -> bool:
+        return self.in_use() < self.max_connections
+
+    async def reserve(self) -> None:
+        '''
+        Wait for, and claim, a free connection slot. Must be followed by either add() or cancel_reservation().
+        '''
+        while not self.has_free_slot():
+            victim = self._least_recently_used_idle()
+            if victim is not None:
+                logger.debug("Connection pool full, evicting %s", victim.device)
+                await self._disconnect(victim)
+                continue
+
+            logger.debug("Connection pool full and every bed is busy. Waiting for a free slot.")
+            self._slot_freed.clear()
+            await self._slot_freed.wait()
+        self._reserved += 1
+
+    def cancel_reservation(self) -> None:
+        self._reserved -= 1
+        self._slot_freed.set()
+
+    def add(self, bed: BleSutaBed, client: BleakClient) -> None:
+        '''
+        Convert a reservation into a live connection.
+        '''
+        self._reserved -= 1
+        self._links[bed.device.address] = (bed, client)
+        # Once the bed is no longer busy, it can be evicted for whoever is waiting for a slot
+        bed._connect_lock.on_release = bed._operation_lock.on_release = self._slot_freed.set
+        self.touch(bed)
+
+    def touch(self, bed: BleSutaBed) -> None:
+        '''
+        Mark the bed as just used, moving it to the back of the eviction queue.
+        '''
+        address = bed.device.address
+        if address not in self._links:
+            return
+        self._links.move_to_end(address)
+
+        timer = self._idle_timers.pop(address, None)
+        if timer is not None:
+            timer.cancel()
+        if self.idle_timeout is not None:
+            self._idle_timers[address] = asyncio.get_running_loop().call_later(
+                self.idle_timeout, self._on_idle_timeout, bed)
+
+    def discard(self, bed: BleSutaBed, client: BleakClient | None = None) -> None:
+        '''
+        Forget about a connection, for instance because it has been disconnected.
+
+        @param client: If given, only forget the connection if it is still this client.
+            Protects against a late disconnect callback from a connection we already replaced.
+        '''
+        address = bed.device.address
+        link = self._links.get(address)
+        if link is None or (client is not None and link[1] is not client):
+            return
+        del self._links[address]
+        bed._connect_lock.on_release = bed._operation_lock.on_release = None
+        timer = self._idle_timers.pop(address, None)
+        if timer is not None:
+            timer.cancel()
+        self._slot_freed.set()
+
+    async def close(self) -> None:
+        '''
+        Disconnect every bed in the pool.
+        '''
+        for timer in self._idle_timers.values():
+            timer.cancel()
+        self._idle_timers.clear()
+        await asyncio.gather(
+            *(self._disconnect(bed) for bed, _ in list(self._links.values())),
+            return_exceptions=True)
+        for task in list(self._tasks):
+            task.cancel()
+
+    def _least_recently_used_idle(self) -> BleSutaBed | None:
+        for bed, _ in self._links.values():
+            if not bed._is_busy():
+                return bed
+        return None
+
+    def _on_idle_timeout(self, bed: BleSutaBed) -> None:
+        self._idle_timers.pop(bed.device.address, None)
+        if bed._is_busy():
+            self.touch(bed)
+            return
+        logger.debug("Closing idle connection to %s", bed.device)
+        task = asyncio.create_task(self._disconnect(bed))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _disconnect(self, bed: BleSutaBed) -> None:
+        link = self._links.get(bed.device.address)
+        if link is None:
+            return
+        _, client = link
+        # Let the disconnect callback know that we asked for this
+        bed._expected_disconnect = True
+        self.discard(bed)
+        try:
+            await client.disconnect()
+        except BleakError as e:
+            logger.warning("%s: Error while disconnecting: %s", bed.device, e)
@@ -29,6 +29,12 @@ class BedCharacteristic(Enum):
     ACK_CMD_CMD = '0000ffe2-0000-1000-8000-00805f9b34fb' # "CMD Input" - Write
     UPDATE_OTA = '00010203-0405-0607-0809-0a0b0c0d2b12' # Brick your bed here - Write
 
+# Every frame exchanged with the bed has the same layout:
+#   6e 01 00 <opcode> <checksum>
+# where the checksum is the low byte of the sum of the preceding bytes.
+FRAME_HEADER = b'\x6e\x01\x00'
+FRAME_LENGTH = 5
+
 class BedCommands(IntEnum):
     '''
     These were reverse engineered and documented in
@@ -58,4 +64,23 @@ class BedCommands(IntEnum):
 
     ZERO_GRAVITY = 0x6e010045b4
 
+# Commands which move the bed by one notch
+NOTCH_COMMANDS = frozenset({
+    BedCommands.HEAD_UP,
+    BedCommands.HEAD_DOWN,
+    BedCommands.FEET_UP,
+    BedCommands.FEET_DOWN,
+    BedCommands.HEAD_AND_FEET_UP,
+    BedCommands.HEAD_AND_FEET_DOWN,
+})
+
+# Commands which move the bed to a fixed position
+PRESET_COMMANDS = frozenset({
+    BedCommands.FLAT,
+    BedCommands.ZERO_GRAVITY,
+    BedCommands.LOUNGE,
+})
+
+MOTION_COMMANDS = NOTCH_COMMANDS | PRESET_COMMANDS
+
 IS_LINUX = platform.system() == "Linux"
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_daemon.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: Long-running process which keeps the controller and its connections warm,
+#   and accepts commands over a Unix domain socket.
+#
+#   The protocol is one request per line:
+#     <command> [<MAC>]\n
+#   where command is the CLI spelling of one of the BedCommands, like "head-up",
+#   and MAC may be "*" to send the command to every bed the daemon knows about.
+#   Each request gets exactly one reply line, either "OK" or "ERR <reason>".
+#   Several requests may be sent over the same connection.
+#
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from contextlib import AbstractAsyncContextManager
+import logging
+import os
+from types import TracebackType
+import typing
+
+from .suta_ble_consts import BedCommands
+from .suta_ble_daemon_client import (
+    ALL_BEDS,
+    DEFAULT_SOCKET_PATH,
+    DaemonError,
+    command_from_name,
+    request_line,
+)
+
+if typing.TYPE_CHECKING:
+    from .suta_ble_bed_controller import SutaBleBedController
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for a requested bed to advertise before giving up on the request
+DEFAULT_DISCOVERY_TIMEOUT = 30.0
+
+class SutaBleDaemon(AbstractAsyncContextManager):
+
+    def __init__(
+        self,
+        controller: SutaBleBedController,
+        socket_path: str = DEFAULT_SOCKET_PATH,
+        discovery_timeout: float | None = DEFAULT_DISCOVERY_TIMEOUT,
+    ) -> None:
+        """
+        Constructor
+
+        @param controller: The (already entered) SutaBleBedController which talks to the beds
+        @param socket_path: Where to create the Unix domain socket
+        @param discovery_timeout: Seconds to wait for a bed to be discovered while handling a request
+        """
+        super().__init__()
+        self.controller = controller
+        self.socket_path = socket_path
+        self.discovery_timeout = discovery_timeout
+
+        self._server: asyncio.AbstractServer | None = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, __exc_type: type[BaseException] | None, __exc_value: BaseException | None, __traceback: TracebackType | None) -> bool | None:
+        await self.close()
+        return await super().__aexit__(__exc_type, __exc_value, __traceback)
+
+    async def start(self) -> None:
+        await self._remove_stale_socket()
+        self._server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        # Anybody who can reach the socket can move the bed
+        os.chmod(self.socket_path, 0o600)
+        logger.info("Listening on %s", self.socket_path)
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.socket_path)
+
+    async def _remove_stale_socket(self) -> None:
+        if not os.path.exists(self.socket_path):
+            return
+        try:
+            _, writer = await asyncio.open_unix_connection(self.socket_path)
+        except OSError:
+            # Left over from a daemon which did not shut down cleanly
+            os.unlink(self.socket_path)
+            return
+        writer.close()
+        raise RuntimeError(f"Another daemon is already listening on {self.socket_path}")
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # Requests on one connection are carried out concurrently, but answered in order
+        replies: asyncio.Queue[asyncio.Task[bytes] | None] = asyncio.Queue()
+        responder = asyncio.create_task(self._respond(replies, writer))
+        try:
+            while line := await reader.readline():
+                replies.put_nowait(asyncio.create_task(self._execute(line)))
+        except ConnectionError:
+            pass
+        finally:
+            replies.put_nowait(None)
+            with contextlib.suppress(ConnectionError):
+                await responder
+            writer.close()
+
+    @staticmethod
+    async def _respond(replies: asyncio.Queue[asyncio.Task[bytes] | None], writer: asyncio.StreamWriter) -> None:
+        while (reply := await replies.get()) is not None:
+            writer.write(await reply)
+            await writer.drain()
+
+    async def _execute(self, line: bytes) -> bytes:
+        try:
+            command, address = _parse_request(line)
+        except (KeyError, ValueError) as e:
+            return _error(f"bad request: {e}")
+
+        if address == ALL_BEDS:
+            return await self._execute_all(command)
+
+        try:
+            bed = await self.controller.get_bed(address, timeout=self.discovery_timeout)
+            await bed.send_command(command)
+        except asyncio.TimeoutError:
+            return _error(f"bed {address} not found" if address else "no bed found")
+        except Exception as e:
+            logger.exception("Failed to send %s", command.name)
+            return _error(str(e))
+        return b"OK\n"
+
+    async def _execute_all(self, command: BedCommands) -> bytes:
+        results = await self.controller.fan_out(command)
+        if not results:
+            return _error("no bed found")
+        failures = [result for result in results if result.error is not None]
+        if failures:
+            details = "; ".join(f"{result.bed.device.address}: {result.error}" for result in failures)
+            return _error(f"{len(failures)} of {len(results)} beds failed: {details}")
+        return b"OK\n"
+
+def _error(reason: str) -> bytes:
+    '''
+    An ERR reply. Reasons come from exceptions too, so any line breaks in them are
+    collapsed, to keep to one reply line per request.
+    '''
+    return f"ERR {' '.join(reason.split())}\n".encode()
+
+def _parse_request(line: bytes) -> tuple[BedCommands, str | None]:
+    parts = line.decode().split()
+    if not 1 <= len(parts) <= 2:
+        raise ValueError("expected '<command> [<MAC>]'")
+    return command_from_name(parts[0]), parts[1] if len(parts) == 2 else None
+
+async def send_request(
+    command: BedCommands,
+    address: str | None = None,
+    socket_path: str = DEFAULT_SOCKET_PATH,
+) -> None:
+    '''
+    Ask a running daemon to send a command.
+
+    @param address: MAC address of the bed, ALL_BEDS, or None for whichever bed the daemon finds first
+
+    @raise OSError: If no daemon is listening on socket_path
+    @raise DaemonError: If the daemon could not send the command
+    '''
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    try:
+        writer.write(request_line(command, address))
+        await writer.drain()
+        reply = (await reader.readline()).decode().strip()
+    finally:
+        writer.close()
+
+    if reply != "OK":
+        raise DaemonError(reply.removeprefix("ERR ") or "daemon closed the connection")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_daemon_client.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: The client side of the daemon protocol described in suta_ble_daemon.py.
+#
+#   Kept apart from the daemon, and free of asyncio and bleak, so that the CLI can hand
+#   a command to a running daemon without paying to import the Bluetooth stack.
+#
+
+from __future__ import annotations
+
+import os
+import socket
+import tempfile
+
+from .suta_ble_consts import BedCommands
+
+DEFAULT_SOCKET_PATH = os.path.join(
+    os.environ.get("XDG_RUNTIME_DIR", tempfile.gettempdir()),
+    "suta_ble_bed.sock")
+
+# Stands in for the MAC address in a request to mean every bed
+ALL_BEDS = "*"
+
+class DaemonError(Exception):
+    '''
+    The daemon received the request, but could not carry it out.
+    '''
+
+def command_name(command: BedCommands) -> str:
+    '''
+    The spelling of a command used on the command line and over the socket, like "head-up".
+    '''
+    return command.name.lower().replace("_", "-")
+
+def command_from_name(name: str) -> BedCommands:
+    '''
+    Inverse of command_name()
+
+    @raise KeyError: If there is no such command
+    '''
+    return BedCommands[name.upper().replace("-", "_")]
+
+def request_line(command: BedCommands, address: str | None = None) -> bytes:
+    request = command_name(command) if address is None else f"{command_name(command)} {address}"
+    return request.encode() + b"\n"
+
+def send_requests(
+    command: BedCommands,
+    addresses: list[str | None],
+    socket_path: str = DEFAULT_SOCKET_PATH,
+) -> list[str | None]:
+    '''
+    Ask a running daemon to send a command to several beds, over one connection.
+    Blocks until the daemon has replied to every request.
+
+    @param addresses: MAC addresses, ALL_BEDS, or None for whichever bed the daemon finds first
+    @return: For each address, None if the command was sent, or the daemon's reason why not
+
+    @raise OSError: If no daemon is listening on socket_path
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(b"".join(request_line(command, address) for address in addresses))
+        with connection.makefile("rb") as replies:
+            errors = []
+            for _ in addresses:
+                reply = replies.readline().decode().strip()
+                errors.append(None if reply == "OK" else reply.removeprefix("ERR ") or "daemon closed the connection")
+    return errors
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_device_cache.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: Remember beds we have seen before, on disk, so that we can connect to them
+#   directly next time instead of waiting for them to show up in a scan.
+#
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import asdict, dataclass, field
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any
+
+from bleak import BleakClient, BleakError
+from bleak.backends.device import BLEDevice
+
+from .suta_ble_consts import IS_LINUX
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "suta_ble_bed",
+    "devices.json")
+
+# BlueZ uses this adapter when none is given
+DEFAULT_ADAPTER = "hci0"
+# Seconds after which a bed we have not seen is dropped from the cache
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+
+@dataclass
+class CachedBed:
+    address: str
+    name: str | None = None
+    adapter: str | None = None
+    last_seen: float | None = None  # Wall-clock time, since it needs to survive restarts
+    services: dict[str, list[str]] = field(default_factory=dict)  # Service UUID -> characteristic UUIDs
+
+class SutaBleDeviceCache:
+    '''
+    JSON file of beds which have been discovered or connected to in the past.
+    '''
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_age: float | None = DEFAULT_MAX_AGE) -> None:
+        """
+        Constructor
+
+        @param path: Location of the cache file. It is created on first save.
+        @param max_age: Seconds after which a bed which has not been seen is forgotten, or None to keep every bed
+        """
+        self.path = path
+        self.max_age = max_age
+        self._beds: dict[str, CachedBed] = {}
+        self._dirty = False
+        # Every snapshot taken to save is numbered, so that an older one never overwrites a newer one
+        self._version = 0
+        self._written_version = 0
+        self._write_lock = threading.Lock()
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._beds)
+
+    def __contains__(self, address: str) -> bool:
+        return address.upper() in self._beds
+
+    @property
+    def dirty(self) -> bool:
+        '''
+        Whether anything changed since the cache was last loaded or saved.
+        '''
+        return self._dirty
+
+    def get(self, address: str) -> CachedBed | None:
+        return self._beds.get(address.upper())
+
+    def load(self) -> None:
+        try:
+            with open(self.path) as cache_file:
+                entries = json.load(cache_file)
+            self._beds = {entry["address"].upper(): CachedBed(**entry) for entry in entries}
+        except FileNotFoundError:
+            self._beds = {}
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            # A broken cache only costs us a scan, so don't make a fuss
+            logger.warning("Ignoring unreadable device cache %s: %s", self.path, e)
+            self._beds = {}
+        self._dirty = False
+        self.prune()
+
+    def prune(self, now: float | None = None) -> None:
+        '''
+        Forget the beds which have not been seen for max_age seconds. Does not save to disk.
+        '''
+        if self.max_age is None:
+            return
+        cutoff = (now if now is not None else time.time()) - self.max_age
+        stale = [address for address, entry in self._beds.items() if entry.last_seen is not None and entry.last_seen < cutoff]
+        for address in stale:
+            del self._beds[address]
+        if stale:
+            logger.debug("Forgetting %d beds not seen for %d seconds", len(stale), self.max_age)
+            self._dirty = True
+
+    def save(self) -> None:
+        '''
+        Write the cache to disk, if anything changed since it was last loaded or saved.
+        '''
+        if not self._dirty:
+            return
+        entries, version = self._snapshot()
+        try:
+            self._write(entries, version)
+        except BaseException:
+            self._dirty = True
+            raise
+
+    async def save_async(self) -> None:
+        '''
+        Like save(), but writes the file in a worker thread, so as not to hold up the event loop.
+        '''
+        if not self._dirty:
+            return
+        entries, version = self._snapshot()
+        try:
+            await asyncio.to_thread(self._write, entries, version)
+        except BaseException:
+            self._dirty = True
+            raise
+
+    def _snapshot(self) -> tuple[list[dict[str, Any]], int]:
+        # Taken on the caller's thread, so that remember() cannot change the beds while they are written out
+        self.prune()
+        self._version += 1
+        self._dirty = False
+        return [asdict(entry) for entry in self._beds.values()], self._version
+
+    def _write(self, entries: list[dict[str, Any]], version: int) -> None:
+        with self._write_lock:
+            if version < self._written_version:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temporary_path = f"{self.path}.tmp"
+            with open(temporary_path, "w") as cache_file:
+                json.dump(entries, cache_file, indent=1)
+            # Atomic, so a crash mid-write cannot leave a half-written cache behind
+            os.replace(temporary_path, self.path)
+            self._written_version = version
+
+    def remember(
+        self,
+        device: BLEDevice,
+        adapter: str | None = None,
+        client: BleakClient | None = None,
+    ) -> None:
+        '''
+        Record that we have seen, or connected to, a bed. Does not save to disk.
+
+        @param device: The bed's BLEDevice
+        @param adapter: The adapter through which we saw the bed
+        @param client: If connected, used to record the bed's GATT service layout
+        '''
+        address = device.address.upper()
+        entry = self._beds.get(address)
+        if entry is None:
+            entry = self._beds[address] = CachedBed(address)
+
+        entry.name = device.name or entry.name
+        entry.adapter = adapter or entry.adapter
+        entry.last_seen = time.time()
+        if client is not None:
+            try:
+                entry.services = {
+                    service.uuid: [characteristic.uuid for characteristic in service.characteristics]
+                    for service in client.services
+                }
+            except BleakError:
+                # Service discovery has not happened, so there is nothing to record
+                pass
+        self._dirty = True
+
+    def forget(self, address: str) -> None:
+        if self._beds.pop(address.upper(), None) is not None:
+            self._dirty = True
+
+    def ble_device(self, address: str, adapter: str | None = None) -> BLEDevice | None:
+        '''
+        Build a BLEDevice for a remembered bed, which can be connected to without scanning first.
+
+        @param adapter: The adapter to connect through. Defaults to the one the bed was last seen on.
+        @return: None if the bed is unknown, or if the Bluetooth backend cannot connect without a scan
+        '''
+        entry = self.get(address)
+        if entry is None or not IS_LINUX:
+            return None
+        # BlueZ keeps track of devices it has seen before, under a predictable D-Bus path
+        path = f"/org/bluez/{adapter or entry.adapter or DEFAULT_ADAPTER}/dev_{entry.address.replace(':', '_')}"
+        return BLEDevice(entry.address, entry.name, {"path": path, "props": {}})
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_fleet.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: Send the same command to many beds at once
+#
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import typing
+from typing import Callable, Iterable, NamedTuple
+
+from .suta_ble_consts import BedCommands
+
+if typing.TYPE_CHECKING:
+    from .suta_ble_bed import BleSutaBed
+    from .suta_ble_bed_controller import SutaBleBedController
+
+logger = logging.getLogger(__name__)
+
+class FanOutResult(NamedTuple):
+    bed: BleSutaBed
+    sent: bool  # False if the command was replaced by a later one before it went out
+    error: BaseException | None
+    elapsed: float  # Seconds from starting on this bed until it was done
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.sent
+
+def seen_within(seconds: float) -> Callable[[BleSutaBed], bool]:
+    '''
+    Selector for beds which have advertised in the last few seconds.
+    '''
+    def selector(bed: BleSutaBed) -> bool:
+        return bed.last_seen is not None and time.monotonic() - bed.last_seen <= seconds
+    return selector
+
+async def fan_out(
+    controller: SutaBleBedController,
+    command: BedCommands,
+    beds: Iterable[BleSutaBed],
+    parallelism: int,
+    timeout: float | None = None,
+) -> list[FanOutResult]:
+    '''
+    Send one command to several beds concurrently.
+
+    @param controller: The SutaBleBedController the beds belong to
+    @param command: What to send
+    @param beds: The beds to send it to
+    @param parallelism: Maximum number of beds to work on at once on each adapter
+    @param timeout: Seconds to allow each bed, including connecting to it, or None for no limit.
+        A command which times out before it is written is taken back out of the bed's queue.
+    @return: One result per bed, in the same order as beds
+    '''
+    semaphores: dict[str | None, asyncio.Semaphore] = {}
+
+    async def send(bed: BleSutaBed) -> FanOutResult:
+        adapter = controller._adapter_for(bed)
+        semaphore = semaphores.get(adapter)
+        if semaphore is None:
+            semaphore = semaphores[adapter] = asyncio.Semaphore(parallelism)
+
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                sent = await asyncio.wait_for(bed.send_command(command), timeout)
+            except Exception as e:
+                logger.warning("%s: Failed to send %s: %s", bed.device, command.name, e)
+                return FanOutResult(bed, False, e, time.perf_counter() - start)
+            return FanOutResult(bed, sent, None, time.perf_counter() - start)
+
+    return list(await asyncio.gather(*(send(bed) for bed in beds)))
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_health.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: Keep track of which beds are working, and stop waiting on the ones which are not.
+#
+#   Every bed has a circuit breaker. After a few connects in a row fail, the breaker opens,
+#   and connecting to the bed fails straight away with CircuitOpenError, instead of going
+#   through the whole retry sequence again. Once the breaker has been open for a while, one
+#   connect is let through as a probe: if it works the breaker closes, and if not it stays
+#   open for longer. The probes happen in the background, so that a bed which comes back is
+#   ready before anybody asks for it.
+#
+#   Alongside the breaker, each bed gets a score from 0 (down) to 1 (healthy), from how its
+#   recent connects and its writes went, how loudly it is heard and how recently it advertised.
+#
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from enum import Enum
+import logging
+import time
+import typing
+from typing import Callable, NamedTuple
+
+from bleak import BleakError
+
+if typing.TYPE_CHECKING:
+    from .suta_ble_bed import BleSutaBed
+    from .suta_ble_bed_controller import SutaBleBedController
+
+logger = logging.getLogger(__name__)
+
+# Weight of the latest connect in a bed's connect reliability
+RELIABILITY_WEIGHT = 0.3
+# Signal strengths which count as hardly there, and as good as it gets
+WEAK_RSSI = -95
+STRONG_RSSI = -50
+
+class CircuitOpenError(BleakError):
+    '''
+    The bed's circuit breaker is open, so no connection was attempted.
+    '''
+
+class BreakerState(Enum):
+    CLOSED = "closed"  # Working, as far as we know
+    OPEN = "open"  # Down. Connects fail straight away.
+    HALF_OPEN = "half-open"  # A probe connect is in progress
+
+@dataclass(frozen=True)
+class BreakerPolicy:
+    '''
+    When to give up on a bed, and how often to check whether it is back.
+
+    The breaker opens after failure_threshold connects in a row have failed. It stays open
+    for open_for seconds, multiplied by multiplier for every probe in a row which failed,
+    up to max_open_for.
+    '''
+    enabled: bool = True
+    failure_threshold: int = 3
+    open_for: float = 30.0
+    max_open_for: float = 600.0
+    multiplier: float = 2.0
+    # Probe beds whose breaker is open in the background, rather than only when a command comes in
+    background_probes: bool = True
+    # Seconds without an advertisement after which a bed which is not connected scores nothing for freshness
+    stale_after: float = 120.0
+
+    def open_interval(self, failed_probes: int) -> float:
+        return min(self.max_open_for, self.open_for * self.multiplier ** failed_probes)
+
+class HealthReport(NamedTuple):
+    address: str
+    state: BreakerState
+    score: float
+    consecutive_failures: int
+    connects: int
+    connect_failures: int
+    writes: int
+    write_errors: int
+    rssi: int | None
+    seen_ago: float | None  # Seconds since the last advertisement, or None if never heard
+    retry_in: float | None  # Seconds until the next probe, if the breaker is open
+    last_error: str | None
+
+class _Breaker:
+    __slots__ = ("state", "failures", "failed_probes", "connects", "connect_failures",
+                 "reliability", "retry_at", "last_error")
+
+    def __init__(self) -> None:
+        self.state = BreakerState.CLOSED
+        self.failures = 0  # Connects in a row which failed
+        self.failed_probes = 0  # Probes in a row which failed
+        self.connects = 0
+        self.connect_failures = 0
+        # Moving average of connect outcomes, 1 for success and 0 for failure
+        self.reliability = 1.0
+        self.retry_at = 0.0
+        self.last_error: str | None = None
+
+class SutaBleHealthMonitor:
+    '''
+    Circuit breakers and health scores for a controller's beds.
+
+    The breaker only trips on failed connects. A write which fails on a working connection
+    says more about that write than about the bed, so write errors only lower the score.
+
+    Hooks, optional:
+      on_state_change(bed, old, new): A bed's breaker changed state
+    '''
+
+    def __init__(
+        self,
+        controller: SutaBleBedController,
+        policy: BreakerPolicy = BreakerPolicy(),
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Constructor
+
+        @param controller: The SutaBleBedController whose beds we are keeping track of
+        @param policy: When to open the breakers, and when to probe
+        @param clock: Monotonic time in seconds, the same clock as BleSutaBed.last_seen
+        """
+        self.controller = controller
+        self.policy = policy
+        self.clock = clock
+
+        self.on_state_change: Callable[[BleSutaBed, BreakerState, BreakerState], None] | None = None
+
+        self._breakers: dict[str, _Breaker] = {}
+        self._probes: dict[str, asyncio.Task] = {}
+        self._rejections = controller.metrics.counter(
+            "suta_ble_breaker_rejections_total", "Connects refused because the bed's circuit breaker was open")
+
+    def state(self, bed: BleSutaBed) -> BreakerState:
+        breaker = self._breakers.get(bed.device.address.upper())
+        return breaker.state if breaker is not None else BreakerState.CLOSED
+
+    def available(self, bed: BleSutaBed) -> bool:
+        '''
+        Whether connecting to the bed would be attempted now. Usable as a fan_out() selector,
+        to leave out the beds which are down rather than have them fail.
+        '''
+        breaker = self._breakers.get(bed.device.address.upper())
+        if breaker is None or breaker.state is BreakerState.CLOSED:
+            return True
+        return breaker.state is BreakerState.OPEN and self.clock() >= breaker.retry_at
+
+    def score(self, bed: BleSutaBed) -> float:
+        '''
+        How healthy the bed is, from 0 for down to 1 for connecting, writing and advertising fine.
+        '''
+        breaker = self._breakers.get(bed.device.address.upper())
+        if breaker is not None and breaker.state is BreakerState.OPEN:
+            return 0.0
+        reliability = breaker.reliability if breaker is not None else 1.0
+
+        writes, errors = bed._write_totals()
+        write_success = writes / (writes + errors) if writes + errors else 1.0
+
+        if bed.rssi is None:
+            signal = 0.5
+        else:
+            signal = min(1.0, max(0.0, (bed.rssi - WEAK_RSSI) / (STRONG_RSSI - WEAK_RSSI)))
+
+        if bed.is_connected():
+            freshness = 1.0
+        elif bed.last_seen is None:
+            # Adopted from the device cache, and not heard from yet
+            freshness = 0.5
+        else:
+            freshness = max(0.0, 1 - (self.clock() - bed.last_seen) / self.policy.stale_after)
+
+        score = reliability * write_success * (0.5 + 0.25 * signal + 0.25 * freshness)
+        if breaker is not None and breaker.state is BreakerState.HALF_OPEN:
+            score = min(score, 0.25)
+        return score
+
+    def report(self, bed: BleSutaBed) -> HealthReport:
+        address = bed.device.address.upper()
+        breaker = self._breakers.get(address) or _Breaker()
+        now = self.clock()
+        writes, write_errors = bed._write_totals()
+        return HealthReport(
+            address=address,
+            state=breaker.state,
+            score=self.score(bed),
+            consecutive_failures=breaker.failures,
+            connects=breaker.connects,
+            connect_failures=breaker.connect_failures,
+            writes=writes,
+            write_errors=write_errors,
+            rssi=bed.rssi,
+            seen_ago=now - bed.last_seen if bed.last_seen is not None else None,
+            retry_in=max(0.0, breaker.retry_at - now) if breaker.state is BreakerState.OPEN else None,
+            last_error=breaker.last_error,
+        )
+
+    def reports(self) -> list[HealthReport]:
+        '''
+        A report for every bed which has been discovered, least healthy first.
+        '''
+        return sorted((self.report(bed) for bed in self.controller.devices().beds()), key=lambda report: report.score)
+
+    def reset(self, bed: BleSutaBed) -> None:
+        '''
+        Close the bed's breaker and forget its failures, like after replacing its batteries.
+        '''
+        breaker = self._breakers.pop(bed.device.address.upper(), None)
+        task = self._probes.get(bed.device.address.upper())
+        if task is not None:
+            task.cancel()
+        if breaker is not None and breaker.state is not BreakerState.CLOSED:
+            self._call_hook(self.on_state_change, bed, breaker.state, BreakerState.CLOSED)
+
+    def before_connect(self, bed: BleSutaBed) -> None:
+        '''
+        Called by the controller before connecting to a bed.
+
+        @raise CircuitOpenError: If the bed is down, or another connect is already probing it
+        '''
+        if not self.policy.enabled:
+            return
+        breaker = self._breakers.get(bed.device.address.upper())
+        if breaker is None or breaker.state is BreakerState.CLOSED:
+            return
+        if breaker.state is BreakerState.OPEN and self.clock() >= breaker.retry_at:
+            # This connect is the probe
+            self._transition(bed, breaker, BreakerState.HALF_OPEN)
+            return
+        self._rejections.inc()
+        if breaker.state is BreakerState.HALF_OPEN:
+            raise CircuitOpenError(f"{bed.device}: Waiting for a probe connect to finish")
+        raise CircuitOpenError(
+            f"{bed.device}: Down after {breaker.failures} failed connect(s), "
+            f"retrying in {breaker.retry_at - self.clock():.0f}s: {breaker.last_error}")
+
+    def connect_succeeded(self, bed: BleSutaBed) -> None:
+        breaker = self._breaker_for(bed)
+        breaker.connects += 1
+        breaker.failures = 0
+        breaker.failed_probes = 0
+        breaker.reliability += RELIABILITY_WEIGHT * (1.0 - breaker.reliability)
+        if breaker.state is not BreakerState.CLOSED:
+            logger.info("%s: Back, closing the circuit breaker", bed.device)
+            self._transition(bed, breaker, BreakerState.CLOSED)
+
+    def connect_failed(self, bed: BleSutaBed, error: BaseException) -> None:
+        breaker = self._breaker_for(bed)
+        breaker.connects += 1
+        breaker.connect_failures += 1
+        breaker.failures += 1
+        breaker.reliability -= RELIABILITY_WEIGHT * breaker.reliability
+        breaker.last_error = str(error) or type(error).__name__
+        if not self.policy.enabled:
+            return
+
+        if breaker.state is BreakerState.HALF_OPEN:
+            breaker.failed_probes += 1
+        elif breaker.state is BreakerState.CLOSED and breaker.failures < self.policy.failure_threshold:
+            return
+        interval = self.policy.open_interval(breaker.failed_probes)
+        breaker.retry_at = self.clock() + interval
+        if breaker.state is not BreakerState.OPEN:
+            logger.warning("%s: Opening the circuit breaker for %.0fs after %d failed connect(s)",
+                           bed.device, interval, breaker.failures)
+            self._transition(bed, breaker, BreakerState.OPEN)
+        self._schedule_probe(bed)
+
+    def connect_abandoned(self, bed: BleSutaBed) -> None:
+        '''
+        A connect was cancelled before it finished. If it was a probe, let the next connect probe instead.
+        '''
+        breaker = self._breakers.get(bed.device.address.upper())
+        if breaker is not None and breaker.state is BreakerState.HALF_OPEN:
+            breaker.retry_at = self.clock()
+            self._transition(bed, breaker, BreakerState.OPEN)
+
+    async def close(self) -> None:
+        '''
+        Stop every background probe.
+        '''
+        tasks = list(self._probes.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _breaker_for(self, bed: BleSutaBed) -> _Breaker:
+        address = bed.device.address.upper()
+        breaker = self._breakers.get(address)
+        if breaker is None:
+            breaker = self._breakers[address] = _Breaker()
+        return breaker
+
+    def _transition(self, bed: BleSutaBed, breaker: _Breaker, state: BreakerState) -> None:
+        old, breaker.state = breaker.state, state
+        self.controller.metrics.counter(
+            "suta_ble_breaker_transitions_total", "Circuit breaker state changes", state=state.value).inc()
+        self._call_hook(self.on_state_change, bed, old, state)
+
+    def _schedule_probe(self, bed: BleSutaBed) -> None:
+        address = bed.device.address.upper()
+        if not self.policy.background_probes or address in self._probes or not self.controller._scanner_running:
+            return
+        task = asyncio.create_task(self._probe(bed))
+        self._probes[address] = task
+        task.add_done_callback(lambda _: self._probes.pop(address, None) if self._probes.get(address) is task else None)
+
+    async def _probe(self, bed: BleSutaBed) -> None:
+        breaker = self._breaker_for(bed)
+        while breaker.state is BreakerState.OPEN and self.controller._scanner_running:
+            await asyncio.sleep(max(0.0, breaker.retry_at - self.clock()))
+            if breaker.state is not BreakerState.OPEN or self.clock() < breaker.retry_at:
+                # Probed by a command in the meantime, or reset
+                continue
+            if bed.is_connected():
+                return
+            if not self.controller._has_free_slot(bed):
+                # Do not push a bed which is in use out of the pool, just to check on this one.
+                # The next command for this bed will probe it instead.
+                logger.debug("%s: No free connection slot, not probing in the background", bed.device)
+                return
+            logger.debug("%s: Probing", bed.device)
+            try:
+                await bed._ensure_connection()
+            except (asyncio.TimeoutError, BleakError) as e:
+                logger.debug("%s: Probe failed: %s", bed.device, e)
+
+    @staticmethod
+    def _call_hook(hook: Callable | None, *args) -> None:
+        if hook is None:
+            return
+        try:
+            hook(*args)
+        except Exception:
+            logger.exception("Health hook %s raised", hook)
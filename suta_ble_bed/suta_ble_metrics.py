@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_metrics.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: Counters and latency histograms for the scanner, controller and beds,
+#   readable in-process with snapshot() or scraped in the Prometheus text format.
+#
+#   Recording is on the hot path, so callers look a metric up once and keep it,
+#   after which recording is a couple of additions.
+#
+
+from __future__ import annotations
+
+import asyncio
+from bisect import bisect_left
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the histogram buckets. BLE operations range from a
+# millisecond for a write without response to tens of seconds for a stubborn connect.
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = tuple[tuple[str, str], ...]
+
+class Counter:
+    __slots__ = ("value", "created")
+
+    def __init__(self) -> None:
+        self.value = 0
+        self.created = time.monotonic()
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def per_second(self, now: float | None = None) -> float:
+        '''
+        Average rate since the counter was created.
+        '''
+        elapsed = (time.monotonic() if now is None else now) - self.created
+        return self.value / elapsed if elapsed > 0 else 0.0
+
+class Histogram:
+    __slots__ = ("bounds", "buckets", "count", "sum")
+
+    def __init__(self, bounds: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS) -> None:
+        self.bounds = bounds
+        # One more bucket than bounds, for everything above the last bound
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        '''
+        Estimate a quantile as the upper bound of the bucket it falls in.
+        Returns infinity if it falls above the largest bound.
+        '''
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+class SutaBleMetrics:
+    '''
+    Registry of every metric recorded by one controller and the beds it owns.
+    '''
+
+    def __init__(self) -> None:
+        self._metrics: dict[tuple[str, Labels], Counter | Histogram] = {}
+        self._help: dict[str, str] = {}
+
+    def counter(self, name: str, help: str = "", **labels: str) -> Counter:
+        '''
+        Look up a counter, creating it the first time.
+
+        @param name: Prometheus-style metric name, like "suta_ble_advertisements_total"
+        @param help: Description of the metric, for the exporter
+        @param labels: Label names and values which distinguish this counter from others with the same name
+        '''
+        return self._get(name, help, labels, Counter)
+
+    def histogram(self, name: str, help: str = "", **labels: str) -> Histogram:
+        '''
+        Look up a latency histogram, creating it the first time. See counter().
+        '''
+        return self._get(name, help, labels, Histogram)
+
+    def _get(self, name: str, help: str, labels: dict[str, str], kind: type):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            metric = self._metrics[key] = kind()
+            if help:
+                self._help.setdefault(name, help)
+        elif not isinstance(metric, kind):
+            raise TypeError(f"{name} is a {type(metric).__name__}, not a {kind.__name__}")
+        return metric
+
+    def snapshot(self) -> dict[str, list[dict]]:
+        '''
+        Every metric as plain data, for logging or for tests.
+
+            {"suta_ble_write_seconds": [{"labels": {"bed": "AA:..."}, "count": 3, "sum": 0.1, ...}], ...}
+        '''
+        now = time.monotonic()
+        snapshot: dict[str, list[dict]] = {}
+        for (name, labels), metric in self._metrics.items():
+            entry: dict = {"labels": dict(labels)}
+            if isinstance(metric, Counter):
+                entry["value"] = metric.value
+                entry["per_second"] = metric.per_second(now)
+            else:
+                entry.update(
+                    count=metric.count,
+                    sum=metric.sum,
+                    mean=metric.mean,
+                    p50=metric.quantile(0.5),
+                    p99=metric.quantile(0.99),
+                )
+            snapshot.setdefault(name, []).append(entry)
+        return snapshot
+
+    def prometheus(self) -> str:
+        '''
+        Every metric in the Prometheus text exposition format.
+        '''
+        lines: list[str] = []
+        described: set[str] = set()
+        for (name, labels), metric in sorted(self._metrics.items(), key=lambda item: item[0]):
+            if name not in described:
+                described.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {'counter' if isinstance(metric, Counter) else 'histogram'}")
+
+            if isinstance(metric, Counter):
+                lines.append(f"{name}{_format_labels(labels)} {metric.value}")
+                continue
+
+            cumulative = 0
+            for bound, count in zip(metric.bounds + (float("inf"),), metric.buckets):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {metric.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {metric.count}")
+        return "\n".join(lines) + "\n"
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+class SutaBleMetricsExporter:
+    '''
+    Minimal HTTP server which answers every request with SutaBleMetrics.prometheus(),
+    for Prometheus to scrape.
+    '''
+
+    def __init__(self, metrics: SutaBleMetrics, host: str = "127.0.0.1", port: int = 9464) -> None:
+        """
+        Constructor
+
+        @param metrics: The metrics to export
+        @param host: Address to listen on. Defaults to localhost only.
+        @param port: TCP port to listen on, or 0 to pick a free one
+        """
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Serving metrics on http://%s:%d/metrics", self.host, self.port)
+
+    async def close(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            # Skip the request line and headers. There is only one thing to serve.
+            while (await reader.readline()).strip():
+                pass
+            body = self.metrics.prometheus().encode()
+            writer.write(
+                b"HTTP/1.0 200 OK\r\n"
+                b"Content-Type: text/plain; version=0.0.4\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_motion.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: Move the bed to a position, rather than one notch at a time
+#
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+import logging
+import math
+import typing
+
+from .suta_ble_codec import COMMAND_FRAMES
+from .suta_ble_consts import BedCharacteristic, BedCommands, NOTCH_COMMANDS
+from .suta_ble_state import NOTCH_STEPS
+
+if typing.TYPE_CHECKING:
+    from .suta_ble_bed import BleSutaBed
+
+logger = logging.getLogger(__name__)
+
+# Seconds between frames while holding a motion. The motors stop soon after frames stop arriving.
+DEFAULT_HOLD_INTERVAL = 0.1
+
+@dataclass(frozen=True)
+class MotionModel:
+    '''
+    How long the motors take, used to pace commands, and to estimate where the bed is
+    when it does not report its position.
+    '''
+    seconds_per_notch: float = 0.6
+    seconds_to_flat: float = 20.0
+    # How long to wait for the bed to report a new state after a command, before trusting the model instead
+    feedback_timeout: float = 0.5
+
+_UP = {
+    (True, True): BedCommands.HEAD_AND_FEET_UP,
+    (True, False): BedCommands.HEAD_UP,
+    (False, True): BedCommands.FEET_UP,
+}
+_DOWN = {
+    (True, True): BedCommands.HEAD_AND_FEET_DOWN,
+    (True, False): BedCommands.HEAD_DOWN,
+    (False, True): BedCommands.FEET_DOWN,
+}
+
+def _notches(head_delta: int, feet_delta: int) -> list[BedCommands]:
+    commands = []
+    while head_delta or feet_delta:
+        if head_delta > 0 or (head_delta == 0 and feet_delta > 0):
+            # Moving up. Take the feet along if they need to go up too.
+            command = _UP[(head_delta > 0, feet_delta > 0)]
+        else:
+            command = _DOWN[(head_delta < 0, feet_delta < 0)]
+        head_step, feet_step = NOTCH_STEPS[command]
+        head_delta -= head_step
+        feet_delta -= feet_step
+        commands.append(command)
+    return commands
+
+def plan(head: int | None, feet: int | None, target_head: int, target_feet: int) -> list[BedCommands]:
+    '''
+    The fewest commands which take the bed from one position to another.
+
+    Where both ends move in the same direction, they are moved together. Going flat first
+    is used when that is shorter, or when the current position is unknown.
+
+    @param head: Current head position in notches above flat, or None if unknown
+    @param feet: Current feet position, or None if unknown
+    '''
+    via_flat = [BedCommands.FLAT] + _notches(target_head, target_feet)
+    if head is None or feet is None:
+        return via_flat
+
+    direct = _notches(target_head - head, target_feet - feet)
+    return direct if len(direct) <= len(via_flat) else via_flat
+
+class SutaBleMove:
+    '''
+    One move_to() in progress. Replans after every command, based on what the bed reports,
+    so that it stops as soon as it is close enough.
+    '''
+
+    def __init__(
+        self,
+        bed: BleSutaBed,
+        head: int | None,
+        feet: int | None,
+        tolerance: int,
+        model: MotionModel,
+    ) -> None:
+        self.bed = bed
+        self.target_head = head
+        self.target_feet = feet
+        self.tolerance = tolerance
+        self.model = model
+        self.superseded = False
+        self.commands_sent = 0
+
+    async def run(self) -> bool:
+        '''
+        @return: True if the bed ended up within tolerance of the target
+        '''
+        state = self.bed.state
+        head, feet = state.head, state.feet
+        target_head = self.target_head if self.target_head is not None else head
+        target_feet = self.target_feet if self.target_feet is not None else feet
+        if target_head is None or target_feet is None:
+            raise ValueError("The current position is unknown, so both head and feet must be given")
+
+        # Leave room for the plan getting longer because the bed did not do what we expected
+        budget = 2 * len(plan(head, feet, target_head, target_feet)) + 2
+
+        async with self.bed.state_updates() as updates:
+            # The first update is the current state
+            await updates.__anext__()
+
+            while not self._close_enough(head, feet, target_head, target_feet):
+                if self.commands_sent >= budget:
+                    logger.warning("%s: Giving up moving to %s/%s, stuck at %s/%s",
+                                   self.bed.device, target_head, target_feet, head, feet)
+                    return False
+
+                command = plan(head, feet, target_head, target_feet)[0]
+                if not await self.bed.send_command(command):
+                    # Somebody else sent a preset or stopped the bed
+                    return False
+                self.commands_sent += 1
+
+                head, feet = await self._wait_for_motion(updates, command, head, feet)
+        return True
+
+    def _close_enough(self, head, feet, target_head, target_feet) -> bool:
+        return (head is not None and feet is not None
+                and abs(head - target_head) <= self.tolerance
+                and abs(feet - target_feet) <= self.tolerance)
+
+    async def _wait_for_motion(self, updates, command: BedCommands, head, feet) -> tuple[int | None, int | None]:
+        loop = asyncio.get_running_loop()
+        settle_time = self.model.seconds_to_flat if command is BedCommands.FLAT else self.model.seconds_per_notch
+        deadline = loop.time() + settle_time
+
+        # Where the model says we should be
+        if command is BedCommands.FLAT:
+            head, feet = 0, 0
+        elif head is not None and feet is not None:
+            head_step, feet_step = NOTCH_STEPS[command]
+            head, feet = max(0, head + head_step), max(0, feet + feet_step)
+
+        try:
+            state = await asyncio.wait_for(updates.__anext__(), self.model.feedback_timeout)
+        except asyncio.TimeoutError:
+            logger.debug("%s: No feedback for %s, going by the motion model", self.bed.device, command.name)
+        else:
+            # The bed told us where it is, which beats the model
+            if state.head is not None and state.feet is not None:
+                head, feet = state.head, state.feet
+
+        # Give the motors time to actually move before sending the next command
+        await asyncio.sleep(max(0.0, deadline - loop.time()))
+        return head, feet
+
+@dataclass
+class MotionJitter:
+    '''
+    How closely a SutaBleMotionStream kept to its schedule.
+    Lateness is how long after its scheduled time each frame actually went out.
+    '''
+    frames: int = 0
+    skipped: int = 0  # Slots dropped because a write took longer than the interval
+    mean_lateness: float = 0.0
+    max_lateness: float = 0.0
+
+    def record(self, lateness: float) -> None:
+        self.frames += 1
+        self.mean_lateness += (lateness - self.mean_lateness) / self.frames
+        self.max_lateness = max(self.max_lateness, lateness)
+
+class SutaBleMotionStream:
+    '''
+    Keep sending one notch command at a steady rate, for as long as the motion is held.
+
+    Frames are scheduled against the monotonic clock from the start of the motion, so
+    any delay on one frame does not push back all the ones after it. Holds the bed's
+    operation lock for the duration, so that queued commands cannot interleave.
+
+        async with bed.hold(BedCommands.HEAD_UP):
+            await button_released.wait()
+    '''
+
+    def __init__(self, bed: BleSutaBed, command: BedCommands, interval: float = DEFAULT_HOLD_INTERVAL) -> None:
+        """
+        Constructor
+
+        @param bed: The bed to move
+        @param command: The notch command to repeat
+        @param interval: Seconds between frames
+        """
+        if command not in NOTCH_COMMANDS:
+            raise ValueError(f"{command.name} is not a notch command, so there is nothing to hold")
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+
+        self.bed = bed
+        self.command = command
+        self.interval = interval
+        self.jitter = MotionJitter()
+
+        self._frame = COMMAND_FRAMES[command]
+        self._mode = bed.write_mode_for(command)
+        self._task: asyncio.Task | None = None
+        self._holding_lock = False
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        # Anything still queued would only fight with the motion we are about to hold
+        await self.bed._commands.stop()
+        await self.bed._operation_lock.acquire()
+        self._holding_lock = True
+        try:
+            await self.bed._ensure_connection()
+        except BaseException:
+            self._release()
+            raise
+        self._task = asyncio.create_task(self._run(self.bed._client))
+
+    async def stop(self) -> MotionJitter:
+        '''
+        Stop sending frames.
+
+        @return: How closely the schedule was kept
+        @raise BleakError: If sending a frame failed, which will also have stopped the motion
+        '''
+        try:
+            if self._task is not None:
+                self._task.cancel()
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
+        finally:
+            self._release()
+        logger.debug("%s: Held %s for %d frames, lateness mean %.1fms max %.1fms",
+                     self.bed.device, self.command.name, self.jitter.frames,
+                     self.jitter.mean_lateness * 1000, self.jitter.max_lateness * 1000)
+        return self.jitter
+
+    def _release(self) -> None:
+        if self._holding_lock:
+            self._holding_lock = False
+            self.bed._operation_lock.release()
+            self.bed.controller._touch(self.bed)
+
+    async def _run(self, client) -> None:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        slot = 0
+        while True:
+            deadline = start + slot * self.interval
+            delay = deadline - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.jitter.record(loop.time() - deadline)
+
+            await self.bed._send(client, BedCharacteristic.CONTROL_COMMAND, self._frame, self._mode)
+            # In case _send() had to fall back
+            self._mode = self.bed.write_mode_for(self.command)
+
+            # If the write overran, skip the slots we missed rather than sending a burst to catch up
+            next_slot = max(slot + 1, math.ceil((loop.time() - start) / self.interval))
+            self.jitter.skipped += next_slot - slot - 1
+            slot = next_slot
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_prewarm.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: Connect to beds before anybody asks for them, so that the first command
+#   does not have to wait for the connection.
+#
+#   Beds can be connected as soon as they are discovered, a little ahead of fixed times
+#   of day, like a bedtime routine, or a little ahead of the times of day at which they
+#   have been used on several recent days. Pre-warming only ever takes free connection
+#   slots, and never pushes a bed which is in use out of the pool.
+#
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, time as time_of_day, timedelta
+import logging
+import typing
+from typing import Callable, Iterable
+
+from bleak import BleakError
+
+from .suta_ble_metrics import Counter, SutaBleMetrics
+
+if typing.TYPE_CHECKING:
+    from .suta_ble_bed import BleSutaBed
+    from .suta_ble_bed_controller import SutaBleBedController
+
+logger = logging.getLogger(__name__)
+
+# Look at the clock at least this often while waiting, in case it jumps or new usage is learned
+MAX_SLEEP = 60.0
+
+def link_counters(metrics: SutaBleMetrics) -> tuple[Counter, Counter]:
+    '''
+    Counters of writes which found the bed already connected, and of those which had to connect first.
+    '''
+    help = "Writes by whether the bed was already connected"
+    return (
+        metrics.counter("suta_ble_command_links_total", help, link="warm"),
+        metrics.counter("suta_ble_command_links_total", help, link="cold"),
+    )
+
+@dataclass(frozen=True)
+class PrewarmSchedule:
+    '''
+    Connect ahead of a time of day, like the start of a bedtime routine.
+    '''
+    at: time_of_day
+    # Addresses of the beds to connect. Empty for every bed which has been discovered.
+    addresses: frozenset[str] = field(default_factory=frozenset)
+
+@dataclass(frozen=True)
+class PrewarmPolicy:
+    '''
+    When to connect to beds ahead of time. The default policy never does.
+
+    Usage is learned in slots of slot seconds of the day. A bed is connected lead seconds
+    before each slot in which it was used on at least min_days of the last history_days days.
+    Keep lead below the controller's idle_timeout, or the connection will be closed again
+    before it is used.
+    '''
+    on_discovery: bool = False
+    schedules: tuple[PrewarmSchedule, ...] = ()
+    learn_usage: bool = False
+    lead: float = 30.0
+    slot: float = 600.0
+    history_days: int = 7
+    min_days: int = 3
+
+class SutaBleConnectionPrewarmer:
+    '''
+    Connects beds according to a PrewarmPolicy, and tells how often that paid off.
+
+    hits counts writes which found the bed already connected, and misses the ones which
+    had to connect first. The beds count both whatever the policy, so they also show
+    whether pre-warming is worth turning on.
+    '''
+
+    def __init__(
+        self,
+        controller: SutaBleBedController,
+        policy: PrewarmPolicy = PrewarmPolicy(),
+        clock: Callable[[], datetime] = datetime.now,
+    ) -> None:
+        """
+        Constructor
+
+        @param controller: The SutaBleBedController whose beds to connect
+        @param policy: When to connect
+        @param clock: Local wall-clock time, which schedules and learned usage refer to
+        """
+        self.controller = controller
+        self.policy = policy
+        self.clock = clock
+
+        metrics = controller.metrics
+        self._hits, self._misses = link_counters(metrics)
+        self._connects = metrics.counter("suta_ble_prewarm_connects_total", "Connections made ahead of use")
+        self._skipped = metrics.counter("suta_ble_prewarm_skipped_total", "Pre-warms skipped for want of a free connection slot")
+
+        # Days on which each bed was used in each slot of the day, as date ordinals
+        self._usage: dict[str, dict[int, set[int]]] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._task: asyncio.Task | None = None
+
+    @property
+    def hits(self) -> int:
+        return self._hits.value
+
+    @property
+    def misses(self) -> int:
+        return self._misses.value
+
+    @property
+    def hit_rate(self) -> float:
+        '''
+        Fraction of writes which found the bed already connected.
+        '''
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def start(self) -> None:
+        if self.policy.on_discovery:
+            # Discovered while the scanners were starting up
+            self._prewarm_addresses(None)
+        if self.policy.schedules or self.policy.learn_usage:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        tasks = list(self._tasks.values())
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def bed_discovered(self, bed: BleSutaBed) -> None:
+        '''
+        Called by the scanner when a bed is heard from for the first time.
+        '''
+        if self.policy.on_discovery and self.controller._scanner_running:
+            self.prewarm(bed)
+
+    def bed_used(self, bed: BleSutaBed) -> None:
+        '''
+        Called by the controller whenever a bed's connection is used.
+        '''
+        if self.policy.learn_usage:
+            self._record_usage(bed.device.address.upper(), self.clock())
+
+    def prewarm(self, bed: BleSutaBed) -> None:
+        '''
+        Connect to the bed in the background, if there is a free connection slot for it.
+        '''
+        address = bed.device.address.upper()
+        if address in self._tasks or bed.is_connected() or self.controller.reconnector.is_reconnecting(bed):
+            return
+        task = asyncio.create_task(self._connect(bed))
+        self._tasks[address] = task
+        task.add_done_callback(lambda _: self._tasks.pop(address, None))
+
+    def predicted(self, address: str) -> list[time_of_day]:
+        '''
+        Times of day at which the bed has regularly been used lately.
+        '''
+        slots = self._usage.get(address.upper(), {})
+        return sorted(
+            self._slot_start(slot) for slot, days in slots.items()
+            if len(days) >= self.policy.min_days)
+
+    def next_prewarm(self, now: datetime | None = None) -> tuple[datetime, set[str] | None] | None:
+        '''
+        When the next pre-warm is due, and which beds it is for.
+
+        @return: The time, and the addresses of the beds or None for every bed. None if nothing is due, ever.
+        '''
+        if now is None:
+            now = self.clock()
+        due: datetime | None = None
+        addresses: set[str] | None = set()
+        for at, targets in self._targets():
+            when = self._next_occurrence(at, now)
+            if due is None or when < due:
+                due, addresses = when, None if targets is None else set(targets)
+            elif when == due:
+                addresses = None if addresses is None or targets is None else addresses | set(targets)
+        if due is None:
+            return None
+        return due, addresses
+
+    async def _run(self) -> None:
+        last_checked = self.clock()
+        while True:
+            now = self.clock()
+            for at, targets in self._targets():
+                when = self._next_occurrence(at, last_checked)
+                if when <= now:
+                    self._prewarm_addresses(targets)
+            last_checked = now
+
+            upcoming = self.next_prewarm(now)
+            delay = MAX_SLEEP if upcoming is None else (upcoming[0] - now).total_seconds()
+            await asyncio.sleep(min(MAX_SLEEP, max(0.0, delay)))
+
+    def _targets(self) -> Iterable[tuple[time_of_day, Iterable[str] | None]]:
+        '''
+        Every (time of day to connect at, addresses or None for every bed).
+        '''
+        lead = timedelta(seconds=self.policy.lead)
+        for schedule in self.policy.schedules:
+            yield self._shift(schedule.at, -lead), schedule.addresses or None
+        if self.policy.learn_usage:
+            for address in self._usage:
+                for at in self.predicted(address):
+                    yield self._shift(at, -lead), (address,)
+
+    def _prewarm_addresses(self, addresses: Iterable[str] | None) -> None:
+        registry = self.controller._bed_scanner
+        if addresses is None:
+            beds = registry.beds()
+        else:
+            beds = [bed for bed in map(registry.get, addresses) if bed is not None]
+        for bed in beds:
+            self.prewarm(bed)
+
+    async def _connect(self, bed: BleSutaBed) -> None:
+        if not self.controller._has_free_slot(bed):
+            logger.debug("%s: No free connection slot, not pre-warming", bed.device)
+            self._skipped.inc()
+            return
+        try:
+            await bed._ensure_connection()
+        except (asyncio.TimeoutError, BleakError) as e:
+            logger.debug("%s: Pre-warming failed: %s", bed.device, e)
+            return
+        logger.debug("%s: Pre-warmed", bed.device)
+        self._connects.inc()
+
+    def _record_usage(self, address: str, now: datetime) -> None:
+        slots = self._usage.setdefault(address, {})
+        today = now.toordinal()
+        slots.setdefault(self._slot_of(now), set()).add(today)
+        oldest = today - self.policy.history_days
+        for slot in list(slots):
+            days = slots[slot]
+            days.difference_update([day for day in days if day <= oldest])
+            if not days:
+                del slots[slot]
+
+    def _slot_of(self, now: datetime) -> int:
+        seconds = now.hour * 3600 + now.minute * 60 + now.second
+        return int(seconds // self.policy.slot)
+
+    def _slot_start(self, slot: int) -> time_of_day:
+        return self._shift(time_of_day(), timedelta(seconds=slot * self.policy.slot))
+
+    @staticmethod
+    def _shift(at: time_of_day, by: timedelta) -> time_of_day:
+        return (datetime.combine(datetime.min.date() + timedelta(days=1), at) + by).time()
+
+    @staticmethod
+    def _next_occurrence(at: time_of_day, after: datetime) -> datetime:
+        '''
+        The first time after the given one at which the clock reads at.
+        '''
+        when = datetime.combine(after.date(), at, tzinfo=after.tzinfo)
+        if when <= after:
+            when += timedelta(days=1)
+        return when
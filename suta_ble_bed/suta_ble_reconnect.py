@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_reconnect.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: Re-establish connections to beds which dropped off unexpectedly, in the background,
+#   so that the next command does not have to wait for the connection.
+#
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+import logging
+import random
+import typing
+from typing import Callable
+
+from bleak import BleakError
+
+if typing.TYPE_CHECKING:
+    from .suta_ble_bed import BleSutaBed
+    from .suta_ble_bed_controller import SutaBleBedController
+
+logger = logging.getLogger(__name__)
+
+# How many beds may be reconnecting at the same time on one adapter
+DEFAULT_MAX_CONCURRENT_RECONNECTS = 2
+
+@dataclass(frozen=True)
+class ReconnectPolicy:
+    '''
+    How hard to try to get a bed back after it disconnects unexpectedly.
+
+    The n-th attempt waits initial_delay * multiplier ** n seconds, capped at max_delay,
+    and then randomly stretched or shrunk by up to the jitter fraction so that beds
+    which dropped together do not all retry at the same instant.
+    '''
+    enabled: bool = True
+    initial_delay: float = 0.5
+    max_delay: float = 30.0
+    multiplier: float = 2.0
+    jitter: float = 0.5
+    max_attempts: int | None = 10
+
+    def delay(self, attempt: int) -> float:
+        base = min(self.max_delay, self.initial_delay * self.multiplier ** attempt)
+        return base * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+class SutaBleReconnectSupervisor:
+    '''
+    Watches for unexpected disconnects and reconnects in the background.
+
+    Hooks, all optional, to observe how long beds are unavailable:
+      on_unavailable(bed): The bed dropped unexpectedly
+      on_reconnected(bed, downtime, attempts): The bed is back, after downtime seconds
+      on_gave_up(bed, downtime, attempts): The policy ran out of attempts
+    '''
+
+    def __init__(
+        self,
+        controller: SutaBleBedController,
+        default_policy: ReconnectPolicy = ReconnectPolicy(),
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT_RECONNECTS,
+    ) -> None:
+        """
+        Constructor
+
+        @param controller: The SutaBleBedController whose beds we are looking after
+        @param default_policy: Policy for any bed without one of its own
+        @param max_concurrent: Maximum number of simultaneous reconnects per adapter
+        """
+        self.controller = controller
+        self.default_policy = default_policy
+        self.max_concurrent = max_concurrent
+
+        self.on_unavailable: Callable[[BleSutaBed], None] | None = None
+        self.on_reconnected: Callable[[BleSutaBed, float, int], None] | None = None
+        self.on_gave_up: Callable[[BleSutaBed, float, int], None] | None = None
+
+        self._policies: dict[str, ReconnectPolicy] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._semaphores: dict[str | None, asyncio.Semaphore] = {}
+
+    def set_policy(self, address: str, policy: ReconnectPolicy | None) -> None:
+        '''
+        Override the reconnect policy for one bed. Pass None to go back to the default.
+        '''
+        if policy is None:
+            self._policies.pop(address.upper(), None)
+        else:
+            self._policies[address.upper()] = policy
+
+    def policy_for(self, bed: BleSutaBed) -> ReconnectPolicy:
+        return self._policies.get(bed.device.address.upper(), self.default_policy)
+
+    def is_reconnecting(self, bed: BleSutaBed) -> bool:
+        return bed.device.address.upper() in self._tasks
+
+    def bed_disconnected(self, bed: BleSutaBed) -> None:
+        '''
+        Called by the controller when a bed disconnects without us asking it to.
+        '''
+        address = bed.device.address.upper()
+        self._call_hook(self.on_unavailable, bed)
+
+        if not self.policy_for(bed).enabled or address in self._tasks:
+            return
+
+        task = asyncio.create_task(self._reconnect(bed, asyncio.get_running_loop().time()))
+        self._tasks[address] = task
+        task.add_done_callback(lambda _: self._tasks.pop(address, None))
+
+    def cancel(self, bed: BleSutaBed) -> None:
+        task = self._tasks.get(bed.device.address.upper())
+        if task is not None:
+            task.cancel()
+
+    async def close(self) -> None:
+        '''
+        Stop every reconnect in progress.
+        '''
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _reconnect(self, bed: BleSutaBed, dropped_at: float) -> None:
+        policy = self.policy_for(bed)
+        loop = asyncio.get_running_loop()
+        attempt = 0
+
+        while policy.max_attempts is None or attempt < policy.max_attempts:
+            await asyncio.sleep(policy.delay(attempt))
+            attempt += 1
+
+            if bed.is_connected():
+                # Somebody else, probably a command, already got it back
+                break
+
+            if not self.controller._has_free_slot(bed):
+                # Do not push a bed which is actually in use out of the pool.
+                # This bed will be connected on demand instead.
+                logger.debug("%s: No free connection slot, not reconnecting in the background", bed.device)
+                return
+
+            async with self._semaphore_for(self.controller._adapter_for(bed)):
+                try:
+                    await bed._ensure_connection()
+                except (asyncio.TimeoutError, BleakError) as e:
+                    logger.debug("%s: Reconnect attempt %d failed: %s", bed.device, attempt, e)
+                    continue
+            break
+        else:
+            logger.warning("%s: Giving up reconnecting after %d attempts", bed.device, attempt)
+            self._call_hook(self.on_gave_up, bed, loop.time() - dropped_at, attempt)
+            return
+
+        downtime = loop.time() - dropped_at
+        logger.info("%s: Reconnected after %.2fs", bed.device, downtime)
+        self._call_hook(self.on_reconnected, bed, downtime, attempt)
+
+    def _semaphore_for(self, adapter: str | None) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(adapter)
+        if semaphore is None:
+            semaphore = self._semaphores[adapter] = asyncio.Semaphore(self.max_concurrent)
+        return semaphore
+
+    @staticmethod
+    def _call_hook(hook: Callable | None, *args) -> None:
+        if hook is None:
+            return
+        try:
+            hook(*args)
+        except Exception:
+            logger.exception("Reconnect hook %s raised", hook)
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_scan_policy.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: Decide what the scanners listen for, and when they listen at all.
+#
+#   Scanning continuously wakes us for every BLE device nearby, and competes for airtime
+#   with the connections to the beds. Once every bed we expect has been found there is
+#   little to gain from it, so scanning is cut back to short windows.
+#
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from enum import Enum
+import logging
+import time
+import typing
+from typing import Any
+
+from .suta_ble_consts import BED_LOCAL_NAME, IS_LINUX, BedServices
+from .suta_ble_health import BreakerState
+
+if typing.TYPE_CHECKING:
+    from .suta_ble_bed_controller import SutaBleBedController
+
+logger = logging.getLogger(__name__)
+
+class ScanFilter(Enum):
+    '''
+    How early in the stack advertisements from other devices are dropped.
+    '''
+    # Everything reaches our callback, which checks the name. Works everywhere.
+    NONE = "none"
+    # The OS only reports devices advertising BedServices.CONTROL. Only for beds whose firmware advertises it.
+    SERVICE_UUID = "service-uuid"
+    # BlueZ matches the advertised name in the controller, using a passive scan. Linux only,
+    # needs BlueZ's experimental features, and the bed's name must be in the advertisement itself.
+    NAME = "name"
+
+def scanner_kwargs(scan_filter: ScanFilter, adapter: str | None = None) -> dict[str, Any]:
+    '''
+    Extra keyword arguments for BleakScanner which implement the given filter.
+
+    @param adapter: The adapter to scan on, or None for the default one
+    '''
+    kwargs = _filter_kwargs(scan_filter)
+    if adapter is None:
+        return kwargs
+    try:
+        from bleak.args.bluez import BlueZScannerArgs
+        in_bluez_args = "adapter" in BlueZScannerArgs.__annotations__
+    except ImportError:
+        in_bluez_args = False
+    if in_bluez_args:
+        # Always a dict of our own: BleakScanner writes the deprecated adapter keyword into its
+        # shared default, after which every scanner would scan on the first adapter
+        kwargs["bluez"] = {**kwargs.get("bluez", {}), "adapter": adapter}
+    else:
+        # bleak before the adapter moved into the BlueZ arguments
+        kwargs["adapter"] = adapter
+    return kwargs
+
+def _filter_kwargs(scan_filter: ScanFilter) -> dict[str, Any]:
+    if scan_filter is ScanFilter.SERVICE_UUID:
+        return {"service_uuids": [BedServices.CONTROL.value]}
+    if scan_filter is ScanFilter.NAME:
+        if not IS_LINUX:
+            logger.warning("Filtering by name needs BlueZ, scanning without a filter instead")
+            return {}
+        from bleak.assigned_numbers import AdvertisementDataType
+        try:
+            from bleak.args.bluez import OrPattern
+        except ImportError:
+            # bleak before 1.0
+            from bleak.backends.bluezdbus.advertisement_monitor import OrPattern
+        return {
+            "scanning_mode": "passive",
+            "bluez": {"or_patterns": [
+                OrPattern(0, AdvertisementDataType.COMPLETE_LOCAL_NAME, BED_LOCAL_NAME.encode()),
+            ]},
+        }
+    return {}
+
+@dataclass(frozen=True)
+class ScanPolicy:
+    '''
+    When to scan. Scanning is continuous for the first startup seconds, and for as long
+    as any bed is missing or anybody is waiting for a bed to show up. Otherwise it
+    only scans for window seconds out of every interval.
+    '''
+    startup: float = 30.0
+    window: float = 5.0
+    interval: float = 60.0
+    # A bed which is not connected and has not advertised for this long counts as missing
+    missing_after: float = 120.0
+    # ... unless it has not been heard for this long either, and is not expected, so a bed which
+    # was taken away does not keep us scanning for good
+    forget_after: float = 3600.0
+    # Full scan windows to spend looking for a missing bed, before giving up on it until it is heard again
+    max_missing_windows: int = 3
+    # Stop scanning while connecting, which is when it interferes most
+    pause_while_connecting: bool = True
+    # Addresses of beds to wait for, in addition to every bed found or cached so far
+    expected: frozenset[str] = field(default_factory=frozenset)
+
+class SutaBleScanDutyCycle:
+    '''
+    Starts and stops a controller's scanners according to a ScanPolicy.
+    '''
+
+    def __init__(self, controller: SutaBleBedController, policy: ScanPolicy) -> None:
+        """
+        Constructor
+
+        @param controller: The controller whose scanners to manage
+        @param policy: When to scan
+        """
+        self.controller = controller
+        self.policy = policy
+        self.scanning = True  # The controller starts its scanners before handing them over
+        self.windows = 0  # Times scanning was started after having been stopped
+
+        self._expected = {address.upper() for address in policy.expected}
+        # Full scan windows spent looking for each missing bed, so far
+        self._missing_windows: dict[str, int] = {}
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def wake(self) -> None:
+        '''
+        Something changed which may call for scanning, so look again straight away.
+        '''
+        self._wake.set()
+
+    def missing(self, now: float | None = None) -> set[str]:
+        '''
+        Addresses of the beds worth scanning for: expected, or heard within forget_after, but not
+        connected and not heard from lately. Beds whose circuit breaker is open, and beds which
+        max_missing_windows full scan windows have not turned up, are left out.
+        '''
+        candidates = self._candidates(now)
+        # Heard again, or no longer worth looking for, so start counting afresh next time
+        self._missing_windows = {
+            address: windows for address, windows in self._missing_windows.items() if address in candidates}
+        return {
+            address for address in candidates
+            if self._missing_windows.get(address, 0) < self.policy.max_missing_windows}
+
+    def _candidates(self, now: float | None) -> set[str]:
+        if now is None:
+            now = time.monotonic()
+        registry = self.controller._bed_scanner
+        health = self.controller.health
+        candidates = {address for address in self._expected if address not in registry}
+        for bed in registry.beds():
+            if bed.is_connected() or health.state(bed) is BreakerState.OPEN:
+                continue
+            address = bed.device.address.upper()
+            if bed.last_seen is None:
+                # Adopted from the device cache, and never heard from
+                if address in self._expected:
+                    candidates.add(address)
+                continue
+            age = now - bed.last_seen
+            if age > self.policy.missing_after and (address in self._expected or age <= self.policy.forget_after):
+                candidates.add(address)
+        return candidates
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        startup_ends = loop.time() + self.policy.startup
+        window_ends = next_window = startup_ends
+        while True:
+            self._wake.clear()
+            now = loop.time()
+            looking_for: set[str] = set()
+            if self.controller._bed_scanner._waiters:
+                # Somebody needs a bed to advertise, which may include a connect in progress
+                scan, timeout = True, self.policy.window
+                window_ends, next_window = now, now + self.policy.interval
+            elif self.policy.pause_while_connecting and self.controller._connecting:
+                # Woken again once the connect is done
+                scan, timeout = False, None
+            elif now < startup_ends or (looking_for := self.missing()):
+                scan, timeout = True, self.policy.window
+                if now < startup_ends:
+                    timeout = min(timeout, startup_ends - now)
+                window_ends, next_window = now, now + self.policy.interval
+            elif now < window_ends:
+                scan, timeout = True, window_ends - now
+            elif now >= next_window:
+                window_ends, next_window = now + self.policy.window, now + self.policy.interval
+                scan, timeout = True, self.policy.window
+            else:
+                scan, timeout = False, next_window - now
+
+            await self._set_scanning(scan)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                # A whole window went by without the missing beds turning up
+                for address in looking_for:
+                    self._missing_windows[address] = self._missing_windows.get(address, 0) + 1
+
+    async def _set_scanning(self, scan: bool) -> None:
+        if scan == self.scanning:
+            return
+        self.scanning = scan
+        scanners = self.controller._bleak_scanners.values()
+        if scan:
+            self.windows += 1
+            logger.debug("Resuming scanning")
+            results = await asyncio.gather(*(scanner.start() for scanner in scanners), return_exceptions=True)
+        else:
+            logger.debug("Pausing scanning")
+            results = await asyncio.gather(*(scanner.stop() for scanner in scanners), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.warning("Failed to %s scanning: %s", "start" if scan else "stop", result)
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_scenes.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: Timed sequences of commands for one or more beds, described in JSON or TOML.
+#
+#   name = "wake up"
+#   beds = ["AA:BB:CC:DD:EE:FF"]  # Optional, defaults to every bed which has been discovered
+#
+#   [[steps]]
+#   command = "head-up"
+#   repeat = 5
+#
+#   [[steps]]
+#   command = "vibrate-feet"
+#   after = 1  # Seconds after the previous step
+#
+#   [[steps]]
+#   command = "vibrate-feet"
+#   after = 600
+#
+#   [[steps]]
+#   command = "flat"
+#   at = "06:30"  # The next time the clock reads 06:30, after the previous step
+#
+#   Every step is scheduled against the time the previous step was due, not the time it
+#   finished, so lateness does not add up over a long scene. Pausing a scene delays the
+#   steps which follow, up to the next step which is at a fixed time of day.
+#
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, time as time_of_day, timedelta
+from enum import Enum
+import json
+import logging
+import os
+import typing
+from typing import Any, Callable, Sequence
+
+from .suta_ble_consts import BedCommands
+from .suta_ble_daemon_client import command_from_name
+from .suta_ble_scheduler import SutaBleScheduler, Timer
+
+if typing.TYPE_CHECKING:
+    from .suta_ble_bed import BleSutaBed
+    from .suta_ble_bed_controller import SutaBleBedController
+
+logger = logging.getLogger(__name__)
+
+class SceneError(ValueError):
+    '''
+    A scene description which does not make sense.
+    '''
+
+@dataclass(frozen=True)
+class SceneStep:
+    command: BedCommands
+    after: float = 0.0  # Seconds after the previous step was due
+    at: time_of_day | None = None  # Or the next time the clock reads this, after the previous step
+    repeat: int = 1  # Times to send the command
+    every: float = 0.0  # Seconds between repeats. With 0, the repeats are sent back to back.
+
+@dataclass(frozen=True)
+class Scene:
+    name: str
+    steps: tuple[SceneStep, ...]
+    beds: tuple[str, ...] = field(default=())  # Addresses. Empty for every bed which has been discovered.
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Scene:
+        '''
+        Build a scene from a parsed JSON or TOML description.
+
+        @raise SceneError: If the description is not valid
+        '''
+        try:
+            steps = tuple(_parse_step(step) for step in data["steps"])
+            beds = tuple(address.upper() for address in data.get("beds", ()))
+            return cls(str(data.get("name", "scene")), steps, beds)
+        except SceneError:
+            raise
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise SceneError(f"Invalid scene: {e!r}") from e
+
+def _parse_step(data: dict[str, Any]) -> SceneStep:
+    unknown = set(data) - {"command", "after", "at", "repeat", "every"}
+    if unknown:
+        raise SceneError(f"Unknown step field(s): {', '.join(sorted(unknown))}")
+    try:
+        command = command_from_name(data["command"])
+    except KeyError:
+        raise SceneError(f"Unknown command in step {data!r}") from None
+    if "at" in data and "after" in data:
+        raise SceneError(f"Step {data!r} has both 'at' and 'after'")
+    at = data.get("at")
+    if at is not None and not isinstance(at, time_of_day):
+        # TOML has its own time type, JSON needs "HH:MM[:SS]"
+        at = time_of_day.fromisoformat(at)
+    step = SceneStep(command, float(data.get("after", 0)), at, int(data.get("repeat", 1)), float(data.get("every", 0)))
+    if step.after < 0 or step.every < 0 or step.repeat < 1:
+        raise SceneError(f"Step {data!r} goes back in time or repeats less than once")
+    return step
+
+def load_scene(path: str) -> Scene:
+    '''
+    Read a scene from a .json or .toml file.
+
+    @raise SceneError: If the file does not describe a valid scene
+    '''
+    if os.path.splitext(path)[1].lower() == ".toml":
+        try:
+            import tomllib
+        except ImportError:
+            # Python before 3.11
+            import tomli as tomllib
+        with open(path, "rb") as file:
+            try:
+                data = tomllib.load(file)
+            except tomllib.TOMLDecodeError as e:
+                raise SceneError(f"{path}: {e}") from e
+    else:
+        with open(path) as file:
+            try:
+                data = json.load(file)
+            except json.JSONDecodeError as e:
+                raise SceneError(f"{path}: {e}") from e
+    return Scene.from_dict(data)
+
+class SceneState(Enum):
+    RUNNING = "running"
+    PAUSED = "paused"
+    FINISHED = "finished"
+    CANCELLED = "cancelled"
+
+class _PlannedStep(typing.NamedTuple):
+    command: BedCommands
+    count: int
+    # Seconds after the start of the scene, moved back by pauses, or a fixed loop time
+    relative: bool
+    offset: float
+
+class SceneRun:
+    '''
+    One run of a scene, started by SutaBleSceneEngine.start().
+
+    jitter holds, for every step which has come up so far, how many seconds after it
+    was due the scheduler got to it. errors holds (step, bed, exception) for every
+    command which could not be sent. Failed commands do not stop the scene.
+    '''
+
+    def __init__(
+        self,
+        engine: SutaBleSceneEngine,
+        scene: Scene,
+        beds: Sequence[BleSutaBed] | None,
+    ) -> None:
+        self.engine = engine
+        self.scene = scene
+        self.state = SceneState.RUNNING
+        self.jitter: list[float] = []
+        self.errors: list[tuple[int, BleSutaBed | None, BaseException]] = []
+
+        self._beds = beds
+        self._start = engine.scheduler.time()
+        self._steps = _plan(scene, self._start, engine.clock())
+        self._index = 0
+        self._timer: Timer | None = None
+        self._paused_at: float | None = None
+        self._tasks: set[asyncio.Task] = set()
+        # Steps being sent to each bed right now, whose queued commands a cancel needs to drop
+        self._sending: dict[BleSutaBed, int] = {}
+        self._stopping: list[asyncio.Task] = []
+        self._finished = asyncio.Event()
+        self._schedule()
+
+    def __repr__(self) -> str:
+        return f"SceneRun({self.scene.name!r}, {self.state.name}, step {self._index}/{len(self._steps)})"
+
+    def next_due(self) -> float | None:
+        '''
+        Loop time at which the next step is due, or None if there are no more.
+        '''
+        if self._index >= len(self._steps):
+            return None
+        step = self._steps[self._index]
+        return self._start + step.offset if step.relative else step.offset
+
+    def pause(self) -> None:
+        if self.state is not SceneState.RUNNING:
+            return
+        self.state = SceneState.PAUSED
+        self._paused_at = self.engine.scheduler.time()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def resume(self) -> None:
+        if self.state is not SceneState.PAUSED:
+            return
+        self.state = SceneState.RUNNING
+        self._start += self.engine.scheduler.time() - self._paused_at
+        self._paused_at = None
+        self._schedule()
+
+    def cancel(self) -> None:
+        '''
+        Stop the scene, including any commands which are still being sent. Motion commands
+        still queued for the beds it was sending to are dropped, whoever queued them.
+        '''
+        if self.state in (SceneState.FINISHED, SceneState.CANCELLED):
+            return
+        self.state = SceneState.CANCELLED
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for task in self._tasks:
+            task.cancel()
+        # Cancelling a caller does not take its command out of the bed's queue
+        self._stopping = [asyncio.create_task(bed.stop()) for bed in self._sending]
+        self._finish()
+
+    async def wait(self) -> None:
+        '''
+        Wait until every step has been carried out, or the scene is cancelled and its beds have stopped.
+        '''
+        await self._finished.wait()
+        await asyncio.gather(*self._stopping, return_exceptions=True)
+
+    def _schedule(self) -> None:
+        due = self.next_due()
+        if due is None:
+            if not self._tasks:
+                self.state = SceneState.FINISHED
+                self._finish()
+            return
+        self._timer = self.engine.scheduler.call_at(due, self._fire)
+
+    def _fire(self, now: float) -> None:
+        self._timer = None
+        jitter = now - self.next_due()
+        self.jitter.append(jitter)
+        self.engine._jitter.observe(jitter)
+
+        index = self._index
+        self._index += 1
+        task = asyncio.create_task(self._carry_out(index, self._steps[index]))
+        self._tasks.add(task)
+        task.add_done_callback(self._step_done)
+        # Scheduled off the time this step was due, so that a slow step does not delay the next
+        self._schedule()
+
+    def _step_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not self._tasks and self.state is SceneState.RUNNING and self.next_due() is None:
+            self.state = SceneState.FINISHED
+            self._finish()
+
+    async def _carry_out(self, index: int, step: _PlannedStep) -> None:
+        try:
+            beds = await self._resolve_beds()
+        except asyncio.TimeoutError as e:
+            logger.warning("Scene %r, step %d: Beds not found", self.scene.name, index)
+            self.errors.append((index, None, e))
+            return
+        await asyncio.gather(*(self._send(index, bed, step) for bed in beds))
+
+    async def _send(self, index: int, bed: BleSutaBed, step: _PlannedStep) -> None:
+        self._sending[bed] = self._sending.get(bed, 0) + 1
+        try:
+            # All at once, so that the command queue can merge repeated notches into one write
+            await asyncio.gather(*(bed.send_command(step.command) for _ in range(step.count)))
+        except Exception as e:
+            logger.warning("Scene %r, step %d: %s: Failed to send %s: %s", self.scene.name, index, bed.device, step.command.name, e)
+            self.errors.append((index, bed, e))
+        finally:
+            self._sending[bed] -= 1
+            if not self._sending[bed]:
+                del self._sending[bed]
+
+    async def _resolve_beds(self) -> Sequence[BleSutaBed]:
+        if self._beds is not None:
+            return self._beds
+        controller = self.engine.controller
+        if not self.scene.beds:
+            return controller.devices().beds()
+        return await asyncio.gather(*(
+            controller.get_bed(address, timeout=controller._discovery_timeout)
+            for address in self.scene.beds))
+
+    def _finish(self) -> None:
+        self.engine._runs.discard(self)
+        self._finished.set()
+
+def _plan(scene: Scene, start: float, wall_start: datetime) -> list[_PlannedStep]:
+    '''
+    Work out when each step of the scene is due, relative to a start at the given loop and wall-clock time.
+    '''
+    planned: list[_PlannedStep] = []
+    relative, offset = True, 0.0
+    for step in scene.steps:
+        if step.at is not None:
+            # Seconds from the start until the previous step, on the wall clock
+            previous = wall_start + timedelta(seconds=offset if relative else offset - start)
+            when = datetime.combine(previous.date(), step.at, tzinfo=previous.tzinfo)
+            if when < previous:
+                when += timedelta(days=1)
+            relative, offset = False, start + (when - wall_start).total_seconds()
+        else:
+            offset += step.after
+
+        if step.every:
+            for repeat in range(step.repeat):
+                planned.append(_PlannedStep(step.command, 1, relative, offset + repeat * step.every))
+            offset += (step.repeat - 1) * step.every
+        else:
+            planned.append(_PlannedStep(step.command, step.repeat, relative, offset))
+    return planned
+
+class SutaBleSceneEngine:
+    '''
+    Runs any number of scenes at once, on one shared scheduler.
+    '''
+
+    def __init__(
+        self,
+        controller: SutaBleBedController,
+        scheduler: SutaBleScheduler | None = None,
+        clock: Callable[[], datetime] = datetime.now,
+    ) -> None:
+        """
+        Constructor
+
+        @param controller: The (already entered) SutaBleBedController whose beds the scenes move
+        @param scheduler: Where to schedule the steps. A new SutaBleScheduler is created if not given.
+        @param clock: Local wall-clock time, which steps at a time of day refer to
+        """
+        self.controller = controller
+        self.scheduler = scheduler if scheduler is not None else SutaBleScheduler()
+        self.clock = clock
+        self._jitter = controller.metrics.histogram(
+            "suta_ble_scene_jitter_seconds", "How late scene steps came up, compared to when they were due")
+        self._runs: set[SceneRun] = set()
+
+    def runs(self) -> list[SceneRun]:
+        '''
+        Every scene which is running or paused.
+        '''
+        return list(self._runs)
+
+    def start(self, scene: Scene | str, beds: Sequence[BleSutaBed] | None = None) -> SceneRun:
+        '''
+        Start running a scene. Its first step comes up straight away, unless it has a delay.
+
+        @param scene: The scene, or the path of a file to load it from
+        @param beds: Beds to run the scene on, instead of the ones it names
+        @raise SceneError: If the scene is not valid
+        '''
+        if isinstance(scene, str):
+            scene = load_scene(scene)
+        run = SceneRun(self, scene, beds)
+        if run.state is SceneState.RUNNING:
+            self._runs.add(run)
+        return run
+
+    async def close(self) -> None:
+        '''
+        Cancel every scene, and wait for them to stop.
+        '''
+        runs = list(self._runs)
+        tasks = [task for run in runs for task in run._tasks]
+        for run in runs:
+            run.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.scheduler.close()
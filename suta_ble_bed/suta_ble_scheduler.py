@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_scheduler.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: One event loop timer for any number of timers, on the loop's monotonic clock.
+#
+#   Timers are kept in a heap ordered by deadline, and only the earliest one is handed to
+#   the event loop. When it comes up every timer which is due fires, so hundreds of scenes
+#   cost one wakeup per distinct deadline rather than one sleeping task each.
+#
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+class Timer:
+    '''
+    A callback scheduled with SutaBleScheduler.call_at().
+    '''
+    __slots__ = ("when", "callback", "cancelled")
+
+    def __init__(self, when: float, callback: Callable[[float], None]) -> None:
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        # Left in the heap, and skipped once it comes up
+        self.cancelled = True
+
+class SutaBleScheduler:
+    '''
+    Fires callbacks at deadlines on the event loop's clock.
+    '''
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[float, int, Timer]] = []
+        self._sequence = itertools.count()  # Keeps timers with the same deadline in the order they were added
+        # The one loop callback, for the earliest deadline
+        self._handle: asyncio.TimerHandle | None = None
+        self.wakeups = 0  # Times the scheduler woke up to fire timers
+
+    def __len__(self) -> int:
+        return sum(not timer.cancelled for _, _, timer in self._heap)
+
+    def time(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    def call_at(self, when: float, callback: Callable[[float], None]) -> Timer:
+        '''
+        Call callback(now) once the loop's clock reaches when.
+        Callbacks must not block. Start a task for anything which takes a while.
+        '''
+        timer = Timer(when, callback)
+        heapq.heappush(self._heap, (when, next(self._sequence), timer))
+        if self._heap[0][2] is timer:
+            # Due before whatever we were waiting for
+            self._arm()
+        return timer
+
+    def call_later(self, delay: float, callback: Callable[[float], None]) -> Timer:
+        return self.call_at(self.time() + delay, callback)
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._heap.clear()
+
+    def _arm(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+        if self._heap:
+            self._handle = asyncio.get_running_loop().call_at(self._heap[0][0], self._fire)
+
+    def _fire(self) -> None:
+        self._handle = None
+        self.wakeups += 1
+        now = self.time()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, timer = heapq.heappop(self._heap)
+            if timer.cancelled:
+                continue
+            try:
+                timer.callback(now)
+            except Exception:
+                logger.exception("Timer callback %s raised", timer.callback)
+        self._arm()
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_simulator.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: In-process stand-in for BleakScanner, BleakClient and establish_connection,
+#   with simulated beds on the other end, for testing and benchmarking without a radio.
+#
+#   simulator = SutaBleSimulator(SimulatedLink(latency=0.01, loss=0.05))
+#   simulator.add_bed("AA:BB:CC:DD:EE:FF")
+#   async with simulator.controller() as controller:
+#       bed = await controller.get_bed()
+#       await bed.flat()
+#
+#   The simulated beds behave the way the rest of this library assumes the real ones do:
+#   every frame they carry out is echoed on CONTROL_READ, and frames written to ACK_CMD_CMD
+#   are acknowledged on ACK_CMD_ACK.
+#
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+import logging
+import random
+from typing import Any, Callable
+
+from bleak import AdvertisementData, BleakError
+from bleak.backends.device import BLEDevice
+
+from .suta_ble_bed_controller import SutaBleBedController
+from .suta_ble_codec import FrameError, decode_all
+from .suta_ble_consts import BED_LOCAL_NAME, BedCharacteristic, BedCommands
+from .suta_ble_state import NOTCH_STEPS
+
+logger = logging.getLogger(__name__)
+
+# Made up, since nobody has measured where the real presets go
+PRESET_POSITIONS = {
+    BedCommands.FLAT: (0, 0),
+    BedCommands.ZERO_GRAVITY: (3, 5),
+    BedCommands.LOUNGE: (6, 2),
+}
+
+@dataclass
+class SimulatedLink:
+    '''
+    How the simulated radio behaves. Random choices come from the simulator's seeded generator,
+    so a run can be repeated exactly.
+    '''
+    latency: float = 0.0  # One-way seconds for a frame or notification
+    jitter: float = 0.0  # Up to this many seconds are added to each latency at random
+    loss: float = 0.0  # Chance that a frame or notification never arrives
+    connect_time: float = 0.0  # Seconds per connection attempt
+    connect_failure: float = 0.0  # Chance that a connection attempt fails
+    advertisement_interval: float = 0.1  # Seconds between advertisements from each bed
+    mtu_size: int = 23
+
+class SimulatedBed:
+    '''
+    The motors and radio of one simulated bed.
+    '''
+
+    def __init__(
+        self,
+        address: str,
+        name: str = BED_LOCAL_NAME,
+        rssi: int = -60,
+        max_notches: int = 10,
+        service_uuids: tuple[str, ...] = (),
+    ) -> None:
+        """
+        Constructor
+
+        @param address: MAC address the bed advertises
+        @param name: Local name the bed advertises. Anything but BED_LOCAL_NAME is ignored by the scanner.
+        @param rssi: Signal strength reported with each advertisement
+        @param max_notches: How far the head and feet can be raised
+        @param service_uuids: Service UUIDs in the advertisement. The beds I have seen advertise none.
+        """
+        self.address = address.upper()
+        self.name = name
+        self.rssi = rssi
+        self.service_uuids = service_uuids
+        self.max_notches = max_notches
+        # Out of range beds neither advertise nor accept connections
+        self.in_range = True
+        # Beds which are not advertising still accept connections from anybody who knows their address
+        self.advertising = True
+
+        self.head = 0
+        self.feet = 0
+        self.vibrate_head = False
+        self.vibrate_feet = False
+        # Every command carried out, in order
+        self.received: list[BedCommands] = []
+        self.client: SimulatedClient | None = None
+
+    def __repr__(self) -> str:
+        return f"SimulatedBed({self.address}, head={self.head}, feet={self.feet})"
+
+    def carry_out(self, command: BedCommands) -> None:
+        self.received.append(command)
+        if command in NOTCH_STEPS:
+            head_step, feet_step = NOTCH_STEPS[command]
+            self.head = min(self.max_notches, max(0, self.head + head_step))
+            self.feet = min(self.max_notches, max(0, self.feet + feet_step))
+        elif command in PRESET_POSITIONS:
+            self.head, self.feet = PRESET_POSITIONS[command]
+        elif command is BedCommands.VIBRATE_HEAD:
+            self.vibrate_head = not self.vibrate_head
+        elif command is BedCommands.VIBRATE_FEET:
+            self.vibrate_feet = not self.vibrate_feet
+
+    def receive(self, characteristic: str, data: bytes) -> list[tuple[str, bytes]]:
+        '''
+        Handle a write which arrived over the air.
+
+        @return: The notifications the bed sends in response, as (characteristic, data)
+        '''
+        if characteristic not in (BedCharacteristic.CONTROL_COMMAND.value, BedCharacteristic.ACK_CMD_CMD.value):
+            return []
+        try:
+            frames = decode_all(data)
+        except FrameError as e:
+            logger.debug("%s: Ignoring %s", self.address, e)
+            return []
+
+        for frame in frames:
+            if frame.command is not None:
+                self.carry_out(frame.command)
+        notifications = [(BedCharacteristic.CONTROL_READ.value, data)]
+        if characteristic == BedCharacteristic.ACK_CMD_CMD.value:
+            notifications.append((BedCharacteristic.ACK_CMD_ACK.value, data))
+        return notifications
+
+class SimulatedClient:
+    '''
+    Stands in for a connected BleakClient.
+    '''
+
+    def __init__(self, simulator: SutaBleSimulator, bed: SimulatedBed, disconnected_callback: Callable | None) -> None:
+        self.simulator = simulator
+        self.bed = bed
+        self.address = bed.address
+        self.mtu_size = simulator.link.mtu_size
+        self.services: list = []
+        self.is_connected = True
+        self._disconnected_callback = disconnected_callback
+        self._notify: dict[str, Callable] = {}
+
+    async def start_notify(self, characteristic: str, callback: Callable, **kwargs: Any) -> None:
+        self._check_connected()
+        self._notify[characteristic] = callback
+
+    async def stop_notify(self, characteristic: str) -> None:
+        self._notify.pop(characteristic, None)
+
+    async def write_gatt_char(self, characteristic: str, data: bytes | bytearray, response: bool | None = None) -> None:
+        self._check_connected()
+        data = bytes(data)
+        if response is False:
+            # The frame goes out on the next connection event, and we don't wait for it to arrive
+            if not self.simulator._lost():
+                asyncio.get_running_loop().call_later(self.simulator._latency(), self._arrive, characteristic, data)
+            await asyncio.sleep(0)
+            return
+
+        await asyncio.sleep(self.simulator._latency())
+        if self.simulator._lost():
+            raise BleakError(f"{self.address}: Write to {characteristic} timed out")
+        self._arrive(characteristic, data)
+        # Wait for the response to come back
+        await asyncio.sleep(self.simulator._latency())
+        self._check_connected()
+
+    async def disconnect(self) -> bool:
+        self._drop()
+        return True
+
+    def _check_connected(self) -> None:
+        if not self.is_connected:
+            raise BleakError(f"{self.address}: Not connected")
+
+    def _arrive(self, characteristic: str, data: bytes) -> None:
+        if not self.is_connected:
+            return
+        loop = asyncio.get_running_loop()
+        for notified, payload in self.bed.receive(characteristic, data):
+            loop.call_later(self.simulator._latency(), self._deliver, notified, payload)
+
+    def _deliver(self, characteristic: str, data: bytes) -> None:
+        callback = self._notify.get(characteristic)
+        if callback is None or not self.is_connected or self.simulator._lost():
+            return
+        callback(None, bytearray(data))
+
+    def _drop(self) -> None:
+        if not self.is_connected:
+            return
+        self.is_connected = False
+        if self.bed.client is self:
+            self.bed.client = None
+        if self._disconnected_callback is not None:
+            self._disconnected_callback(self)
+
+class SimulatedScanner:
+    '''
+    Stands in for a BleakScanner. Each bed in range advertises every advertisement_interval.
+    '''
+
+    def __init__(
+        self,
+        simulator: SutaBleSimulator,
+        detection_callback: Callable[[BLEDevice, AdvertisementData], None],
+        adapter: str | None = None,
+        service_uuids: list[str] | None = None,
+        bluez: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        self.simulator = simulator
+        self.detection_callback = detection_callback
+        self.adapter = (bluez or {}).get("adapter", adapter)
+        # Like the OS would, only report devices advertising one of these
+        self.service_uuids = set(service_uuids) if service_uuids else None
+        self.starts = 0
+        self._devices: dict[str, BLEDevice] = {}
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self.starts += 1
+        self.simulator._scanners.add(self)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self.simulator._scanners.discard(self)
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def advertise(self) -> None:
+        '''
+        Deliver one advertisement from every bed in range, right now.
+        '''
+        for bed in list(self.simulator.beds.values()):
+            if not bed.in_range or not bed.advertising:
+                continue
+            if self.service_uuids is not None and self.service_uuids.isdisjoint(bed.service_uuids):
+                continue
+            device = self._devices.get(bed.address)
+            if device is None:
+                path = f"/org/bluez/{self.adapter or 'hci0'}/dev_{bed.address.replace(':', '_')}"
+                device = self._devices[bed.address] = BLEDevice(bed.address, bed.name, {"path": path, "props": {}})
+            self.detection_callback(device, AdvertisementData(
+                local_name=bed.name,
+                manufacturer_data={},
+                service_data={},
+                service_uuids=list(bed.service_uuids),
+                tx_power=None,
+                rssi=bed.rssi,
+                platform_data=(),
+            ))
+
+    async def _run(self) -> None:
+        while True:
+            self.advertise()
+            await asyncio.sleep(self.simulator.link.advertisement_interval)
+
+class SutaBleSimulator:
+    '''
+    A simulated radio and the beds within its range.
+    '''
+
+    def __init__(self, link: SimulatedLink | None = None, seed: int = 0) -> None:
+        """
+        Constructor
+
+        @param link: How the radio behaves. Defaults to instant and lossless.
+        @param seed: Seed for the random latency, loss and connection failures
+        """
+        self.link = link if link is not None else SimulatedLink()
+        self.random = random.Random(seed)
+        self.beds: dict[str, SimulatedBed] = {}
+        self.connect_attempts = 0
+        self._scanners: set[SimulatedScanner] = set()
+
+    def add_bed(self, address: str, **kwargs: Any) -> SimulatedBed:
+        '''
+        Put a bed within range. Keyword arguments are passed to SimulatedBed.
+        '''
+        bed = self.beds[address.upper()] = SimulatedBed(address, **kwargs)
+        return bed
+
+    def controller(self, **kwargs: Any) -> SutaBleBedController:
+        '''
+        A SutaBleBedController which talks to the simulated beds. Keyword arguments are passed on.
+        '''
+        return SutaBleBedController(scanner_class=self.scanner, connector=self.establish_connection, **kwargs)
+
+    def scanner(self, detection_callback: Callable[[BLEDevice, AdvertisementData], None], **kwargs: Any) -> SimulatedScanner:
+        '''
+        Called like BleakScanner.
+        '''
+        return SimulatedScanner(self, detection_callback, **kwargs)
+
+    def advertise(self) -> None:
+        '''
+        Deliver one advertisement from every bed in range to every running scanner, right now.
+        '''
+        for scanner in list(self._scanners):
+            scanner.advertise()
+
+    def disconnect(self, address: str) -> None:
+        '''
+        Drop the connection to a bed, as if it had gone out of range for a moment.
+        '''
+        bed = self.beds[address.upper()]
+        if bed.client is not None:
+            bed.client._drop()
+
+    async def establish_connection(
+        self,
+        client_class: type,
+        device: BLEDevice,
+        name: str,
+        disconnected_callback: Callable | None = None,
+        max_attempts: int = 4,
+        **kwargs: Any,
+    ) -> SimulatedClient:
+        '''
+        Called like bleak_retry_connector.establish_connection.
+        '''
+        bed = self.beds.get(device.address.upper())
+        for attempt in range(max_attempts):
+            self.connect_attempts += 1
+            await asyncio.sleep(self.link.connect_time)
+            if bed is None or not bed.in_range or self.random.random() < self.link.connect_failure:
+                continue
+            if bed.client is not None:
+                # Like BlueZ, hand over the existing link rather than making a second one
+                bed.client._drop()
+            bed.client = SimulatedClient(self, bed, disconnected_callback)
+            return bed.client
+        raise BleakError(f"{name}: Failed to connect after {max_attempts} attempt(s)")
+
+    def _latency(self) -> float:
+        if not self.link.jitter:
+            return self.link.latency
+        return self.link.latency + self.random.uniform(0, self.link.jitter)
+
+    def _lost(self) -> bool:
+        return bool(self.link.loss) and self.random.random() < self.link.loss
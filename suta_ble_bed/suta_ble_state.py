@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_state.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: Keep track of what the bed is doing, based on what it reports on CONTROL_READ
+#
+#   As far as I can tell, the bed echoes each command frame on CONTROL_READ as it carries it out.
+#   Positions are therefore counted in notches from flat, and are unknown until the bed has
+#   been sent flat at least once. Frames we cannot make sense of are kept in BedState.raw.
+#
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, replace
+import time
+
+from .suta_ble_codec import Frame
+from .suta_ble_consts import BedCommands
+
+# Change in (head, feet) notches for each notch command
+NOTCH_STEPS: dict[BedCommands, tuple[int, int]] = {
+    BedCommands.HEAD_UP: (1, 0),
+    BedCommands.HEAD_DOWN: (-1, 0),
+    BedCommands.FEET_UP: (0, 1),
+    BedCommands.FEET_DOWN: (0, -1),
+    BedCommands.HEAD_AND_FEET_UP: (1, 1),
+    BedCommands.HEAD_AND_FEET_DOWN: (-1, -1),
+}
+
+@dataclass(frozen=True)
+class BedState:
+    head: int | None = None  # Notches above flat, or None if unknown
+    feet: int | None = None
+    vibrate_head: bool = False
+    vibrate_feet: bool = False
+    last_command: BedCommands | None = None
+    raw: bytes = b''  # The most recent notification, as received
+    updated: float | None = None  # time.monotonic() of the most recent notification
+
+    def unparsed(self, raw: bytes, now: float | None = None) -> BedState:
+        '''
+        The state after the bed reported something we could not decode.
+        '''
+        return replace(self, raw=raw, updated=time.monotonic() if now is None else now)
+
+    def apply(self, frame: Frame, raw: bytes, now: float | None = None) -> BedState:
+        '''
+        The state after the bed reported the given frame.
+        '''
+        if now is None:
+            now = time.monotonic()
+        command = frame.command
+        changes: dict = {"raw": raw, "updated": now}
+        if command is None:
+            return replace(self, **changes)
+
+        changes["last_command"] = command
+        if command in NOTCH_STEPS:
+            head_step, feet_step = NOTCH_STEPS[command]
+            if self.head is not None:
+                changes["head"] = max(0, self.head + head_step)
+            if self.feet is not None:
+                changes["feet"] = max(0, self.feet + feet_step)
+        elif command is BedCommands.FLAT:
+            changes["head"] = changes["feet"] = 0
+        elif command in (BedCommands.ZERO_GRAVITY, BedCommands.LOUNGE):
+            # We don't know how many notches these presets correspond to
+            changes["head"] = changes["feet"] = None
+        elif command is BedCommands.VIBRATE_HEAD:
+            changes["vibrate_head"] = not self.vibrate_head
+        elif command is BedCommands.VIBRATE_FEET:
+            changes["vibrate_feet"] = not self.vibrate_feet
+        return replace(self, **changes)
+
+class SutaBleStateStream:
+    '''
+    Async iterator over a bed's state. If the consumer falls behind, intermediate states
+    are skipped and only the latest one is delivered.
+    '''
+
+    def __init__(self, subscribers: set[SutaBleStateStream], state: BedState) -> None:
+        self._subscribers = subscribers
+        self._latest = state
+        self._changed = asyncio.Event()
+        # Deliver the current state straight away, so consumers don't have to special-case it
+        self._changed.set()
+        self._closed = False
+        subscribers.add(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> BedState:
+        if self._closed:
+            raise StopAsyncIteration
+        await self._changed.wait()
+        if self._closed:
+            raise StopAsyncIteration
+        self._changed.clear()
+        return self._latest
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._closed = True
+        self._subscribers.discard(self)
+        self._changed.set()
+
+    def _publish(self, state: BedState) -> None:
+        self._latest = state
+        self._changed.set()
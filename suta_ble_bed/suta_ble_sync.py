@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_sync.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: Use the controller from synchronous code, like a web service or a script,
+#   without paying for a new event loop, scan and connection on every call.
+#
+#   client = SutaBleSyncClient()
+#   client.start()
+#   client.send_command(BedCommands.FLAT, "AA:BB:CC:DD:EE:FF").result(timeout=30)
+#   client.close()
+#
+#   The controller lives on an event loop in a background thread, for as long as the
+#   client is running. Any number of threads may submit work to it at once, and they
+#   all share its scanner and connections.
+#
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import threading
+import typing
+from typing import Any, Awaitable, Callable, Iterable, TypeVar
+
+from .suta_ble_bed_controller import DEFAULT_DISCOVERY_TIMEOUT, SutaBleBedController
+from .suta_ble_consts import BedCommands
+from .suta_ble_fleet import FanOutResult
+from .suta_ble_metrics import SutaBleMetrics
+
+if typing.TYPE_CHECKING:
+    from .suta_ble_bed import BleSutaBed
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class SutaBleSyncClient:
+    '''
+    Thread-safe, synchronous front end to a SutaBleBedController running in its own thread.
+
+    Every method returns a concurrent.futures.Future straight away. Call result() on it
+    to wait for the outcome. BleSutaBed objects belong to the background thread's event
+    loop, so work with them in a coroutine passed to submit(), rather than in the caller.
+    '''
+
+    def __init__(
+        self,
+        controller_factory: Callable[[], SutaBleBedController] | None = None,
+        **controller_kwargs: Any,
+    ) -> None:
+        """
+        Constructor
+
+        @param controller_factory: Creates the controller, in the background thread. Defaults to
+            SutaBleBedController(**controller_kwargs). Lets SutaBleSimulator.controller stand in.
+        @param controller_kwargs: Passed to SutaBleBedController, if no factory is given
+        """
+        if controller_factory is None:
+            controller_factory = functools.partial(SutaBleBedController, **controller_kwargs)
+        self._controller_factory = controller_factory
+        self._controller: SutaBleBedController | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        # Held while starting and stopping, not while submitting
+        self._lifecycle_lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    @property
+    def metrics(self) -> SutaBleMetrics:
+        '''
+        The controller's metrics. Reading them from another thread gives a slightly stale,
+        but consistent enough, picture.
+        '''
+        return self._running_controller().metrics
+
+    def start(self) -> None:
+        '''
+        Start the background thread, and enter the controller in it. Does nothing if already running.
+
+        @raise Exception: Whatever entering the controller raised, like a BleakError if there is no adapter
+        '''
+        with self._lifecycle_lock:
+            if self._thread is not None:
+                return
+            loop = asyncio.new_event_loop()
+            ready: concurrent.futures.Future[None] = concurrent.futures.Future()
+            thread = threading.Thread(target=self._run, args=(loop, ready), name="suta-ble-bed", daemon=True)
+            thread.start()
+            try:
+                ready.result()
+            except BaseException:
+                thread.join()
+                raise
+            self._loop, self._thread = loop, thread
+
+    def close(self, timeout: float | None = None) -> None:
+        '''
+        Exit the controller, disconnecting every bed, and stop the background thread.
+        Work which has been submitted but not finished is cancelled.
+        '''
+        with self._lifecycle_lock:
+            loop, thread = self._loop, self._thread
+            if loop is None or thread is None:
+                return
+            if threading.current_thread() is thread:
+                raise RuntimeError("SutaBleSyncClient cannot be closed from its own thread")
+            self._loop = None
+            try:
+                asyncio.run_coroutine_threadsafe(self._exit(), loop).result(timeout)
+            finally:
+                loop.call_soon_threadsafe(loop.stop)
+                thread.join(timeout)
+                self._thread = None
+
+    def submit(self, function: Callable[..., Awaitable[T]], *args: Any) -> concurrent.futures.Future[T]:
+        '''
+        Run function(controller, *args) on the background thread's event loop.
+
+        @raise RuntimeError: If the client is not running
+        '''
+        loop = self._loop
+        if loop is None:
+            raise RuntimeError("SutaBleSyncClient is not running")
+        return asyncio.run_coroutine_threadsafe(function(self._controller, *args), loop)
+
+    def send_command(
+        self,
+        command: BedCommands,
+        address: str | None = None,
+        discovery_timeout: float | None = DEFAULT_DISCOVERY_TIMEOUT,
+    ) -> concurrent.futures.Future[bool]:
+        '''
+        Send a command to one bed.
+
+        @param address: MAC address of the bed, or None for whichever bed is found first
+        @param discovery_timeout: Seconds to wait for the bed to be discovered
+        @return: A future for BleSutaBed.send_command()'s result. It raises asyncio.TimeoutError if
+            the bed was not found, and BleakError if the command could not be sent.
+        '''
+        return self.submit(_send_command, command, address, discovery_timeout)
+
+    def fan_out(
+        self,
+        command: BedCommands,
+        addresses: Iterable[str] | None = None,
+        timeout: float | None = None,
+        discovery_timeout: float | None = DEFAULT_DISCOVERY_TIMEOUT,
+    ) -> concurrent.futures.Future[list[FanOutResult]]:
+        '''
+        Send a command to many beds at once, like SutaBleBedController.fan_out().
+
+        @param addresses: MAC addresses of the beds, or None for every bed discovered so far
+        @param timeout: Seconds to allow each bed
+        @param discovery_timeout: Seconds to wait for each of the addresses to be discovered
+        '''
+        return self.submit(_fan_out, command, None if addresses is None else list(addresses), timeout, discovery_timeout)
+
+    def addresses(self) -> concurrent.futures.Future[list[str]]:
+        '''
+        MAC addresses of every bed discovered so far.
+        '''
+        return self.submit(_addresses)
+
+    def _running_controller(self) -> SutaBleBedController:
+        if self._controller is None or self._loop is None:
+            raise RuntimeError("SutaBleSyncClient is not running")
+        return self._controller
+
+    def _run(self, loop: asyncio.AbstractEventLoop, ready: concurrent.futures.Future[None]) -> None:
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._enter(ready))
+            if ready.exception() is None:
+                loop.run_forever()
+        finally:
+            # Whatever the caller gave up on
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    async def _enter(self, ready: concurrent.futures.Future[None]) -> None:
+        try:
+            controller = self._controller_factory()
+            await controller.__aenter__()
+        except BaseException as e:
+            ready.set_exception(e)
+            return
+        self._controller = controller
+        ready.set_result(None)
+
+    async def _exit(self) -> None:
+        controller, self._controller = self._controller, None
+        if controller is not None:
+            await controller.__aexit__(None, None, None)
+
+async def _send_command(
+    controller: SutaBleBedController,
+    command: BedCommands,
+    address: str | None,
+    discovery_timeout: float | None,
+) -> bool:
+    bed = await controller.get_bed(address, timeout=discovery_timeout)
+    return await bed.send_command(command)
+
+async def _fan_out(
+    controller: SutaBleBedController,
+    command: BedCommands,
+    addresses: list[str] | None,
+    timeout: float | None,
+    discovery_timeout: float | None,
+) -> list[FanOutResult]:
+    beds: list[BleSutaBed] | None = None
+    if addresses is not None:
+        beds = await asyncio.gather(*(controller.get_bed(address, timeout=discovery_timeout) for address in addresses))
+    return await controller.fan_out(command, beds, timeout=timeout)
+
+async def _addresses(controller: SutaBleBedController) -> list[str]:
+    return [bed.device.address for bed in controller.devices().beds()]
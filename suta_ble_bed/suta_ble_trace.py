@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_trace.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: Record what the controller saw and did, in a compact binary trace,
+#   and replay such a trace against a controller.
+#
+#   A trace file starts with MAGIC, followed by records of
+#     <seconds since session start: float64> <kind: uint8> <subject: uint32> <length: uint16> <payload>
+#   all little-endian. Strings, like addresses and UUIDs, are written once per session as
+#   a STRING record and referred to by number afterwards. Once there are max_strings of
+#   them, a RESET_STRINGS record starts the numbering afresh, so that a crowd of passing
+#   devices cannot grow the recorder without bound. Each recording session starts with a
+#   SESSION record, so several sessions can be appended to the same file.
+#
+#   Replay a trace against simulated beds with:
+#     python -m suta_ble_bed.suta_ble_trace trace.bin [--speed 10 | --fast]
+#
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from dataclasses import dataclass
+from enum import IntEnum
+import logging
+import struct
+import time
+import typing
+from typing import Iterator, NamedTuple
+
+from bleak import AdvertisementData, BleakError
+from bleak.backends.device import BLEDevice
+
+from .suta_ble_consts import BED_LOCAL_NAME, BedCharacteristic, BedServices
+from .suta_ble_writes import WriteMode
+
+if typing.TYPE_CHECKING:
+    from .suta_ble_bed_controller import SutaBleBedController
+    from .suta_ble_simulator import SutaBleSimulator
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SUTATRACE\x01"
+# Bytes to collect before writing them to the file
+DEFAULT_BUFFER_SIZE = 64 * 1024
+# Strings to number before starting afresh
+DEFAULT_MAX_STRINGS = 16384
+
+_HEADER = struct.Struct("<dBIH")
+_ADVERTISEMENT = struct.Struct("<bII")  # RSSI, name, adapter
+# Header and payload of an advertisement at once, since there are so many of them
+_ADVERTISEMENT_RECORD = struct.Struct(_HEADER.format + _ADVERTISEMENT.format[1:])
+_CONNECT = struct.Struct("<I")  # Adapter
+_WRITE = struct.Struct("<Ib")  # Characteristic, response (-1 for bleak's default)
+_NOTIFICATION = struct.Struct("<I")  # Characteristic
+_DISCONNECT = struct.Struct("<?")  # Expected
+_SESSION = struct.Struct("<d")  # Wall-clock time.time() at the start of the session
+_NO_STRING = 0xFFFFFFFF
+_NO_RSSI = -128
+
+_SERVICES = {
+    BedCharacteristic.CONTROL_COMMAND: BedServices.CONTROL,
+    BedCharacteristic.CONTROL_READ: BedServices.CONTROL,
+    BedCharacteristic.ACK_CMD_ACK: BedServices.ACK_CMD,
+    BedCharacteristic.ACK_CMD_CMD: BedServices.ACK_CMD,
+    BedCharacteristic.UPDATE_OTA: BedServices.UPDATE,
+}
+
+class TraceKind(IntEnum):
+    STRING = 0
+    SESSION = 1
+    ADVERTISEMENT = 2
+    CONNECT = 3
+    WRITE = 4
+    NOTIFICATION = 5
+    DISCONNECT = 6
+    RESET_STRINGS = 7
+
+class TraceError(ValueError):
+    '''
+    A file which is not a trace.
+    '''
+
+class TraceEvent(NamedTuple):
+    '''
+    One recorded event. Only the fields which make sense for the kind are set.
+    '''
+    time: float  # Seconds since the start of the session
+    kind: TraceKind
+    address: str | None = None
+    name: str | None = None  # ADVERTISEMENT
+    rssi: int | None = None  # ADVERTISEMENT
+    adapter: str | None = None  # ADVERTISEMENT, CONNECT
+    characteristic: str | None = None  # WRITE, NOTIFICATION
+    data: bytes = b""  # WRITE, NOTIFICATION
+    response: bool | None = None  # WRITE
+    expected: bool | None = None  # DISCONNECT
+    wall_time: float | None = None  # SESSION
+
+class SutaBleTraceRecorder:
+    '''
+    Appends events to a trace file.
+
+    Recording an event only packs it into a buffer, which is written out once it holds
+    buffer_size bytes, and when the recorder is closed. Events still in the buffer are
+    lost if the process dies.
+    '''
+
+    def __init__(self, path: str, buffer_size: int = DEFAULT_BUFFER_SIZE, max_strings: int = DEFAULT_MAX_STRINGS) -> None:
+        """
+        Constructor
+
+        @param path: The file to append to. Created if it does not exist.
+        @param buffer_size: Bytes to collect before writing them to the file
+        @param max_strings: Strings to number before starting afresh. At least the three an advertisement needs.
+        """
+        self.path = path
+        self.buffer_size = buffer_size
+        self.max_strings = max(max_strings, 3)
+        self.events = 0
+        self.string_resets = 0
+
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._buffer = bytearray()
+        self._strings: dict[str | None, int] = {None: _NO_STRING}
+        self._start = time.monotonic()
+        self._record(TraceKind.SESSION, _NO_STRING, _SESSION.pack(time.time()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def advertisement(self, address: str, name: str | None, rssi: int | None, adapter: str | None) -> None:
+        # The same as the other events, unrolled for when every string is known already
+        strings = self._strings
+        address_number = strings.get(address)
+        name_number = strings.get(name)
+        adapter_number = strings.get(adapter)
+        if address_number is None or name_number is None or adapter_number is None:
+            address_number, name_number, adapter_number = self._numbers(address, name, adapter)
+
+        self._buffer += _ADVERTISEMENT_RECORD.pack(
+            time.monotonic() - self._start, TraceKind.ADVERTISEMENT, address_number, _ADVERTISEMENT.size,
+            _NO_RSSI if rssi is None else rssi, name_number, adapter_number)
+        self.events += 1
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def connect(self, address: str, adapter: str | None) -> None:
+        address_number, adapter_number = self._numbers(address, adapter)
+        self._record(TraceKind.CONNECT, address_number, _CONNECT.pack(adapter_number))
+
+    def write(self, address: str, characteristic: str, data: bytes, response: bool | None) -> None:
+        address_number, characteristic_number = self._numbers(address, characteristic)
+        payload = _WRITE.pack(characteristic_number, -1 if response is None else response) + data
+        self._record(TraceKind.WRITE, address_number, payload)
+
+    def notification(self, address: str, characteristic: str, data: bytes) -> None:
+        address_number, characteristic_number = self._numbers(address, characteristic)
+        self._record(TraceKind.NOTIFICATION, address_number, _NOTIFICATION.pack(characteristic_number) + data)
+
+    def disconnect(self, address: str, expected: bool) -> None:
+        self._record(TraceKind.DISCONNECT, self._string(address), _DISCONNECT.pack(expected))
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._buffer.clear()
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+    def _numbers(self, *values: str | None) -> list[int]:
+        resets = self.string_resets
+        numbers = [self._string(value) for value in values]
+        if self.string_resets != resets:
+            # The numbers from before the reset no longer count
+            numbers = [self._string(value) for value in values]
+        return numbers
+
+    def _string(self, value: str | None) -> int:
+        number = self._strings.get(value)
+        if number is None:
+            # Less one for None
+            if len(self._strings) - 1 >= self.max_strings:
+                self._strings = {None: _NO_STRING}
+                self.string_resets += 1
+                self._record(TraceKind.RESET_STRINGS, _NO_STRING, b"")
+            number = self._strings[value] = len(self._strings) - 1
+            self._record(TraceKind.STRING, number, value.encode())
+        return number
+
+    def _record(self, kind: TraceKind, subject: int, payload: bytes) -> None:
+        self._buffer += _HEADER.pack(time.monotonic() - self._start, kind, subject, len(payload))
+        self._buffer += payload
+        self.events += 1
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+def read_trace(path: str) -> Iterator[TraceEvent]:
+    '''
+    Every event in a trace file, in the order they were recorded. STRING and RESET_STRINGS
+    records are resolved rather than returned.
+
+    @raise TraceError: If the file is not a trace
+    '''
+    with open(path, "rb") as file:
+        data = file.read()
+    if not data.startswith(MAGIC):
+        raise TraceError(f"{path} is not a trace")
+
+    strings: dict[int, str] = {}
+    offset = len(MAGIC)
+    while offset < len(data):
+        if offset + _HEADER.size > len(data):
+            logger.warning("%s: Ignoring truncated record at byte %d", path, offset)
+            return
+        elapsed, kind, subject, length = _HEADER.unpack_from(data, offset)
+        offset += _HEADER.size
+        payload = data[offset:offset + length]
+        if len(payload) < length:
+            logger.warning("%s: Ignoring truncated record at byte %d", path, offset - _HEADER.size)
+            return
+        offset += length
+
+        if kind == TraceKind.STRING:
+            strings[subject] = payload.decode()
+            continue
+        if kind == TraceKind.RESET_STRINGS:
+            strings = {}
+            continue
+        if kind == TraceKind.SESSION:
+            strings = {}
+            yield TraceEvent(elapsed, TraceKind.SESSION, wall_time=_SESSION.unpack(payload)[0])
+            continue
+
+        address = strings.get(subject)
+        if kind == TraceKind.ADVERTISEMENT:
+            rssi, name, adapter = _ADVERTISEMENT.unpack(payload)
+            yield TraceEvent(
+                elapsed, TraceKind.ADVERTISEMENT, address,
+                name=strings.get(name), rssi=None if rssi == _NO_RSSI else rssi, adapter=strings.get(adapter))
+        elif kind == TraceKind.CONNECT:
+            yield TraceEvent(elapsed, TraceKind.CONNECT, address, adapter=strings.get(_CONNECT.unpack(payload)[0]))
+        elif kind == TraceKind.WRITE:
+            characteristic, response = _WRITE.unpack_from(payload)
+            yield TraceEvent(
+                elapsed, TraceKind.WRITE, address,
+                characteristic=strings.get(characteristic), data=payload[_WRITE.size:],
+                response=None if response < 0 else bool(response))
+        elif kind == TraceKind.NOTIFICATION:
+            characteristic, = _NOTIFICATION.unpack_from(payload)
+            yield TraceEvent(
+                elapsed, TraceKind.NOTIFICATION, address,
+                characteristic=strings.get(characteristic), data=payload[_NOTIFICATION.size:])
+        elif kind == TraceKind.DISCONNECT:
+            yield TraceEvent(elapsed, TraceKind.DISCONNECT, address, expected=_DISCONNECT.unpack(payload)[0])
+        else:
+            logger.debug("%s: Skipping record of unknown kind %d", path, kind)
+
+@dataclass
+class ReplayStats:
+    events: int = 0
+    advertisements: int = 0
+    writes: int = 0
+    write_errors: int = 0
+    disconnects: int = 0
+    elapsed: float = 0.0  # Seconds the replay took
+    max_lag: float = 0.0  # Most seconds an event was handled later than the trace says it should have been
+
+async def replay_trace(
+    controller: SutaBleBedController,
+    path: str,
+    speed: float | None = 1.0,
+    simulator: SutaBleSimulator | None = None,
+) -> ReplayStats:
+    '''
+    Feed the advertisements and writes in a trace through an (already entered) controller.
+
+    Advertisements go to the controller's scanner callback, and writes are sent to the
+    beds again, connecting as needed. Connects and notifications are left to the
+    controller and the beds. Unexpected disconnects can only be replayed with a simulator.
+
+    @param speed: How many times faster than real time to replay, or None for as fast as possible
+    @param simulator: The SutaBleSimulator behind the controller, if it has one
+    '''
+    loop = asyncio.get_running_loop()
+    stats = ReplayStats()
+    devices: dict[tuple[str, str | None], BLEDevice] = {}
+    writes: list[asyncio.Task] = []
+    start = loop.time()
+    session_offset = 0.0  # Trace time at which the current session started
+    last_time = 0.0
+
+    for event in read_trace(path):
+        stats.events += 1
+        if event.kind == TraceKind.SESSION:
+            session_offset = last_time
+        trace_time = last_time = session_offset + event.time
+        if speed is not None:
+            due = start + trace_time / speed
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            stats.max_lag = max(stats.max_lag, loop.time() - due)
+        elif stats.events % 256 == 0:
+            # Let the writes and the beds get on with it
+            await asyncio.sleep(0)
+
+        if event.kind == TraceKind.ADVERTISEMENT:
+            stats.advertisements += 1
+            adapter = event.adapter if event.adapter in controller._adapters else controller._adapters[0]
+            device = devices.get((event.address, adapter))
+            if device is None:
+                bluez_path = f"/org/bluez/{adapter or 'hci0'}/dev_{event.address.replace(':', '_')}"
+                device = devices[event.address, adapter] = BLEDevice(event.address, event.name, {"path": bluez_path, "props": {}})
+            controller._bed_scanner._scanner_discovery_callback(device, AdvertisementData(
+                local_name=event.name,
+                manufacturer_data={},
+                service_data={},
+                service_uuids=[],
+                tx_power=None,
+                rssi=event.rssi if event.rssi is not None else _NO_RSSI,
+                platform_data=(),
+            ), adapter)
+        elif event.kind == TraceKind.WRITE:
+            try:
+                characteristic = BedCharacteristic(event.characteristic)
+            except ValueError:
+                logger.debug("Skipping write to unknown characteristic %s", event.characteristic)
+                continue
+            stats.writes += 1
+            bed = controller.devices().get(event.address)
+            if bed is None:
+                bed = controller.devices().adopt(BLEDevice(event.address, BED_LOCAL_NAME, None))
+            mode = WriteMode(event.response)
+            # Started in trace order, and the bed's operation lock keeps them in that order
+            writes.append(asyncio.create_task(bed._write(_SERVICES[characteristic], characteristic, event.data, mode)))
+        elif event.kind == TraceKind.DISCONNECT and not event.expected:
+            stats.disconnects += 1
+            if simulator is not None and event.address.upper() in simulator.beds:
+                simulator.disconnect(event.address)
+
+    for result in await asyncio.gather(*writes, return_exceptions=True):
+        if isinstance(result, (BleakError, asyncio.TimeoutError)):
+            stats.write_errors += 1
+        elif isinstance(result, BaseException):
+            raise result
+    stats.elapsed = loop.time() - start
+    return stats
+
+async def _replay_simulated(args: argparse.Namespace) -> ReplayStats:
+    from .suta_ble_simulator import SimulatedLink, SutaBleSimulator
+
+    simulator = SutaBleSimulator(SimulatedLink(latency=args.latency))
+    for event in read_trace(args.trace):
+        if event.address is None or event.address.upper() in simulator.beds:
+            continue
+        if event.kind in (TraceKind.WRITE, TraceKind.CONNECT) or (
+                event.kind == TraceKind.ADVERTISEMENT and event.name == BED_LOCAL_NAME):
+            # The advertisements come from the trace
+            simulator.add_bed(event.address).advertising = False
+
+    async with simulator.controller() as controller:
+        return await replay_trace(controller, args.trace, None if args.fast else args.speed, simulator)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m suta_ble_bed.suta_ble_trace",
+        description="Replay a trace against simulated beds, or print it.")
+    parser.add_argument("trace", help="Trace file, as recorded by SutaBleTraceRecorder")
+    speed = parser.add_mutually_exclusive_group()
+    speed.add_argument("--speed", type=float, default=1.0, help="Times faster than real time to replay")
+    speed.add_argument("--fast", action="store_true", help="Replay as fast as possible")
+    parser.add_argument("--latency", type=float, default=0.0, help="One-way latency of the simulated radio, in seconds")
+    parser.add_argument("--dump", action="store_true", help="Print the events rather than replaying them")
+    args = parser.parse_args()
+
+    if args.dump:
+        for event in read_trace(args.trace):
+            fields = ", ".join(f"{key}={value!r}" for key, value in event._asdict().items()
+                               if key not in ("time", "kind") and value not in (None, b""))
+            print(f"{event.time:12.6f} {event.kind.name:<13} {fields}")
+        return
+
+    logging.disable(logging.WARNING)
+    stats = asyncio.run(_replay_simulated(args))
+    print(f"Replayed {stats.events} events in {stats.elapsed:.3f}s: {stats.advertisements} advertisements, "
+          f"{stats.writes} writes ({stats.write_errors} failed), {stats.disconnects} disconnects, "
+          f"lagging by up to {stats.max_lag * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+#
+# Filename: suta_ble_writes.py
+#
+# Author: Simon Redman <simon@ergotech.com>
+# File Created: 10.17.2026
+# Description: How frames are written to the bed, and how long that takes
+#
+
+from __future__ import annotations
+
+from enum import Enum
+
+class WriteMode(Enum):
+    # Let bleak decide, based on what the characteristic says it supports
+    AUTO = None
+    # Wait for the bed to acknowledge each write at the link layer
+    WITH_RESPONSE = True
+    # Fire and forget, which saves a round trip per frame
+    WITHOUT_RESPONSE = False
+
+class WriteStats:
+    '''
+    Running totals for writes made in one WriteMode, to choose a mode based on data.
+    '''
+
+    __slots__ = ("writes", "frames", "seconds", "errors")
+
+    def __init__(self) -> None:
+        self.writes = 0
+        self.frames = 0
+        self.seconds = 0.0  # Total time spent waiting on write_gatt_char
+        self.errors = 0
+
+    def __repr__(self) -> str:
+        return (f"WriteStats(writes={self.writes}, frames={self.frames}, "
+                f"frame_latency={self.frame_latency * 1000:.1f}ms, frames_per_second={self.frames_per_second:.1f})")
+
+    def record(self, frames: int, seconds: float) -> None:
+        self.writes += 1
+        self.frames += frames
+        self.seconds += seconds
+
+    @property
+    def frame_latency(self) -> float:
+        '''
+        Mean seconds per frame.
+        '''
+        return self.seconds / self.frames if self.frames else 0.0
+
+    @property
+    def frames_per_second(self) -> float:
+        return self.frames / self.seconds if self.seconds else 0.0
@@ -0,0 +1,12 @@
+"""Helpers shared by the tests of `suta_ble_bed`."""
+
+
+import asyncio
+
+
+async def wait_until(condition, timeout=1.0):
+    """Poll condition until it is true, failing with asyncio.TimeoutError after timeout seconds."""
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.005)
+    await asyncio.wait_for(poll(), timeout)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_ack`."""
+
+
+import asyncio
+import unittest
+
+from bleak.backends.device import BLEDevice
+
+from suta_ble_bed.suta_ble_ack import AckTimeoutError, SutaBleAckChannel
+from suta_ble_bed.suta_ble_bed import BleSutaBed
+from suta_ble_bed.suta_ble_codec import decode
+from suta_ble_bed.suta_ble_consts import BedCharacteristic, BedCommands
+
+
+class FakeClient:
+
+    def __init__(self, drop=0, delay=0.0):
+        self.is_connected = True
+        self.notifying = {}
+        self.written = []
+        self.drop = drop  # How many frames to lose before acknowledging
+        self.delay = delay
+        self.max_in_flight = 0
+        self._in_flight = 0
+
+    async def start_notify(self, characteristic, callback):
+        self.notifying[characteristic] = callback
+
+    async def write_gatt_char(self, characteristic, data, response=None):
+        self.written.append((characteristic, decode(data).command))
+        if characteristic != BedCharacteristic.ACK_CMD_CMD.value:
+            return
+        if self.drop:
+            self.drop -= 1
+            return
+        self._in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        asyncio.get_running_loop().call_later(self.delay, self._acknowledge, bytearray(data))
+
+    def _acknowledge(self, data):
+        self._in_flight -= 1
+        self.notifying[BedCharacteristic.ACK_CMD_ACK.value](None, data)
+
+
+class FakeController:
+
+    def __init__(self, client):
+        self.client = client
+
+    async def connect(self, bed):
+        return self.client
+
+    def _touch(self, bed):
+        pass
+
+
+class TestSutaBleAckChannel(unittest.IsolatedAsyncioTestCase):
+    """Tests for `SutaBleAckChannel`."""
+
+    def make_bed(self, client, **kwargs):
+        bed = BleSutaBed(BLEDevice("AA:BB:CC:DD:EE:01", "bed", None), FakeController(client))
+        bed.acks = SutaBleAckChannel(bed, **kwargs)
+        return bed
+
+    async def test_acknowledged(self):
+        client = FakeClient()
+        bed = self.make_bed(client)
+
+        round_trip = await bed.send_acknowledged(BedCommands.FLAT)
+
+        self.assertGreaterEqual(round_trip, 0)
+        self.assertEqual(client.written, [(BedCharacteristic.ACK_CMD_CMD.value, BedCommands.FLAT)])
+        self.assertEqual(bed.acks.acknowledged, 1)
+        self.assertEqual(bed.acks.in_flight(), 0)
+
+    async def test_window_is_pipelined_and_bounded(self):
+        client = FakeClient(delay=0.02)
+        bed = self.make_bed(client, window=3)
+
+        commands = [BedCommands.HEAD_UP] * 4 + [BedCommands.FEET_UP] * 4
+        await asyncio.gather(*(bed.send_acknowledged(command) for command in commands))
+
+        self.assertEqual(client.max_in_flight, 3)
+        self.assertEqual(bed.acks.acknowledged, 8)
+        self.assertEqual(bed.acks.unmatched, 0)
+
+    async def test_lost_frame_is_retransmitted(self):
+        client = FakeClient(drop=1)
+        bed = self.make_bed(client, timeout=0.01)
+
+        await bed.send_acknowledged(BedCommands.LOUNGE)
+
+        self.assertEqual(len(client.written), 2)
+        self.assertEqual(bed.acks.retransmits, 1)
+
+    async def test_gives_up(self):
+        client = FakeClient(drop=10)
+        bed = self.make_bed(client, timeout=0.01, max_retries=2)
+
+        with self.assertRaises(AckTimeoutError):
+            await bed.send_acknowledged(BedCommands.LOUNGE)
+
+        self.assertEqual(len(client.written), 3)
+        self.assertEqual(bed.acks.lost, 1)
+        self.assertEqual(bed.acks.in_flight(), 0)
+
+    async def test_stray_acknowledgement(self):
+        client = FakeClient()
+        bed = self.make_bed(client)
+        await bed.send_acknowledged(BedCommands.FLAT)
+
+        client._acknowledge(bytearray(b'\x6e\x01\x00\x31\xa0'))
+
+        self.assertEqual(bed.acks.unmatched, 1)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_bed_controller`."""
+
+
+import unittest
+from unittest import mock
+import warnings
+
+from bleak import BleakError
+from bleak.backends.device import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+
+from suta_ble_bed.suta_ble_bed_controller import SutaBleBedController
+from suta_ble_bed.suta_ble_consts import BED_LOCAL_NAME, IS_LINUX
+
+ESTABLISH_CONNECTION = "suta_ble_bed.suta_ble_bed_controller.establish_connection"
+
+
+class FakeClient:
+
+    def __init__(self, device):
+        self.device = device
+        self.is_connected = True
+
+    async def disconnect(self):
+        self.is_connected = False
+
+
+async def fake_establish_connection(client_class, device, **kwargs):
+    return FakeClient(device)
+
+
+class FakeScanner:
+
+    def __init__(self, detection_callback, bluez=None, **kwargs):
+        self.adapter = (bluez or {}).get("adapter")
+
+    async def start(self):
+        if self.adapter == "hci1":
+            raise BleakError("adapter is unplugged")
+
+    async def stop(self):
+        pass
+
+
+def advertise(controller, index, adapter, rssi):
+    address = f"AA:BB:CC:DD:EE:{index:02X}"
+    device = BLEDevice(address, BED_LOCAL_NAME, {"path": f"/org/bluez/{adapter}/dev_{address.replace(':', '_')}"})
+    controller._bed_scanner._scanner_discovery_callback(
+        device, AdvertisementData(BED_LOCAL_NAME, {}, {}, [], None, rssi, ()), adapter)
+    return controller.devices().get(address)
+
+
+class TestMultipleAdapters(unittest.IsolatedAsyncioTestCase):
+    """Tests for spreading beds over several adapters."""
+
+    def setUp(self):
+        self.controller = SutaBleBedController(adapters=["hci0", "hci1"], max_connections=1, idle_timeout=None)
+        self.controller._scanner_running = True
+
+    async def test_one_registry_entry_across_adapters(self):
+        advertise(self.controller, 1, "hci0", -80)
+        bed = advertise(self.controller, 1, "hci1", -50)
+
+        self.assertEqual(len(self.controller.devices()), 1)
+        self.assertEqual(set(bed._sightings), {"hci0", "hci1"})
+
+    async def test_connects_through_loudest_adapter(self):
+        advertise(self.controller, 1, "hci0", -80)
+        bed = advertise(self.controller, 1, "hci1", -50)
+
+        with mock.patch(ESTABLISH_CONNECTION, fake_establish_connection):
+            client = await self.controller.connect(bed)
+
+        self.assertEqual(bed.adapter, "hci1")
+        self.assertIn("/hci1/", client.device.details["path"])
+
+    async def test_spills_over_to_free_adapter(self):
+        first = advertise(self.controller, 1, "hci1", -50)
+        advertise(self.controller, 2, "hci0", -90)
+        second = advertise(self.controller, 2, "hci1", -40)
+
+        with mock.patch(ESTABLISH_CONNECTION, fake_establish_connection):
+            first._client = await self.controller.connect(first)
+            second._client = await self.controller.connect(second)
+
+        self.assertEqual(first.adapter, "hci1")
+        self.assertEqual(second.adapter, "hci0")
+        self.assertTrue(first.is_connected())
+
+    async def test_fails_over_to_other_adapter(self):
+        advertise(self.controller, 1, "hci0", -80)
+        bed = advertise(self.controller, 1, "hci1", -50)
+
+        async def flaky(client_class, device, **kwargs):
+            if "/hci1/" in device.details["path"]:
+                raise BleakError("adapter is wedged")
+            return FakeClient(device)
+
+        with mock.patch(ESTABLISH_CONNECTION, flaky):
+            await self.controller.connect(bed)
+
+        self.assertEqual(bed.adapter, "hci0")
+        self.assertEqual(self.controller._adapter_failures["hci1"], 1)
+        self.assertEqual(len(self.controller._pools["hci1"]), 0)
+        self.assertEqual(self.controller._pools["hci1"].in_use(), 0)
+
+    def test_each_scanner_scans_on_its_own_adapter(self):
+        self.assertEqual({adapter: scanner.adapter for adapter, scanner in SutaBleBedController(
+            adapters=["hci0", "hci1"], scanner_class=FakeScanner)._bleak_scanners.items()}, {"hci0": "hci0", "hci1": "hci1"})
+
+    @unittest.skipUnless(IS_LINUX, "Needs the BlueZ backend")
+    def test_bleak_scanners_scan_on_their_own_adapters(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning)
+            scanners = SutaBleBedController(adapters=["hci0", "hci1"])._bleak_scanners
+        # Set in each BlueZ backend, from the arguments it was given
+        self.assertEqual({adapter: scanner._backend._adapter for adapter, scanner in scanners.items()},
+                         {"hci0": "hci0", "hci1": "hci1"})
+
+    async def test_adapter_which_cannot_scan_is_not_used(self):
+        controller = SutaBleBedController(adapters=["hci0", "hci1"], scanner_class=FakeScanner)
+        async with controller:
+            self.assertEqual(controller._adapters, ["hci0"])
+            self.assertEqual(list(controller._pools), ["hci0"])
+            self.assertEqual(list(controller._adapter_failures), ["hci0"])
+            # Even a bed we have no sightings of is not tried through it
+            bed = controller.devices().adopt(BLEDevice("AA:BB:CC:DD:EE:01", BED_LOCAL_NAME, None))
+            self.assertEqual(controller._rank_adapters(bed), ["hci0"])
+
+    async def test_raises_when_every_adapter_fails(self):
+        bed = advertise(self.controller, 1, "hci0", -80)
+
+        with mock.patch(ESTABLISH_CONNECTION, side_effect=BleakError("out of range")):
+            with self.assertRaises(BleakError):
+                await self.controller.connect(bed)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.cli`."""
+
+
+import subprocess
+import sys
+import unittest
+
+# What the CLI must not import before it needs to talk to a bed. How long it takes to
+# start is left to benchmarks/run_benchmarks.py.
+HEAVY_MODULES = ("bleak", "bleak_retry_connector", "asyncio", "suta_ble_bed.suta_ble_bed")
+
+
+def run_python(*args):
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, check=True)
+
+
+class TestCliStartup(unittest.TestCase):
+    """Tests for what the CLI costs before it does anything."""
+
+    def test_bluetooth_stack_not_imported(self):
+        for entry_point in ("suta_ble_bed.cli", "suta_ble_bed.__main__"):
+            with self.subTest(entry_point=entry_point):
+                result = run_python("-c", f"import sys, {entry_point}; print(' '.join(sys.modules))")
+                modules = set(result.stdout.split())
+
+                for module in HEAVY_MODULES:
+                    self.assertNotIn(module, modules)
+
+    def test_package_still_exports_bed(self):
+        result = run_python("-c", "import suta_ble_bed; print(suta_ble_bed.BleSutaBed.__name__)")
+
+        self.assertEqual(result.stdout.strip(), "BleSutaBed")
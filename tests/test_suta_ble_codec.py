@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_codec`."""
+
+
+import unittest
+
+from suta_ble_bed import suta_ble_codec
+from suta_ble_bed.suta_ble_codec import COMMAND_FRAMES, Frame, FrameError
+from suta_ble_bed.suta_ble_consts import BedCommands
+
+
+class TestSutaBleCodec(unittest.TestCase):
+    """Tests for the frame encoder and decoder."""
+
+    def test_table_matches_known_commands(self):
+        for command in BedCommands:
+            self.assertEqual(COMMAND_FRAMES[command], command.to_bytes(5, 'big'))
+            self.assertIsInstance(COMMAND_FRAMES[command], bytes)
+
+    def test_table_is_immutable(self):
+        with self.assertRaises(TypeError):
+            COMMAND_FRAMES[BedCommands.FLAT] = b''
+
+    def test_encode_arbitrary_opcode(self):
+        self.assertEqual(suta_ble_codec.encode(0x2f), bytes.fromhex("6e01002f9e"))
+
+    def test_encode_rejects_wide_opcode(self):
+        with self.assertRaises(ValueError):
+            suta_ble_codec.encode(0x100)
+
+    def test_decode_round_trip(self):
+        frame = suta_ble_codec.decode(COMMAND_FRAMES[BedCommands.ZERO_GRAVITY])
+        self.assertEqual(frame, Frame(0x45))
+        self.assertIs(frame.command, BedCommands.ZERO_GRAVITY)
+
+    def test_decode_payload(self):
+        frame = suta_ble_codec.decode(suta_ble_codec.encode(0x80, b'\x01\x02'))
+        self.assertEqual(frame.payload, b'\x01\x02')
+        self.assertIsNone(frame.command)
+
+    def test_decode_rejects_bad_frames(self):
+        for data in (b'\x6e\x01\x00', bytes.fromhex("6f01002493"), bytes.fromhex("6e01002494")):
+            with self.assertRaises(FrameError):
+                suta_ble_codec.decode(data)
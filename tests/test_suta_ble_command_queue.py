@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_command_queue`."""
+
+
+import asyncio
+import unittest
+
+from bleak import BleakError
+from bleak.backends.device import BLEDevice
+
+from suta_ble_bed.suta_ble_command_queue import SutaBleCommandQueue
+from suta_ble_bed.suta_ble_consts import BedCommands
+
+
+class FakeBed:
+
+    def __init__(self):
+        self.device = BLEDevice("AA:BB:CC:DD:EE:01", "bed", None)
+        self.written = []
+        self.release = asyncio.Event()
+        self.fail = False
+        self.frames_per_write = 1
+
+    def _frames_per_write(self):
+        return self.frames_per_write
+
+    async def _write_command(self, command, count=1):
+        await self.release.wait()
+        if self.fail:
+            raise BleakError("write failed")
+        self.written.extend([command] * count)
+
+
+class TestSutaBleCommandQueue(unittest.IsolatedAsyncioTestCase):
+    """Tests for `SutaBleCommandQueue`."""
+
+    def setUp(self):
+        self.bed = FakeBed()
+        self.queue = SutaBleCommandQueue(self.bed)
+
+    async def test_in_order(self):
+        self.bed.release.set()
+        futures = [self.queue.submit(command) for command in (BedCommands.HEAD_UP, BedCommands.VIBRATE_FEET, BedCommands.FEET_UP)]
+
+        self.assertEqual(await asyncio.gather(*futures), [True, True, True])
+        self.assertEqual(self.bed.written, [BedCommands.HEAD_UP, BedCommands.VIBRATE_FEET, BedCommands.FEET_UP])
+
+    async def test_notches_are_merged(self):
+        futures = [self.queue.submit(BedCommands.HEAD_UP) for _ in range(10)]
+        self.assertEqual(len(self.queue), 1)
+
+        self.bed.release.set()
+
+        self.assertTrue(all(await asyncio.gather(*futures)))
+        self.assertEqual(self.bed.written, [BedCommands.HEAD_UP] * 10)
+
+    async def test_notches_are_packed(self):
+        self.bed.frames_per_write = 4
+        futures = [self.queue.submit(BedCommands.FEET_DOWN) for _ in range(10)]
+
+        self.bed.release.set()
+
+        self.assertTrue(all(await asyncio.gather(*futures)))
+        self.assertEqual(self.bed.written, [BedCommands.FEET_DOWN] * 10)
+
+    async def test_preset_replaces_pending_motion(self):
+        blocked = self.queue.submit(BedCommands.VIBRATE_HEAD)
+        await asyncio.sleep(0)
+        raised = [self.queue.submit(BedCommands.HEAD_UP) for _ in range(5)]
+        flat = self.queue.submit(BedCommands.FLAT)
+
+        self.bed.release.set()
+
+        self.assertEqual(await asyncio.gather(blocked, flat), [True, True])
+        self.assertEqual(await asyncio.gather(*raised), [False] * 5)
+        self.assertEqual(self.bed.written, [BedCommands.VIBRATE_HEAD, BedCommands.FLAT])
+
+    async def test_stop_interrupts_merged_notches(self):
+        futures = [self.queue.submit(BedCommands.FEET_DOWN) for _ in range(3)]
+        await asyncio.sleep(0)
+
+        stopping = asyncio.create_task(self.queue.stop())
+        await asyncio.sleep(0)
+        self.bed.release.set()
+        await stopping
+
+        self.assertEqual(self.bed.written, [BedCommands.FEET_DOWN])
+        self.assertEqual(await asyncio.gather(*futures), [False] * 3)
+
+    async def test_cancelled_commands_are_not_sent(self):
+        blocked = self.queue.submit(BedCommands.VIBRATE_HEAD)
+        await asyncio.sleep(0)
+        notches = [self.queue.submit(BedCommands.HEAD_UP) for _ in range(3)]
+        light = self.queue.submit(BedCommands.LIGHT)
+        notches[0].cancel()
+        light.cancel()
+        await asyncio.sleep(0)
+        self.assertEqual(len(self.queue), 1)
+
+        self.bed.release.set()
+
+        self.assertEqual(await asyncio.gather(blocked, *notches[1:]), [True] * 3)
+        self.assertEqual(self.bed.written, [BedCommands.VIBRATE_HEAD] + [BedCommands.HEAD_UP] * 2)
+
+    async def test_errors_reach_callers(self):
+        self.bed.fail = True
+        self.bed.release.set()
+
+        with self.assertRaises(BleakError):
+            await self.queue.submit(BedCommands.LIGHT)
+        # The writer carries on with later commands
+        self.bed.fail = False
+        self.assertTrue(await self.queue.submit(BedCommands.LIGHT))
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_connection_pool`."""
+
+
+import asyncio
+import unittest
+
+from bleak.backends.device import BLEDevice
+
+from suta_ble_bed.suta_ble_bed import BleSutaBed
+from suta_ble_bed.suta_ble_connection_pool import SutaBleConnectionPool
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.is_connected = True
+
+    async def disconnect(self):
+        self.is_connected = False
+
+
+def make_bed(index):
+    return BleSutaBed(BLEDevice(f"AA:BB:CC:DD:EE:{index:02X}", "bed", None), controller=None)
+
+
+class TestSutaBleConnectionPool(unittest.IsolatedAsyncioTestCase):
+    """Tests for `SutaBleConnectionPool`."""
+
+    async def connect(self, pool, bed):
+        await pool.reserve()
+        client = FakeClient()
+        pool.add(bed, client)
+        return client
+
+    async def test_evicts_least_recently_used(self):
+        pool = SutaBleConnectionPool(max_connections=2, idle_timeout=None)
+        first, second, third = make_bed(1), make_bed(2), make_bed(3)
+        first_client = await self.connect(pool, first)
+        second_client = await self.connect(pool, second)
+        pool.touch(first)
+
+        await self.connect(pool, third)
+
+        self.assertIn(first, pool)
+        self.assertNotIn(second, pool)
+        self.assertFalse(second_client.is_connected)
+        self.assertTrue(first_client.is_connected)
+        self.assertTrue(second._expected_disconnect)
+
+    async def test_busy_beds_are_not_evicted(self):
+        pool = SutaBleConnectionPool(max_connections=1, idle_timeout=None)
+        busy, waiting = make_bed(1), make_bed(2)
+        await self.connect(pool, busy)
+
+        async with busy._operation_lock:
+            task = asyncio.create_task(self.connect(pool, waiting))
+            await asyncio.sleep(0.01)
+            self.assertFalse(task.done())
+            self.assertIn(busy, pool)
+
+        # Finishing the operation is enough for the busy bed to make way
+        await asyncio.wait_for(task, 1)
+        self.assertIn(waiting, pool)
+        self.assertNotIn(busy, pool)
+
+    async def test_idle_timeout_closes_connection(self):
+        pool = SutaBleConnectionPool(max_connections=2, idle_timeout=0.01)
+        bed = make_bed(1)
+        client = await self.connect(pool, bed)
+
+        await asyncio.sleep(0.05)
+
+        self.assertNotIn(bed, pool)
+        self.assertFalse(client.is_connected)
+
+    async def test_stale_disconnect_is_ignored(self):
+        pool = SutaBleConnectionPool(max_connections=2, idle_timeout=None)
+        bed = make_bed(1)
+        await self.connect(pool, bed)
+
+        pool.discard(bed, FakeClient())
+
+        self.assertIn(bed, pool)
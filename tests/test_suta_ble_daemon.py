@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_daemon`."""
+
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+from bleak.backends.device import BLEDevice
+
+from suta_ble_bed.suta_ble_consts import BedCommands
+from suta_ble_bed.suta_ble_daemon import ALL_BEDS, DaemonError, SutaBleDaemon, send_request
+from suta_ble_bed.suta_ble_daemon_client import send_requests
+from suta_ble_bed.suta_ble_fleet import FanOutResult
+
+
+class FakeBed:
+
+    def __init__(self):
+        self.device = BLEDevice("AA:BB:CC:DD:EE:01", "bed", None)
+        self.sent = []
+        self.error = None
+
+    async def send_command(self, command):
+        if self.error is not None:
+            raise self.error
+        self.sent.append(command)
+
+
+class FakeController:
+
+    def __init__(self):
+        self.beds = {"AA:BB:CC:DD:EE:01": FakeBed()}
+
+    async def get_bed(self, address=None, timeout=None):
+        if address is None:
+            return next(iter(self.beds.values()))
+        if address not in self.beds:
+            raise asyncio.TimeoutError()
+        return self.beds[address]
+
+    async def fan_out(self, command):
+        results = []
+        for bed in self.beds.values():
+            try:
+                await bed.send_command(command)
+            except Exception as e:
+                results.append(FanOutResult(bed, False, e, 0.0))
+            else:
+                results.append(FanOutResult(bed, True, None, 0.0))
+        return results
+
+
+class TestSutaBleDaemon(unittest.IsolatedAsyncioTestCase):
+    """Tests for `SutaBleDaemon` and its client."""
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.directory.name, "bed.sock")
+        self.controller = FakeController()
+        self.daemon = SutaBleDaemon(self.controller, socket_path=self.socket_path)
+        await self.daemon.start()
+
+    async def asyncTearDown(self):
+        await self.daemon.close()
+        self.directory.cleanup()
+
+    async def test_sends_command(self):
+        await send_request(BedCommands.HEAD_UP, socket_path=self.socket_path)
+        await send_request(BedCommands.FLAT, "AA:BB:CC:DD:EE:01", socket_path=self.socket_path)
+
+        self.assertEqual(self.controller.beds["AA:BB:CC:DD:EE:01"].sent, [BedCommands.HEAD_UP, BedCommands.FLAT])
+
+    async def test_all_beds(self):
+        await send_request(BedCommands.LOUNGE, ALL_BEDS, socket_path=self.socket_path)
+
+        self.assertEqual(self.controller.beds["AA:BB:CC:DD:EE:01"].sent, [BedCommands.LOUNGE])
+
+    async def test_unknown_bed(self):
+        with self.assertRaisesRegex(DaemonError, "not found"):
+            await send_request(BedCommands.FLAT, "AA:BB:CC:DD:EE:02", socket_path=self.socket_path)
+
+    async def test_pipelined_requests(self):
+        reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        writer.write(b"head-up\nbogus\nfeet-up\n")
+        replies = [await reader.readline() for _ in range(3)]
+        writer.close()
+
+        self.assertEqual(replies[0], b"OK\n")
+        self.assertTrue(replies[1].startswith(b"ERR bad request"))
+        self.assertEqual(replies[2], b"OK\n")
+
+    async def test_multi_line_errors_take_one_line(self):
+        self.controller.beds["AA:BB:CC:DD:EE:01"].error = RuntimeError("the bed said\nno")
+
+        reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        writer.write(b"flat\nflat *\n")
+        replies = [await reader.readline() for _ in range(2)]
+        self.controller.beds["AA:BB:CC:DD:EE:01"].error = None
+        writer.write(b"flat\n")
+        replies.append(await reader.readline())
+        writer.close()
+
+        self.assertEqual(replies, [
+            b"ERR the bed said no\n",
+            b"ERR 1 of 1 beds failed: AA:BB:CC:DD:EE:01: the bed said no\n",
+            b"OK\n",
+        ])
+
+    async def test_slow_request_does_not_hold_up_others(self):
+        slow = asyncio.Event()
+        fast_done = asyncio.Event()
+
+        async def get_bed(address=None, timeout=None):
+            if address == "AA:BB:CC:DD:EE:01":
+                await slow.wait()
+            else:
+                fast_done.set()
+            raise asyncio.TimeoutError()
+        self.controller.get_bed = get_bed
+
+        reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        writer.write(b"flat AA:BB:CC:DD:EE:01\nflat AA:BB:CC:DD:EE:02\n")
+        await asyncio.wait_for(fast_done.wait(), 1)
+        slow.set()
+        replies = [await reader.readline() for _ in range(2)]
+        writer.close()
+
+        # Still answered in the order they were asked
+        self.assertEqual(replies, [b"ERR bed AA:BB:CC:DD:EE:01 not found\n", b"ERR bed AA:BB:CC:DD:EE:02 not found\n"])
+
+    async def test_blocking_client(self):
+        errors = await asyncio.to_thread(
+            send_requests, BedCommands.FLAT, [None, "AA:BB:CC:DD:EE:02", ALL_BEDS], self.socket_path)
+
+        self.assertEqual(errors, [None, "bed AA:BB:CC:DD:EE:02 not found", None])
+        self.assertEqual(self.controller.beds["AA:BB:CC:DD:EE:01"].sent, [BedCommands.FLAT, BedCommands.FLAT])
+
+    async def test_no_daemon(self):
+        await self.daemon.close()
+        self.assertFalse(os.path.exists(self.socket_path))
+        with self.assertRaises(OSError):
+            await send_request(BedCommands.FLAT, socket_path=self.socket_path)
+
+    async def test_refuses_to_replace_running_daemon(self):
+        with self.assertRaises(RuntimeError):
+            await SutaBleDaemon(self.controller, socket_path=self.socket_path).start()
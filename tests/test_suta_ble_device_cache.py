@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_device_cache`."""
+
+
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from bleak import BleakError
+from bleak.backends.device import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+
+from suta_ble_bed.suta_ble_bed_controller import SutaBleBedController
+from suta_ble_bed.suta_ble_consts import BED_LOCAL_NAME
+from suta_ble_bed.suta_ble_device_cache import SutaBleDeviceCache
+from suta_ble_bed.suta_ble_simulator import SutaBleSimulator
+
+ADDRESS = "AA:BB:CC:DD:EE:01"
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.is_connected = True
+        self.services = []
+
+    async def disconnect(self):
+        self.is_connected = False
+
+
+class TestSutaBleDeviceCache(unittest.TestCase):
+    """Tests for `SutaBleDeviceCache`."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache", "devices.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        cache = SutaBleDeviceCache(self.path)
+        cache.remember(BLEDevice(ADDRESS.lower(), BED_LOCAL_NAME, None), adapter="hci1")
+        cache.save()
+
+        entry = SutaBleDeviceCache(self.path).get(ADDRESS)
+        self.assertEqual(entry.name, BED_LOCAL_NAME)
+        self.assertEqual(entry.adapter, "hci1")
+        self.assertIsNotNone(entry.last_seen)
+
+    def test_ble_device_path(self):
+        cache = SutaBleDeviceCache(self.path)
+        cache.remember(BLEDevice(ADDRESS, BED_LOCAL_NAME, None), adapter="hci1")
+
+        device = cache.ble_device(ADDRESS)
+        self.assertEqual(device.details["path"], "/org/bluez/hci1/dev_AA_BB_CC_DD_EE_01")
+        self.assertIsNone(cache.ble_device("AA:BB:CC:DD:EE:02"))
+
+    def test_old_beds_are_forgotten(self):
+        cache = SutaBleDeviceCache(self.path, max_age=3600)
+        cache.remember(BLEDevice(ADDRESS, BED_LOCAL_NAME, None))
+        cache.remember(BLEDevice("AA:BB:CC:DD:EE:02", BED_LOCAL_NAME, None))
+        cache.get(ADDRESS).last_seen = time.time() - 7200
+        cache.save()
+
+        self.assertEqual(len(SutaBleDeviceCache(self.path, max_age=None)), 1)
+        self.assertNotIn(ADDRESS, SutaBleDeviceCache(self.path))
+
+    def test_unreadable_cache_is_ignored(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w") as cache_file:
+            cache_file.write("{not json")
+
+        self.assertEqual(len(SutaBleDeviceCache(self.path)), 0)
+
+
+class TestDirectConnect(unittest.IsolatedAsyncioTestCase):
+    """Tests for connecting to cached beds through `SutaBleBedController`."""
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = SutaBleDeviceCache(os.path.join(self.directory.name, "devices.json"))
+        self.cache.remember(BLEDevice(ADDRESS, BED_LOCAL_NAME, None), adapter="hci0")
+        self.controller = SutaBleBedController(device_cache=self.cache, cache_save_delay=0.01)
+        self.controller._scanner_running = True
+
+    async def asyncTearDown(self):
+        self.directory.cleanup()
+
+    async def test_known_bed_needs_no_scan(self):
+        bed = await asyncio.wait_for(self.controller.get_bed(ADDRESS), 0.1)
+        self.assertIs(self.controller.devices().get(ADDRESS), bed)
+
+        with mock.patch("suta_ble_bed.suta_ble_bed_controller.establish_connection", return_value=FakeClient()) as connect:
+            await self.controller.connect(bed)
+        self.assertEqual(connect.call_count, 1)
+
+    async def test_falls_back_to_scan(self):
+        bed = await self.controller.get_bed(ADDRESS)
+        client = FakeClient()
+
+        with mock.patch(
+                "suta_ble_bed.suta_ble_bed_controller.establish_connection",
+                side_effect=[BleakError("not known to BlueZ"), client]) as connect:
+            task = asyncio.create_task(self.controller.connect(bed))
+            await asyncio.sleep(0.01)
+            self.assertFalse(task.done())
+
+            advertised = BLEDevice(ADDRESS, BED_LOCAL_NAME, {"path": "/org/bluez/hci0/dev_AA_BB_CC_DD_EE_01"})
+            self.controller.devices()._scanner_discovery_callback(advertised, AdvertisementData(
+                BED_LOCAL_NAME, {}, {}, [], None, -60, ()))
+
+            self.assertIs(await asyncio.wait_for(task, 1), client)
+        self.assertEqual(connect.call_count, 2)
+        self.assertIs(bed.device, advertised)
+
+    async def test_saved_later_off_the_loop(self):
+        bed = await self.controller.get_bed(ADDRESS)
+        with mock.patch("suta_ble_bed.suta_ble_bed_controller.establish_connection", return_value=FakeClient()):
+            await self.controller.connect(bed)
+        self.assertTrue(self.cache.dirty)
+        self.assertFalse(os.path.exists(self.cache.path))
+
+        with mock.patch.object(asyncio, "to_thread", wraps=asyncio.to_thread) as to_thread:
+            await asyncio.wait_for(self.controller._cache_save, 1)
+
+        self.assertEqual(to_thread.call_count, 1)
+        self.assertFalse(self.cache.dirty)
+        self.assertIn(ADDRESS, SutaBleDeviceCache(self.cache.path))
+
+    async def test_saved_on_exit(self):
+        simulator = SutaBleSimulator()
+        simulator.add_bed("AA:BB:CC:DD:EE:02")
+        async with simulator.controller(device_cache=self.cache, cache_save_delay=3600) as controller:
+            bed = await controller.get_bed("AA:BB:CC:DD:EE:02", timeout=1)
+            await bed.flat()
+            self.assertFalse(os.path.exists(self.cache.path))
+
+        self.assertTrue(controller._cache_save.done())
+        self.assertIn("AA:BB:CC:DD:EE:02", SutaBleDeviceCache(self.cache.path))
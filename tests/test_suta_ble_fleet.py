@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_fleet`."""
+
+
+import asyncio
+import time
+import unittest
+
+from bleak import BleakError
+from bleak.backends.device import BLEDevice
+
+from suta_ble_bed.suta_ble_consts import BedCommands
+from suta_ble_bed.suta_ble_fleet import fan_out, seen_within
+from suta_ble_bed.suta_ble_simulator import SimulatedLink, SutaBleSimulator
+
+
+class FakeController:
+
+    def _adapter_for(self, bed):
+        return bed.adapter
+
+
+class FakeBed:
+
+    # Shared by every bed, to see how many are being worked on at once
+    active = 0
+    max_active = 0
+
+    def __init__(self, index, adapter="hci0", error=None):
+        self.device = BLEDevice(f"AA:BB:CC:DD:EE:{index:02X}", "bed", None)
+        self.adapter = adapter
+        self.error = error
+        self.last_seen = time.monotonic()
+        self.sent = []
+
+    async def send_command(self, command):
+        FakeBed.active += 1
+        FakeBed.max_active = max(FakeBed.max_active, FakeBed.active)
+        try:
+            await asyncio.sleep(0.01)
+            if self.error is not None:
+                raise self.error
+            self.sent.append(command)
+            return True
+        finally:
+            FakeBed.active -= 1
+
+
+class TestFanOut(unittest.IsolatedAsyncioTestCase):
+    """Tests for `fan_out`."""
+
+    def setUp(self):
+        FakeBed.active = FakeBed.max_active = 0
+
+    async def test_results_per_bed(self):
+        beds = [FakeBed(1), FakeBed(2, error=BleakError("out of range")), FakeBed(3)]
+
+        results = await fan_out(FakeController(), BedCommands.FLAT, beds, parallelism=3)
+
+        self.assertEqual([result.bed for result in results], beds)
+        self.assertEqual([result.ok for result in results], [True, False, True])
+        self.assertIsInstance(results[1].error, BleakError)
+        self.assertTrue(all(result.elapsed > 0 for result in results))
+
+    async def test_parallelism_per_adapter(self):
+        beds = [FakeBed(index, adapter=f"hci{index % 2}") for index in range(8)]
+
+        await fan_out(FakeController(), BedCommands.FLAT, beds, parallelism=2)
+
+        self.assertEqual(FakeBed.max_active, 4)
+        self.assertTrue(all(bed.sent == [BedCommands.FLAT] for bed in beds))
+
+    async def test_timeout(self):
+        results = await fan_out(FakeController(), BedCommands.FLAT, [FakeBed(1)], parallelism=1, timeout=0.001)
+
+        self.assertIsInstance(results[0].error, asyncio.TimeoutError)
+
+    async def test_timed_out_command_is_not_sent(self):
+        simulator = SutaBleSimulator(SimulatedLink(latency=0.005))
+        simulated = simulator.add_bed("AA:BB:CC:DD:EE:01")
+        async with simulator.controller() as controller:
+            bed = await controller.get_bed(timeout=1)
+            # Keeps the queue busy for longer than the timeout
+            busy = asyncio.gather(*(bed.send_command(BedCommands.HEAD_UP) for _ in range(20)))
+
+            results = await controller.fan_out(BedCommands.THREE_BEEP1, timeout=0.05)
+            self.assertIsInstance(results[0].error, asyncio.TimeoutError)
+            await busy
+
+        self.assertNotIn(BedCommands.THREE_BEEP1, simulated.received)
+
+    def test_seen_within(self):
+        fresh, stale = FakeBed(1), FakeBed(2)
+        stale.last_seen -= 120
+
+        selector = seen_within(60)
+        self.assertTrue(selector(fresh))
+        self.assertFalse(selector(stale))
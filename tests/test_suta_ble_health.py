@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_health`."""
+
+
+import time
+import unittest
+
+from bleak import BleakError
+
+from suta_ble_bed.suta_ble_consts import BedCommands
+from suta_ble_bed.suta_ble_health import BreakerPolicy, BreakerState, CircuitOpenError
+from suta_ble_bed.suta_ble_simulator import SimulatedLink, SutaBleSimulator
+from tests.helpers import wait_until
+
+ADDRESS = "AA:BB:CC:DD:EE:01"
+OTHER = "AA:BB:CC:DD:EE:02"
+
+
+class TestSutaBleHealthMonitor(unittest.IsolatedAsyncioTestCase):
+    """Tests for `SutaBleHealthMonitor` and the controller's circuit breakers."""
+
+    def setUp(self):
+        self.simulator = SutaBleSimulator(SimulatedLink(connect_time=0.01))
+        self.bed = self.simulator.add_bed(ADDRESS)
+
+    async def fail_connects(self, bed, times):
+        for _ in range(times):
+            with self.assertRaises(BleakError):
+                await bed.flat()
+
+    async def test_fails_fast_once_open(self):
+        policy = BreakerPolicy(failure_threshold=2, open_for=60, background_probes=False)
+        async with self.simulator.controller(breaker_policy=policy) as controller:
+            bed = await controller.get_bed(timeout=1)
+            self.bed.in_range = False
+            await self.fail_connects(bed, 2)
+            self.assertIs(controller.health.state(bed), BreakerState.OPEN)
+            attempts = self.simulator.connect_attempts
+
+            started = time.perf_counter()
+            with self.assertRaises(CircuitOpenError):
+                await bed.flat()
+
+            self.assertLess(time.perf_counter() - started, 0.01)
+            self.assertEqual(self.simulator.connect_attempts, attempts)
+            self.assertFalse(controller.health.available(bed))
+            report = controller.health.report(bed)
+            self.assertEqual(report.score, 0.0)
+            self.assertEqual((report.consecutive_failures, report.connect_failures), (2, 2))
+            self.assertAlmostEqual(report.retry_in, 60, delta=1)
+
+    async def test_background_probe_closes(self):
+        policy = BreakerPolicy(failure_threshold=1, open_for=0.05)
+        async with self.simulator.controller(breaker_policy=policy) as controller:
+            transitions = []
+            controller.health.on_state_change = lambda bed, old, new: transitions.append(new)
+            bed = await controller.get_bed(timeout=1)
+            self.bed.in_range = False
+            await self.fail_connects(bed, 1)
+
+            self.bed.in_range = True
+            await wait_until(bed.is_connected)
+
+            self.assertEqual(transitions, [BreakerState.OPEN, BreakerState.HALF_OPEN, BreakerState.CLOSED])
+            await bed.flat()
+            self.assertEqual(self.bed.received, [BedCommands.FLAT])
+
+    async def test_failed_probe_backs_off(self):
+        policy = BreakerPolicy(failure_threshold=1, open_for=10, background_probes=False)
+        async with self.simulator.controller(breaker_policy=policy) as controller:
+            now = [0.0]
+            controller.health.clock = lambda: now[0]
+            bed = await controller.get_bed(timeout=1)
+            self.bed.in_range = False
+            await self.fail_connects(bed, 1)
+            self.assertEqual(controller.health.report(bed).retry_in, 10)
+
+            now[0] = 10
+            self.assertTrue(controller.health.available(bed))
+            # This one probes, and fails
+            await self.fail_connects(bed, 1)
+
+            self.assertIs(controller.health.state(bed), BreakerState.OPEN)
+            self.assertEqual(controller.health.report(bed).retry_in, 20)
+
+            controller.health.reset(bed)
+            self.assertIs(controller.health.state(bed), BreakerState.CLOSED)
+
+    async def test_fan_out_finishes_on_time(self):
+        self.simulator.link.connect_time = 0.05
+        self.simulator.add_bed(OTHER)
+        policy = BreakerPolicy(failure_threshold=1, open_for=60, background_probes=False)
+        async with self.simulator.controller(breaker_policy=policy) as controller:
+            await wait_until(lambda: len(controller.devices()) == 2)
+            down = await controller.get_bed(ADDRESS)
+            self.bed.in_range = False
+            await self.fail_connects(down, 1)
+
+            started = time.perf_counter()
+            results = {result.bed.device.address: result for result in await controller.fan_out(BedCommands.FLAT)}
+            self.assertLess(time.perf_counter() - started, 0.15)
+            self.assertIsInstance(results[ADDRESS].error, CircuitOpenError)
+            self.assertTrue(results[OTHER].ok)
+
+            results = await controller.fan_out(BedCommands.FLAT, selector=controller.health.available)
+            self.assertEqual([result.bed.device.address for result in results], [OTHER])
+
+            reports = controller.health.reports()
+            self.assertEqual([report.address for report in reports], [ADDRESS, OTHER])
+            self.assertGreater(reports[1].score, 0.9)
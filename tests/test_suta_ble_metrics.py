@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_metrics`."""
+
+
+import asyncio
+import unittest
+
+from bleak import AdvertisementData, BleakError
+from bleak.backends.device import BLEDevice
+
+from suta_ble_bed.suta_ble_bed import BleSutaBed
+from suta_ble_bed.suta_ble_consts import BED_LOCAL_NAME
+from suta_ble_bed.suta_ble_metrics import Histogram, SutaBleMetrics, SutaBleMetricsExporter
+from suta_ble_bed.suta_ble_scanner import SutaBleScanner
+
+
+def advertisement(name):
+    return AdvertisementData(name, {}, {}, [], None, -60, ())
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.is_connected = True
+        self.fail = False
+
+    async def start_notify(self, characteristic, callback):
+        pass
+
+    async def write_gatt_char(self, characteristic, data, response=None):
+        if self.fail:
+            raise BleakError("write failed")
+
+
+class FakeController:
+
+    def __init__(self, client):
+        self.client = client
+
+    async def connect(self, bed):
+        return self.client
+
+    def _touch(self, bed):
+        pass
+
+
+class TestHistogram(unittest.TestCase):
+    """Tests for `Histogram`."""
+
+    def test_quantiles(self):
+        histogram = Histogram((0.01, 0.1, 1.0))
+        for value in (0.005, 0.05, 0.05, 0.5, 5.0):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.buckets, [1, 2, 1, 1])
+        self.assertEqual(histogram.quantile(0.5), 0.1)
+        self.assertEqual(histogram.quantile(1.0), float("inf"))
+        self.assertAlmostEqual(histogram.mean, 1.121)
+
+
+class TestSutaBleMetrics(unittest.IsolatedAsyncioTestCase):
+    """Tests for `SutaBleMetrics`."""
+
+    def setUp(self):
+        self.metrics = SutaBleMetrics()
+
+    def test_same_labels_same_metric(self):
+        self.assertIs(self.metrics.counter("x_total", a="1"), self.metrics.counter("x_total", a="1"))
+        self.assertIsNot(self.metrics.counter("x_total", a="1"), self.metrics.counter("x_total", a="2"))
+        with self.assertRaises(TypeError):
+            self.metrics.histogram("x_total", a="1")
+
+    def test_scanner_counts_advertisements(self):
+        scanner = SutaBleScanner(None, metrics=self.metrics)
+        bed = BLEDevice("AA:BB:CC:DD:EE:01", BED_LOCAL_NAME, None)
+        other = BLEDevice("AA:BB:CC:DD:EE:02", "Headphones", None)
+        for device, name in ((bed, BED_LOCAL_NAME), (other, "Headphones"), (bed, BED_LOCAL_NAME)):
+            scanner._scanner_discovery_callback(device, advertisement(name))
+
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot["suta_ble_advertisements_total"][0]["value"], 3)
+        self.assertEqual(snapshot["suta_ble_bed_advertisements_total"][0]["value"], 2)
+
+    async def test_bed_writes(self):
+        client = FakeClient()
+        bed = BleSutaBed(BLEDevice("aa:bb:cc:dd:ee:01", "bed", None), FakeController(client), self.metrics)
+        await bed.flat()
+        client.fail = True
+        with self.assertRaises(BleakError):
+            await bed.flat()
+
+        snapshot = self.metrics.snapshot()
+        [latency] = snapshot["suta_ble_write_seconds"]
+        self.assertEqual(latency["labels"], {"bed": "AA:BB:CC:DD:EE:01"})
+        self.assertEqual(latency["count"], 1)
+        self.assertEqual(snapshot["suta_ble_write_errors_total"][0]["value"], 1)
+        self.assertEqual(snapshot["suta_ble_lock_wait_seconds"][0]["count"], 2)
+
+    async def test_prometheus_exporter(self):
+        self.metrics.counter("suta_ble_writes_total", "Writes", bed='A"B').inc(2)
+        self.metrics.histogram("suta_ble_write_seconds").observe(0.003)
+        exporter = SutaBleMetricsExporter(self.metrics, port=0)
+        await exporter.start()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", exporter.port)
+            writer.write(b"GET /metrics HTTP/1.0\r\n\r\n")
+            response = (await reader.read()).decode()
+            writer.close()
+        finally:
+            await exporter.close()
+
+        self.assertTrue(response.startswith("HTTP/1.0 200 OK"))
+        self.assertIn("# HELP suta_ble_writes_total Writes", response)
+        self.assertIn('suta_ble_writes_total{bed="A\\"B"} 2', response)
+        self.assertIn('suta_ble_write_seconds_bucket{le="0.0025"} 0', response)
+        self.assertIn('suta_ble_write_seconds_bucket{le="0.005"} 1', response)
+        self.assertIn('suta_ble_write_seconds_bucket{le="+Inf"} 1', response)
+        self.assertIn("suta_ble_write_seconds_count 1", response)
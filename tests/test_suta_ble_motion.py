@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_motion`."""
+
+
+import asyncio
+import unittest
+
+from bleak.backends.device import BLEDevice
+
+from suta_ble_bed.suta_ble_bed import BleSutaBed
+from suta_ble_bed.suta_ble_codec import decode
+from suta_ble_bed.suta_ble_consts import BedCommands
+from suta_ble_bed.suta_ble_motion import MotionModel, plan
+
+FAST = MotionModel(seconds_per_notch=0.001, seconds_to_flat=0.001, feedback_timeout=0.01)
+
+
+class FakeClient:
+
+    def __init__(self, echo=True):
+        self.is_connected = True
+        self.echo = echo
+        self.notify = None
+        self.written = []
+
+    async def start_notify(self, characteristic, callback):
+        self.notify = callback
+
+    async def write_gatt_char(self, characteristic, data, response=None):
+        self.written.append(decode(data).command)
+        if self.echo:
+            self.notify(None, bytearray(data))
+
+
+class FakeController:
+
+    def __init__(self, client):
+        self.client = client
+
+    async def connect(self, bed):
+        return self.client
+
+    def _touch(self, bed):
+        pass
+
+
+class TestPlan(unittest.TestCase):
+    """Tests for `plan`."""
+
+    def test_moves_both_ends_together(self):
+        self.assertEqual(plan(0, 0, 3, 1), [BedCommands.HEAD_AND_FEET_UP, BedCommands.HEAD_UP, BedCommands.HEAD_UP])
+
+    def test_opposite_directions(self):
+        self.assertEqual(plan(2, 0, 1, 1), [BedCommands.HEAD_DOWN, BedCommands.FEET_UP])
+
+    def test_flat_when_shorter(self):
+        self.assertEqual(plan(4, 3, 0, 0), [BedCommands.FLAT])
+        self.assertEqual(plan(5, 5, 1, 0), [BedCommands.FLAT, BedCommands.HEAD_UP])
+
+    def test_unknown_position_goes_flat_first(self):
+        self.assertEqual(plan(None, None, 1, 1), [BedCommands.FLAT, BedCommands.HEAD_AND_FEET_UP])
+
+    def test_already_there(self):
+        self.assertEqual(plan(2, 2, 2, 2), [])
+
+
+class TestMoveTo(unittest.IsolatedAsyncioTestCase):
+    """Tests for `BleSutaBed.move_to`."""
+
+    def make_bed(self, client):
+        bed = BleSutaBed(BLEDevice("AA:BB:CC:DD:EE:01", "bed", None), FakeController(client))
+        bed.motion_model = FAST
+        return bed
+
+    async def test_with_feedback(self):
+        client = FakeClient()
+        bed = self.make_bed(client)
+
+        self.assertTrue(await bed.move_to(head=2, feet=1))
+
+        self.assertEqual(client.written, [BedCommands.FLAT, BedCommands.HEAD_AND_FEET_UP, BedCommands.HEAD_UP])
+        self.assertEqual((bed.state.head, bed.state.feet), (2, 1))
+
+    async def test_without_feedback(self):
+        client = FakeClient(echo=False)
+        bed = self.make_bed(client)
+
+        self.assertTrue(await bed.move_to(head=1, feet=0))
+
+        self.assertEqual(client.written, [BedCommands.FLAT, BedCommands.HEAD_UP])
+
+    async def test_tolerance(self):
+        client = FakeClient()
+        bed = self.make_bed(client)
+        await bed.move_to(head=0, feet=0)
+        client.written.clear()
+
+        self.assertTrue(await bed.move_to(head=3, tolerance=1))
+
+        self.assertEqual(client.written, [BedCommands.HEAD_UP, BedCommands.HEAD_UP])
+
+    async def test_new_target_replaces_move(self):
+        client = FakeClient()
+        bed = self.make_bed(client)
+        bed.motion_model = MotionModel(seconds_per_notch=0.05, seconds_to_flat=0.001, feedback_timeout=0.01)
+        await bed.move_to(head=0, feet=0)
+
+        first = asyncio.create_task(bed.move_to(head=10))
+        await asyncio.sleep(0.01)
+        second = await bed.move_to(feet=1)
+
+        self.assertFalse(await first)
+        self.assertTrue(second)
+        self.assertEqual(bed.state.feet, 1)
+
+    async def test_unknown_position_needs_full_target(self):
+        bed = self.make_bed(FakeClient())
+
+        with self.assertRaises(ValueError):
+            await bed.move_to(head=1)
+
+
+class TestHold(unittest.IsolatedAsyncioTestCase):
+    """Tests for `SutaBleMotionStream`."""
+
+    def setUp(self):
+        self.client = FakeClient(echo=False)
+        self.bed = BleSutaBed(BLEDevice("AA:BB:CC:DD:EE:01", "bed", None), FakeController(self.client))
+
+    async def test_steady_frames(self):
+        async with self.bed.hold(BedCommands.FEET_UP, interval=0.01) as motion:
+            await asyncio.sleep(0.105)
+
+        self.assertIn(len(self.client.written), range(6, 13))
+        self.assertTrue(all(command is BedCommands.FEET_UP for command in self.client.written))
+        self.assertEqual(motion.jitter.frames, len(self.client.written))
+        self.assertLess(motion.jitter.max_lateness, 0.05)
+
+    async def test_commands_wait_for_motion(self):
+        await self.bed.start_motion(BedCommands.HEAD_UP, interval=0.01)
+        flat = asyncio.create_task(self.bed.flat())
+        await asyncio.sleep(0.03)
+        self.assertFalse(flat.done())
+
+        jitter = await self.bed.stop_motion()
+        await flat
+
+        self.assertEqual(self.client.written[-1], BedCommands.FLAT)
+        self.assertEqual(jitter.frames, len(self.client.written) - 1)
+        self.assertIsNone(await self.bed.stop_motion())
+
+    async def test_slow_writes_skip_slots(self):
+        async def slow_write(characteristic, data, response=None):
+            self.client.written.append(decode(data).command)
+            await asyncio.sleep(0.025)
+        self.client.write_gatt_char = slow_write
+
+        async with self.bed.hold(BedCommands.HEAD_DOWN, interval=0.01) as motion:
+            await asyncio.sleep(0.1)
+
+        self.assertGreater(motion.jitter.skipped, 0)
+        self.assertLessEqual(len(self.client.written), 5)
+
+    def test_only_notches_can_be_held(self):
+        with self.assertRaises(ValueError):
+            self.bed.hold(BedCommands.FLAT)
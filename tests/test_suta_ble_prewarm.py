@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_prewarm`."""
+
+
+import asyncio
+from datetime import datetime, time, timedelta
+import unittest
+
+from bleak.backends.device import BLEDevice
+
+from suta_ble_bed.suta_ble_prewarm import PrewarmPolicy, PrewarmSchedule
+from suta_ble_bed.suta_ble_simulator import SutaBleSimulator
+from tests.helpers import wait_until
+
+ADDRESS = "AA:BB:CC:DD:EE:01"
+OTHER = "AA:BB:CC:DD:EE:02"
+
+
+class TestSutaBleConnectionPrewarmer(unittest.IsolatedAsyncioTestCase):
+    """Tests for `SutaBleConnectionPrewarmer`."""
+
+    def setUp(self):
+        self.simulator = SutaBleSimulator()
+        self.simulator.add_bed(ADDRESS)
+
+    async def test_counts_hits_and_misses_without_prewarming(self):
+        async with self.simulator.controller() as controller:
+            bed = await controller.get_bed(timeout=1)
+            await bed.flat()
+            await bed.flat()
+
+            self.assertEqual((controller.prewarmer.hits, controller.prewarmer.misses), (1, 1))
+            self.assertEqual(controller.prewarmer.hit_rate, 0.5)
+            self.assertEqual(self.simulator.connect_attempts, 1)
+
+    async def test_on_discovery(self):
+        async with self.simulator.controller(prewarm_policy=PrewarmPolicy(on_discovery=True)) as controller:
+            bed = await controller.get_bed(timeout=1)
+            await wait_until(bed.is_connected)
+            await bed.flat()
+
+            self.assertEqual((controller.prewarmer.hits, controller.prewarmer.misses), (1, 0))
+
+    async def test_never_evicts(self):
+        self.simulator.add_bed(OTHER)
+        policy = PrewarmPolicy(on_discovery=True)
+        async with self.simulator.controller(prewarm_policy=policy, max_connections=1) as controller:
+            await wait_until(lambda: len(controller.devices()) == 2)
+            await wait_until(lambda: not controller.prewarmer._tasks)
+
+            self.assertEqual(sum(bed.is_connected() for bed in controller.devices().beds()), 1)
+            self.assertEqual(controller.metrics.snapshot()["suta_ble_prewarm_skipped_total"][0]["value"], 1)
+
+    async def test_schedule(self):
+        soon = (datetime.now() + timedelta(seconds=0.2)).time()
+        policy = PrewarmPolicy(schedules=(PrewarmSchedule(soon, frozenset({ADDRESS})),), lead=0.1)
+        async with self.simulator.controller(prewarm_policy=policy) as controller:
+            bed = await controller.get_bed(timeout=1)
+            await asyncio.sleep(0.02)
+            self.assertFalse(bed.is_connected())
+
+            await wait_until(bed.is_connected)
+
+    def test_learns_usage(self):
+        controller = self.simulator.controller(prewarm_policy=PrewarmPolicy(learn_usage=True, min_days=2, lead=60))
+        prewarmer = controller.prewarmer
+        bed = controller.devices().adopt(BLEDevice(ADDRESS, "bed", None))
+        evening = datetime(2026, 10, 1, 22, 5)
+        prewarmer.clock = lambda: evening
+        prewarmer.bed_used(bed)
+        self.assertEqual(prewarmer.predicted(ADDRESS), [])
+
+        evening += timedelta(days=1, minutes=2)
+        prewarmer.bed_used(bed)
+        self.assertEqual(prewarmer.predicted(ADDRESS), [time(22, 0)])
+        self.assertEqual(prewarmer.next_prewarm(evening), (datetime(2026, 10, 3, 21, 59), {ADDRESS}))
+
+        # Forgotten once it is older than history_days
+        self.assertEqual(prewarmer.predicted(OTHER), [])
+        prewarmer.clock = lambda: evening + timedelta(days=7)
+        prewarmer.bed_used(bed)
+        self.assertEqual(prewarmer.predicted(ADDRESS), [])
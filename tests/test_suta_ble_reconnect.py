@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_reconnect`."""
+
+
+import asyncio
+import unittest
+
+from bleak import BleakError
+from bleak.backends.device import BLEDevice
+
+from suta_ble_bed.suta_ble_reconnect import ReconnectPolicy, SutaBleReconnectSupervisor
+
+FAST = ReconnectPolicy(initial_delay=0.001, max_delay=0.001, max_attempts=3)
+
+
+class FakeController:
+
+    def __init__(self, free_slot=True):
+        self.free_slot = free_slot
+
+    def _has_free_slot(self, bed):
+        return self.free_slot
+
+    def _adapter_for(self, bed):
+        return "hci0"
+
+
+class FakeBed:
+
+    def __init__(self, failures=0):
+        self.device = BLEDevice("AA:BB:CC:DD:EE:01", "bed", None)
+        self.failures = failures
+        self.attempts = 0
+        self.connected = False
+
+    def is_connected(self):
+        return self.connected
+
+    async def _ensure_connection(self):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise BleakError("out of range")
+        self.connected = True
+
+
+class TestSutaBleReconnectSupervisor(unittest.IsolatedAsyncioTestCase):
+    """Tests for `SutaBleReconnectSupervisor`."""
+
+    async def run_supervisor(self, supervisor, bed):
+        supervisor.bed_disconnected(bed)
+        await asyncio.gather(*supervisor._tasks.values())
+
+    async def test_reconnects_after_failures(self):
+        supervisor = SutaBleReconnectSupervisor(FakeController(), default_policy=FAST)
+        events = []
+        supervisor.on_unavailable = lambda bed: events.append("down")
+        supervisor.on_reconnected = lambda bed, downtime, attempts: events.append(("up", attempts))
+        bed = FakeBed(failures=2)
+
+        await self.run_supervisor(supervisor, bed)
+
+        self.assertTrue(bed.is_connected())
+        self.assertEqual(events, ["down", ("up", 3)])
+
+    async def test_gives_up(self):
+        supervisor = SutaBleReconnectSupervisor(FakeController(), default_policy=FAST)
+        gave_up = []
+        supervisor.on_gave_up = lambda bed, downtime, attempts: gave_up.append(attempts)
+        bed = FakeBed(failures=10)
+
+        await self.run_supervisor(supervisor, bed)
+
+        self.assertFalse(bed.is_connected())
+        self.assertEqual(gave_up, [3])
+
+    async def test_per_bed_policy(self):
+        supervisor = SutaBleReconnectSupervisor(FakeController(), default_policy=FAST)
+        bed = FakeBed()
+        supervisor.set_policy("aa:bb:cc:dd:ee:01", ReconnectPolicy(enabled=False))
+
+        supervisor.bed_disconnected(bed)
+
+        self.assertFalse(supervisor.is_reconnecting(bed))
+
+    async def test_does_not_evict_for_background_reconnect(self):
+        supervisor = SutaBleReconnectSupervisor(FakeController(free_slot=False), default_policy=FAST)
+        bed = FakeBed()
+
+        await self.run_supervisor(supervisor, bed)
+
+        self.assertEqual(bed.attempts, 0)
+
+    def test_jitter_bounds(self):
+        policy = ReconnectPolicy(initial_delay=1, multiplier=2, max_delay=4, jitter=0.25)
+        for attempt in range(5):
+            base = min(4, 2 ** attempt)
+            self.assertTrue(base * 0.75 <= policy.delay(attempt) <= base * 1.25)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_scan_policy`."""
+
+
+import asyncio
+import unittest
+
+from bleak import BleakError
+from bleak.backends.device import BLEDevice
+
+from suta_ble_bed.suta_ble_consts import BedServices
+from suta_ble_bed.suta_ble_scan_policy import ScanFilter, ScanPolicy, scanner_kwargs
+from suta_ble_bed.suta_ble_simulator import SimulatedLink, SutaBleSimulator
+from tests.helpers import wait_until
+
+ADDRESS = "AA:BB:CC:DD:EE:01"
+FAST = ScanPolicy(startup=0.02, window=0.02, interval=0.1, missing_after=1.0)
+
+
+class TestScanFilter(unittest.IsolatedAsyncioTestCase):
+    """Tests for `ScanFilter`."""
+
+    def test_service_uuid(self):
+        self.assertEqual(scanner_kwargs(ScanFilter.SERVICE_UUID), {"service_uuids": [BedServices.CONTROL.value]})
+        self.assertEqual(scanner_kwargs(ScanFilter.NONE), {})
+
+    async def test_filtered_in_the_backend(self):
+        simulator = SutaBleSimulator()
+        simulator.add_bed(ADDRESS, service_uuids=(BedServices.CONTROL.value,))
+        simulator.add_bed("AA:BB:CC:DD:EE:02")
+        async with simulator.controller(scan_filter=ScanFilter.SERVICE_UUID) as controller:
+            simulator.advertise()
+            snapshot = controller.metrics.snapshot()
+
+        self.assertEqual([bed.device.address for bed in controller.devices().beds()], [ADDRESS])
+        self.assertEqual(snapshot["suta_ble_advertisements_total"][0]["value"], 2)
+
+
+class TestSutaBleScanDutyCycle(unittest.IsolatedAsyncioTestCase):
+    """Tests for `SutaBleScanDutyCycle`."""
+
+    def setUp(self):
+        self.simulator = SutaBleSimulator(SimulatedLink(advertisement_interval=0.005))
+        self.simulator.add_bed(ADDRESS)
+
+    async def test_backs_off_once_everything_is_found(self):
+        async with self.simulator.controller(scan_policy=FAST) as controller:
+            await controller.get_bed(timeout=1)
+            await wait_until(lambda: not controller.duty_cycle.scanning)
+            # And comes back for a short window
+            await wait_until(lambda: controller.duty_cycle.scanning)
+            await wait_until(lambda: not controller.duty_cycle.scanning)
+
+            self.assertGreaterEqual(controller.duty_cycle.windows, 1)
+
+    async def test_keeps_scanning_for_expected_bed(self):
+        policy = ScanPolicy(startup=0.01, window=1, interval=1, expected=frozenset({"AA:BB:CC:DD:EE:02"}))
+        async with self.simulator.controller(scan_policy=policy) as controller:
+            await asyncio.sleep(0.05)
+
+            self.assertTrue(controller.duty_cycle.scanning)
+            self.assertEqual(controller.duty_cycle.missing(), {"AA:BB:CC:DD:EE:02"})
+
+    async def test_backs_off_when_a_bed_never_comes_back(self):
+        gone = self.simulator.add_bed("AA:BB:CC:DD:EE:02")
+        policy = ScanPolicy(startup=0.02, window=0.02, interval=0.1, missing_after=0.02, max_missing_windows=2)
+        async with self.simulator.controller(scan_policy=policy) as controller:
+            await wait_until(lambda: len(controller.devices()) == 2)
+            gone.in_range = False
+
+            await wait_until(lambda: controller.duty_cycle.missing() == set() and not controller.duty_cycle.scanning)
+            # Beds adopted from the device cache, which have never advertised, are not waited for either
+            controller.devices().adopt(BLEDevice("AA:BB:CC:DD:EE:03", "bed", None))
+            self.assertNotIn("AA:BB:CC:DD:EE:03", controller.duty_cycle.missing())
+
+    async def test_beds_which_are_down_are_not_missing(self):
+        policy = ScanPolicy(startup=0.01, window=1, interval=1, missing_after=0)
+        async with self.simulator.controller(scan_policy=policy) as controller:
+            bed = await controller.get_bed(timeout=1)
+            bed.last_seen -= 1
+            self.assertEqual(controller.duty_cycle.missing(), {ADDRESS})
+
+            controller.health.connect_failed(bed, BleakError("out of range"))
+            controller.health.connect_failed(bed, BleakError("out of range"))
+            controller.health.connect_failed(bed, BleakError("out of range"))
+            self.assertEqual(controller.duty_cycle.missing(), set())
+
+    async def test_waiting_for_a_bed_resumes_scanning(self):
+        async with self.simulator.controller(scan_policy=FAST) as controller:
+            await controller.get_bed(timeout=1)
+            await wait_until(lambda: not controller.duty_cycle.scanning)
+
+            self.simulator.add_bed("AA:BB:CC:DD:EE:02")
+            bed = await controller.get_bed("AA:BB:CC:DD:EE:02", timeout=0.05)
+
+            self.assertEqual(bed.device.address, "AA:BB:CC:DD:EE:02")
+
+    async def test_paused_while_connecting(self):
+        self.simulator.link.connect_time = 0.05
+        async with self.simulator.controller(scan_policy=ScanPolicy(startup=10)) as controller:
+            bed = await controller.get_bed(timeout=1)
+            connecting = asyncio.create_task(bed.flat())
+            await wait_until(lambda: controller._connecting)
+            await wait_until(lambda: not controller.duty_cycle.scanning)
+
+            await connecting
+            await wait_until(lambda: controller.duty_cycle.scanning)
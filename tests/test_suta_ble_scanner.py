@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+"""Tests for the bed registry in `suta_ble_bed.suta_ble_scanner`."""
+
+
+import asyncio
+import gc
+import logging
+import os
+import time
+import tracemalloc
+import unittest
+from unittest import mock
+
+from bleak.backends.device import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+
+from suta_ble_bed.suta_ble_bed import BleSutaBed
+from suta_ble_bed.suta_ble_consts import BED_LOCAL_NAME
+from suta_ble_bed.suta_ble_scanner import DEFAULT_MAX_PENDING_DEVICES, Overflow, SutaBleScanner
+from suta_ble_bed.suta_ble_simulator import SimulatedLink, SutaBleSimulator
+
+
+FLEET_SIZE = 1000
+
+
+def address(index):
+    return f"AA:BB:CC:DD:{index >> 8:02X}:{index & 0xFF:02X}"
+
+
+def advertisement(local_name=BED_LOCAL_NAME, rssi=-60):
+    return AdvertisementData(
+        local_name=local_name,
+        manufacturer_data={},
+        service_data={},
+        service_uuids=[],
+        tx_power=None,
+        rssi=rssi,
+        platform_data=(),
+    )
+
+
+class TestSutaBleScanner(unittest.IsolatedAsyncioTestCase):
+    """Tests for `SutaBleScanner`."""
+
+    def setUp(self):
+        self.scanner = SutaBleScanner(controller=None, max_pending=2)
+
+    async def test_one_bed_per_address(self):
+        device = BLEDevice("aa:bb:cc:dd:ee:01", BED_LOCAL_NAME, None)
+        for rssi in (-70, -65, -50):
+            self.scanner._scanner_discovery_callback(device, advertisement(rssi=rssi))
+
+        self.assertEqual(len(self.scanner), 1)
+        bed = self.scanner.get("AA:BB:CC:DD:EE:01")
+        self.assertIs(await self.scanner.__anext__(), bed)
+        self.assertEqual(bed.rssi, -50)
+        self.assertTrue(self.scanner._new_devices.empty())
+
+    async def test_ignores_other_devices(self):
+        device = BLEDevice("aa:bb:cc:dd:ee:02", "Toothbrush", None)
+        self.scanner._scanner_discovery_callback(device, advertisement(local_name="Toothbrush"))
+
+        self.assertEqual(len(self.scanner), 0)
+        self.assertNotIn("aa:bb:cc:dd:ee:02", self.scanner)
+
+    async def test_known_bed_updated_without_name(self):
+        device = BLEDevice("aa:bb:cc:dd:ee:03", BED_LOCAL_NAME, None)
+        self.scanner._scanner_discovery_callback(device, advertisement())
+        first_seen = self.scanner.get(device.address).last_seen
+
+        await asyncio.sleep(0.01)
+        self.scanner._scanner_discovery_callback(device, advertisement(local_name=None, rssi=-40))
+
+        bed = self.scanner.get(device.address)
+        self.assertEqual(bed.rssi, -40)
+        self.assertGreater(bed.last_seen, first_seen)
+
+    async def test_new_device_stream_is_bounded(self):
+        for index in range(5):
+            device = BLEDevice(f"aa:bb:cc:dd:ee:1{index}", BED_LOCAL_NAME, None)
+            self.scanner._scanner_discovery_callback(device, advertisement())
+
+        self.assertEqual(len(self.scanner), 5)
+        self.assertEqual(self.scanner._new_devices.qsize(), 2)
+        # The newest announcements are the ones which survive
+        self.assertEqual((await self.scanner.__anext__()).device.address, "aa:bb:cc:dd:ee:13")
+
+    async def test_drop_newest(self):
+        scanner = SutaBleScanner(controller=None, max_pending=2, overflow=Overflow.DROP_NEWEST)
+        for index in range(5):
+            scanner._scanner_discovery_callback(BLEDevice(address(index), BED_LOCAL_NAME, None), advertisement())
+
+        self.assertEqual((await scanner.__anext__()).device.address, address(0))
+        self.assertEqual(scanner.metrics.snapshot()["suta_ble_announcements_dropped_total"][0]["value"], 3)
+
+    async def test_registry_is_bounded(self):
+        scanner = SutaBleScanner(controller=None, max_beds=100, forget_after=0)
+        used = scanner.adopt(BLEDevice(address(0), BED_LOCAL_NAME, None))
+        used._connect_lock
+        held = None
+        for index in range(1, FLEET_SIZE):
+            scanner._scanner_discovery_callback(BLEDevice(address(index), BED_LOCAL_NAME, None), advertisement())
+            if index == 1:
+                held = scanner.get(address(1))
+
+        self.assertLessEqual(len(scanner), 100)
+        self.assertIs(scanner.get(address(0)), used)
+        self.assertIsNone(scanner.get(address(1)))
+        # Forgotten, but somebody still has it, so it is the same bed when it comes back
+        scanner._scanner_discovery_callback(BLEDevice(address(1), BED_LOCAL_NAME, None), advertisement())
+        self.assertIs(scanner.get(address(1)), held)
+
+        # Handed out from the device cache, but not used yet, so it stays
+        adopted = scanner.adopt(BLEDevice(address(FLEET_SIZE + 100), BED_LOCAL_NAME, None))
+        for index in range(FLEET_SIZE + 101, FLEET_SIZE + 200):
+            scanner._scanner_discovery_callback(BLEDevice(address(index), BED_LOCAL_NAME, None), advertisement())
+        self.assertIs(scanner.get(address(FLEET_SIZE + 100)), adopted)
+
+        # Nothing is stale enough to forget, so new beds wait
+        scanner.forget_after = 3600
+        for index in range(FLEET_SIZE, FLEET_SIZE + 100):
+            scanner._scanner_discovery_callback(BLEDevice(address(index), BED_LOCAL_NAME, None), advertisement())
+        self.assertEqual(len(scanner), 100)
+        self.assertNotIn(address(FLEET_SIZE + 99), scanner)
+        self.assertGreater(scanner.metrics.snapshot()["suta_ble_beds_ignored_total"][0]["value"], 0)
+
+    async def test_full_registry_is_searched_once(self):
+        scanner = SutaBleScanner(controller=None, max_beds=FLEET_SIZE, forget_after=3600)
+        for index in range(FLEET_SIZE):
+            scanner._scanner_discovery_callback(BLEDevice(address(index), BED_LOCAL_NAME, None), advertisement())
+
+        checks = []
+        is_untouched = BleSutaBed._is_untouched
+        with mock.patch.object(BleSutaBed, "_is_untouched", lambda bed: checks.append(bed) or is_untouched(bed)):
+            for index in range(FLEET_SIZE, FLEET_SIZE * 11):
+                scanner._scanner_discovery_callback(BLEDevice(address(index), BED_LOCAL_NAME, None), advertisement())
+
+        # Nothing can go stale for another hour, so only the first new bed looked
+        self.assertEqual(len(checks), FLEET_SIZE)
+        self.assertEqual(len(scanner), FLEET_SIZE)
+        self.assertEqual(scanner.metrics.snapshot()["suta_ble_beds_ignored_total"][0]["value"], FLEET_SIZE * 10)
+
+
+class TestFleetScale(unittest.IsolatedAsyncioTestCase):
+    """Checks the memory and CPU budget documented in `suta_ble_bed.suta_ble_scanner`, with 1,000 beds."""
+
+    def setUp(self):
+        # Every announcement past the first few is dropped, which is logged
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    async def test_memory(self):
+        simulator = SutaBleSimulator(SimulatedLink(advertisement_interval=3600))
+        for index in range(FLEET_SIZE):
+            simulator.add_bed(address(index))
+        controller = simulator.controller()
+
+        gc.collect()
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        before = tracemalloc.take_snapshot()
+        async with controller:
+            # The simulated beds advertise as soon as scanning starts
+            self.assertEqual(len(controller.devices()), FLEET_SIZE)
+            gc.collect()
+            after = tracemalloc.take_snapshot()
+
+            beds = controller.devices().beds()
+            self.assertTrue(all(bed._is_untouched() for bed in beds))
+            self.assertEqual(controller.devices()._new_devices.qsize(), DEFAULT_MAX_PENDING_DEVICES)
+
+        # What the simulated Bluetooth stack allocates, like each BLEDevice, does not count
+        filters = [tracemalloc.Filter(True, "*/suta_ble_bed/*"), tracemalloc.Filter(False, "*/suta_ble_simulator.py")]
+        grown = sum(stat.size_diff for stat in after.filter_traces(filters).compare_to(before.filter_traces(filters), "filename"))
+        self.assertLess(grown / FLEET_SIZE, 1024)
+
+    async def test_cpu(self):
+        scanner = SutaBleScanner(controller=None)
+        devices = [BLEDevice(address(index), BED_LOCAL_NAME, None) for index in range(FLEET_SIZE)]
+        data = advertisement()
+
+        started = time.process_time()
+        for device in devices:
+            scanner._scanner_discovery_callback(device, data)
+        discovery = (time.process_time() - started) / FLEET_SIZE
+
+        rounds = 10
+        started = time.process_time()
+        for _ in range(rounds):
+            for device in devices:
+                scanner._scanner_discovery_callback(device, data)
+        update = (time.process_time() - started) / (FLEET_SIZE * rounds)
+
+        self.assertEqual(len(scanner), FLEET_SIZE)
+        # A known bed only has its advertisement updated, which is far cheaper than discovering it
+        self.assertLess(update, discovery)
+        if os.environ.get("SUTA_BLE_CHECK_BUDGET"):
+            # Too dependent on the machine to check everywhere; benchmarks/run_benchmarks.py always does
+            self.assertLess(discovery, 50e-6)
+            self.assertLess(update, 5e-6)
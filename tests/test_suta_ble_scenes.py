@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_scenes` and `suta_ble_bed.suta_ble_scheduler`."""
+
+
+import asyncio
+from datetime import datetime, time
+import json
+import os
+import tempfile
+import unittest
+
+from suta_ble_bed.suta_ble_consts import BedCommands
+from suta_ble_bed.suta_ble_scenes import Scene, SceneError, SceneState, SceneStep, SutaBleSceneEngine, _plan, load_scene
+from suta_ble_bed.suta_ble_scheduler import SutaBleScheduler
+from suta_ble_bed.suta_ble_simulator import SutaBleSimulator
+from tests.helpers import wait_until
+
+ADDRESS = "AA:BB:CC:DD:EE:01"
+
+WAKE_UP_TOML = """
+name = "wake up"
+beds = ["aa:bb:cc:dd:ee:01"]
+
+[[steps]]
+command = "head-up"
+repeat = 5
+
+[[steps]]
+command = "vibrate-feet"
+after = 1
+
+[[steps]]
+command = "flat"
+at = 06:30:00
+"""
+
+
+class TestScene(unittest.TestCase):
+    """Tests for loading and planning scenes."""
+
+    def test_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            toml_path = os.path.join(directory, "wake.toml")
+            with open(toml_path, "w") as file:
+                file.write(WAKE_UP_TOML)
+            json_path = os.path.join(directory, "wake.json")
+            with open(json_path, "w") as file:
+                json.dump({
+                    "name": "wake up",
+                    "beds": ["aa:bb:cc:dd:ee:01"],
+                    "steps": [
+                        {"command": "head-up", "repeat": 5},
+                        {"command": "vibrate-feet", "after": 1},
+                        {"command": "flat", "at": "06:30"},
+                    ],
+                }, file)
+
+            scene = load_scene(toml_path)
+            self.assertEqual(load_scene(json_path), scene)
+
+        self.assertEqual(scene.beds, (ADDRESS,))
+        self.assertEqual(scene.steps, (
+            SceneStep(BedCommands.HEAD_UP, repeat=5),
+            SceneStep(BedCommands.VIBRATE_FEET, after=1),
+            SceneStep(BedCommands.FLAT, at=time(6, 30)),
+        ))
+
+    def test_invalid(self):
+        for data in (
+            {},
+            {"steps": [{"command": "fly"}]},
+            {"steps": [{"command": "flat", "at": "06:30", "after": 1}]},
+            {"steps": [{"command": "flat", "after": -1}]},
+            {"steps": [{"command": "flat", "when": 1}]},
+        ):
+            with self.assertRaises(SceneError):
+                Scene.from_dict(data)
+
+    def test_plan(self):
+        scene = Scene("night", (
+            SceneStep(BedCommands.VIBRATE_FEET),
+            SceneStep(BedCommands.VIBRATE_FEET, after=600),
+            SceneStep(BedCommands.HEAD_UP, repeat=3, every=0.5, after=1),
+            SceneStep(BedCommands.FLAT, at=time(6, 30)),
+            SceneStep(BedCommands.HEAD_UP, after=2),
+        ))
+        plan = _plan(scene, 100.0, datetime(2026, 10, 1, 22, 0))
+
+        self.assertEqual([(step.relative, step.offset, step.count) for step in plan], [
+            (True, 0, 1),
+            (True, 600, 1),
+            (True, 601, 1),
+            (True, 601.5, 1),
+            (True, 602, 1),
+            (False, 100 + 8.5 * 3600, 1),
+            (False, 100 + 8.5 * 3600 + 2, 1),
+        ])
+
+
+class TestSutaBleScheduler(unittest.IsolatedAsyncioTestCase):
+    """Tests for `SutaBleScheduler`."""
+
+    async def test_order_and_cancel(self):
+        scheduler = SutaBleScheduler()
+        fired = []
+        now = scheduler.time()
+        scheduler.call_at(now + 0.02, lambda _: fired.append("b"))
+        scheduler.call_at(now + 0.01, lambda _: fired.append("a"))
+        scheduler.call_at(now + 0.01, lambda _: fired.append("a2"))
+        scheduler.call_at(now + 0.005, lambda _: fired.append("cancelled")).cancel()
+        self.assertEqual(len(scheduler), 3)
+
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(fired, ["a", "a2", "b"])
+        # The cancelled timer is only dropped once it comes up
+        self.assertEqual(scheduler.wakeups, 3)
+
+
+class TestSutaBleSceneEngine(unittest.IsolatedAsyncioTestCase):
+    """Tests for `SutaBleSceneEngine`."""
+
+    async def asyncSetUp(self):
+        self.simulator = SutaBleSimulator()
+        self.bed = self.simulator.add_bed(ADDRESS)
+        self.controller = self.simulator.controller()
+        await self.controller.__aenter__()
+        self.engine = SutaBleSceneEngine(self.controller)
+
+    async def asyncTearDown(self):
+        await self.engine.close()
+        await self.controller.__aexit__(None, None, None)
+
+    async def test_runs_steps_in_order(self):
+        run = self.engine.start(Scene("test", (
+            SceneStep(BedCommands.HEAD_UP, repeat=3),
+            SceneStep(BedCommands.FLAT, after=0.05),
+        ), beds=(ADDRESS,)))
+        await asyncio.wait_for(run.wait(), 1)
+
+        self.assertIs(run.state, SceneState.FINISHED)
+        self.assertEqual(self.bed.received, [BedCommands.HEAD_UP] * 3 + [BedCommands.FLAT])
+        self.assertEqual(len(run.jitter), 2)
+        self.assertLess(max(run.jitter), 0.05)
+        self.assertEqual(run.errors, [])
+        self.assertEqual(self.engine.runs(), [])
+
+    async def test_pause_and_resume(self):
+        run = self.engine.start(Scene("test", (
+            SceneStep(BedCommands.FLAT, after=0.05),
+        ), beds=(ADDRESS,)))
+        due = run.next_due()
+        run.pause()
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.bed.received, [])
+
+        run.resume()
+        self.assertAlmostEqual(run.next_due() - due, 0.1, delta=0.02)
+        await asyncio.wait_for(run.wait(), 1)
+        self.assertEqual(self.bed.received, [BedCommands.FLAT])
+
+    async def test_cancel(self):
+        run = self.engine.start(Scene("test", (
+            SceneStep(BedCommands.HEAD_UP),
+            SceneStep(BedCommands.FLAT, after=0.05),
+        ), beds=(ADDRESS,)))
+        await asyncio.sleep(0.02)
+        run.cancel()
+        await asyncio.wait_for(run.wait(), 1)
+        await asyncio.sleep(0.05)
+
+        self.assertIs(run.state, SceneState.CANCELLED)
+        self.assertEqual(self.bed.received, [BedCommands.HEAD_UP])
+
+    async def test_cancel_drops_queued_commands(self):
+        self.simulator.link.latency = 0.005
+        run = self.engine.start(Scene("test", (
+            SceneStep(BedCommands.HEAD_UP, repeat=40),
+        ), beds=(ADDRESS,)))
+        await wait_until(lambda: self.bed.received)
+        run.cancel()
+        await asyncio.wait_for(run.wait(), 1)
+        sent = len(self.bed.received)
+        await asyncio.sleep(0.05)
+
+        self.assertLess(sent, 40)
+        self.assertEqual(len(self.bed.received), sent)
+        self.assertEqual(len(self.controller.devices().get(ADDRESS)._commands), 0)
+
+    async def test_many_scenes_share_wakeups(self):
+        scene = Scene("test", tuple(SceneStep(BedCommands.HEAD_UP, after=0.01) for _ in range(5)))
+        # Without any beds, so that only the scheduling is measured
+        runs = [self.engine.start(scene, beds=[]) for _ in range(200)]
+        await asyncio.wait_for(asyncio.gather(*(run.wait() for run in runs)), 5)
+
+        # Each scene is scheduled independently, but their steps fall due together
+        self.assertLess(self.engine.scheduler.wakeups, 200)
+        self.assertTrue(all(run.state is SceneState.FINISHED for run in runs))
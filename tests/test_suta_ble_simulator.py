@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_simulator`, and for the library running against it."""
+
+
+import asyncio
+import unittest
+
+from suta_ble_bed.suta_ble_consts import BedCommands
+from suta_ble_bed.suta_ble_reconnect import ReconnectPolicy
+from suta_ble_bed.suta_ble_simulator import SimulatedLink, SutaBleSimulator
+from suta_ble_bed.suta_ble_writes import WriteMode
+
+ADDRESS = "AA:BB:CC:DD:EE:01"
+
+
+class TestSimulatedController(unittest.IsolatedAsyncioTestCase):
+    """Tests for `SutaBleBedController` with simulated beds."""
+
+    def setUp(self):
+        self.simulator = SutaBleSimulator(SimulatedLink(latency=0.001))
+        self.simulated = self.simulator.add_bed(ADDRESS)
+
+    async def test_commands_move_the_bed(self):
+        async with self.simulator.controller() as controller:
+            bed = await controller.get_bed(timeout=1)
+            await bed.zero_gravity()
+            await bed.raise_head()
+            await bed.raise_head()
+            await asyncio.sleep(0.01)
+
+        self.assertEqual((self.simulated.head, self.simulated.feet), (5, 5))
+        self.assertEqual(bed.state.last_command, BedCommands.HEAD_UP)
+
+    async def test_move_to_follows_notifications(self):
+        async with self.simulator.controller() as controller:
+            bed = await controller.get_bed(ADDRESS, timeout=1)
+            bed.motion_model = bed.motion_model.__class__(seconds_per_notch=0, seconds_to_flat=0, feedback_timeout=0.1)
+
+            self.assertTrue(await bed.move_to(head=2, feet=1))
+
+        self.assertEqual((self.simulated.head, self.simulated.feet), (2, 1))
+        self.assertEqual((bed.state.head, bed.state.feet), (2, 1))
+
+    async def test_other_devices_are_ignored(self):
+        self.simulator.add_bed("AA:BB:CC:DD:EE:02", name="Headphones")
+        async with self.simulator.controller() as controller:
+            self.simulator.advertise()
+
+            self.assertEqual([bed.device.address for bed in controller.devices().beds()], [ADDRESS])
+
+    async def test_reconnects_after_drop(self):
+        policy = ReconnectPolicy(initial_delay=0.001, jitter=0)
+        async with self.simulator.controller(reconnect_policy=policy) as controller:
+            reconnected = asyncio.Event()
+            controller.reconnector.on_reconnected = lambda *args: reconnected.set()
+            bed = await controller.get_bed(timeout=1)
+            await bed.flat()
+
+            self.simulator.disconnect(ADDRESS)
+            self.assertFalse(bed.is_connected())
+            await asyncio.wait_for(reconnected.wait(), 1)
+
+            self.assertTrue(bed.is_connected())
+
+    async def test_lossy_link_with_acknowledgements(self):
+        self.simulator.link.loss = 0.3
+        async with self.simulator.controller() as controller:
+            bed = await controller.get_bed(timeout=1)
+            bed.acks.timeout = 0.02
+            bed.acks.max_retries = 10
+            bed.set_write_mode(WriteMode.WITHOUT_RESPONSE)
+
+            for _ in range(10):
+                await bed.send_acknowledged(BedCommands.VIBRATE_HEAD)
+
+        self.assertGreater(bed.acks.retransmits, 0)
+        self.assertGreaterEqual(self.simulated.received.count(BedCommands.VIBRATE_HEAD), 10)
+
+    async def test_out_of_range(self):
+        self.simulated.in_range = False
+        async with self.simulator.controller() as controller:
+            with self.assertRaises(asyncio.TimeoutError):
+                await controller.get_bed(timeout=0.05)
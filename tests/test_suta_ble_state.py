@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_state`."""
+
+
+import asyncio
+import unittest
+
+from bleak.backends.device import BLEDevice
+
+from suta_ble_bed.suta_ble_bed import BleSutaBed
+from suta_ble_bed.suta_ble_codec import COMMAND_FRAMES, decode
+from suta_ble_bed.suta_ble_consts import BedCharacteristic, BedCommands
+from suta_ble_bed.suta_ble_state import BedState
+
+
+def report(state, command):
+    frame = COMMAND_FRAMES[command]
+    return state.apply(decode(frame), frame)
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.is_connected = True
+        self.notifying = {}
+
+    async def start_notify(self, characteristic, callback):
+        self.notifying[characteristic] = callback
+
+
+class FakeController:
+
+    def __init__(self, client):
+        self.client = client
+
+    async def connect(self, bed):
+        return self.client
+
+
+class TestBedState(unittest.TestCase):
+    """Tests for `BedState`."""
+
+    def test_position_unknown_until_flat(self):
+        state = report(BedState(), BedCommands.HEAD_UP)
+        self.assertIsNone(state.head)
+
+        state = report(state, BedCommands.FLAT)
+        state = report(state, BedCommands.HEAD_UP)
+        state = report(state, BedCommands.HEAD_AND_FEET_UP)
+        self.assertEqual((state.head, state.feet), (2, 1))
+        self.assertIs(state.last_command, BedCommands.HEAD_AND_FEET_UP)
+
+    def test_never_below_flat(self):
+        state = report(report(BedState(), BedCommands.FLAT), BedCommands.FEET_DOWN)
+        self.assertEqual(state.feet, 0)
+
+    def test_vibration_toggles(self):
+        state = report(BedState(), BedCommands.VIBRATE_FEET)
+        self.assertTrue(state.vibrate_feet)
+        self.assertFalse(report(state, BedCommands.VIBRATE_FEET).vibrate_feet)
+
+
+class TestStateSubscription(unittest.IsolatedAsyncioTestCase):
+    """Tests for following a bed's state through notifications."""
+
+    async def asyncSetUp(self):
+        self.client = FakeClient()
+        self.bed = BleSutaBed(BLEDevice("AA:BB:CC:DD:EE:01", "bed", None), FakeController(self.client))
+        await self.bed._ensure_connection()
+        self.notify = self.client.notifying[BedCharacteristic.CONTROL_READ.value]
+
+    async def test_snapshot(self):
+        self.notify(None, bytearray(COMMAND_FRAMES[BedCommands.FLAT] + COMMAND_FRAMES[BedCommands.FEET_UP]))
+
+        self.assertEqual((self.bed.state.head, self.bed.state.feet), (0, 1))
+
+    async def test_garbage_is_kept_raw(self):
+        self.notify(None, bytearray(b'\x01\x02'))
+
+        self.assertEqual(self.bed.state.raw, b'\x01\x02')
+        self.assertIsNone(self.bed.state.last_command)
+
+    async def test_latest_value_wins(self):
+        async with self.bed.state_updates() as updates:
+            self.assertEqual(await updates.__anext__(), BedState())
+
+            for command in (BedCommands.FLAT, BedCommands.HEAD_UP, BedCommands.HEAD_UP):
+                self.notify(None, bytearray(COMMAND_FRAMES[command]))
+
+            state = await asyncio.wait_for(updates.__anext__(), 1)
+            self.assertEqual(state.head, 2)
+            self.assertFalse(updates._changed.is_set())
+
+        self.assertEqual(self.bed._state_subscribers, set())
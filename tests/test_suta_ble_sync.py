@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_sync`."""
+
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import unittest
+
+from bleak import BleakError
+
+from suta_ble_bed.suta_ble_consts import BedCommands
+from suta_ble_bed.suta_ble_simulator import SutaBleSimulator
+from suta_ble_bed.suta_ble_sync import SutaBleSyncClient
+
+ADDRESS = "AA:BB:CC:DD:EE:01"
+OTHER = "AA:BB:CC:DD:EE:02"
+
+
+class TestSutaBleSyncClient(unittest.TestCase):
+    """Tests for `SutaBleSyncClient`."""
+
+    def setUp(self):
+        self.simulator = SutaBleSimulator()
+        self.bed = self.simulator.add_bed(ADDRESS)
+        self.client = SutaBleSyncClient(self.simulator.controller)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_send_command(self):
+        self.client.start()
+
+        self.assertTrue(self.client.send_command(BedCommands.FLAT, ADDRESS).result(timeout=5))
+        self.assertEqual(self.bed.received, [BedCommands.FLAT])
+        self.assertEqual(self.client.addresses().result(timeout=5), [ADDRESS])
+
+        self.client.close()
+        self.assertFalse(self.client.running)
+        self.assertFalse(self.bed.client)
+        with self.assertRaises(RuntimeError):
+            self.client.send_command(BedCommands.FLAT)
+
+    def test_many_threads_share_one_connection(self):
+        self.simulator.add_bed(OTHER)
+        self.client.start()
+        commands = [BedCommands.VIBRATE_HEAD, BedCommands.VIBRATE_FEET] * 50
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(
+                lambda command: self.client.send_command(command, ADDRESS).result(timeout=5), commands))
+
+        self.assertTrue(all(results))
+        self.assertEqual(len(self.bed.received), len(commands))
+        self.assertEqual(self.simulator.connect_attempts, 1)
+
+        fanned_out = self.client.fan_out(BedCommands.FLAT, [ADDRESS, OTHER]).result(timeout=5)
+        self.assertTrue(all(result.ok for result in fanned_out))
+
+    def test_errors_reach_the_caller(self):
+        self.client.start()
+
+        with self.assertRaises(asyncio.TimeoutError):
+            self.client.send_command(BedCommands.FLAT, OTHER, discovery_timeout=0.05).result(timeout=5)
+
+        self.bed.in_range = False
+        self.client.submit(_forget_connection, ADDRESS).result(timeout=5)
+        with self.assertRaises(BleakError):
+            self.client.send_command(BedCommands.FLAT, ADDRESS).result(timeout=5)
+
+    def test_failure_to_start(self):
+        def broken():
+            raise BleakError("No Bluetooth adapters found.")
+        client = SutaBleSyncClient(broken)
+
+        with self.assertRaises(BleakError):
+            client.start()
+        self.assertFalse(client.running)
+        self.assertEqual([thread for thread in threading.enumerate() if thread.name == "suta-ble-bed"], [])
+
+
+async def _forget_connection(controller, address):
+    bed = controller.devices().get(address)
+    bed._client = None
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+"""Tests for `suta_ble_bed.suta_ble_trace`."""
+
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+from suta_ble_bed.suta_ble_codec import COMMAND_FRAMES
+from suta_ble_bed.suta_ble_consts import BedCharacteristic, BedCommands
+from suta_ble_bed.suta_ble_simulator import SutaBleSimulator
+from suta_ble_bed.suta_ble_trace import (
+    MAGIC,
+    SutaBleTraceRecorder,
+    TraceError,
+    TraceEvent,
+    TraceKind,
+    read_trace,
+    replay_trace,
+)
+
+ADDRESS = "AA:BB:CC:DD:EE:01"
+
+
+class TestSutaBleTraceRecorder(unittest.TestCase):
+    """Tests for `SutaBleTraceRecorder` and `read_trace`."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "trace.bin")
+
+    def test_round_trip(self):
+        with SutaBleTraceRecorder(self.path, buffer_size=16) as recorder:
+            recorder.advertisement(ADDRESS, "bed", -60, "hci0")
+            recorder.advertisement(ADDRESS, None, None, None)
+            recorder.connect(ADDRESS, "hci0")
+            recorder.write(ADDRESS, BedCharacteristic.CONTROL_COMMAND.value, b"\x01\x02", False)
+            recorder.notification(ADDRESS, BedCharacteristic.CONTROL_READ.value, b"\x01\x02")
+            recorder.disconnect(ADDRESS, True)
+
+        events = [event._replace(time=0, wall_time=None) for event in read_trace(self.path)]
+
+        self.assertEqual(events, [
+            TraceEvent(0, TraceKind.SESSION),
+            TraceEvent(0, TraceKind.ADVERTISEMENT, ADDRESS, name="bed", rssi=-60, adapter="hci0"),
+            TraceEvent(0, TraceKind.ADVERTISEMENT, ADDRESS),
+            TraceEvent(0, TraceKind.CONNECT, ADDRESS, adapter="hci0"),
+            TraceEvent(0, TraceKind.WRITE, ADDRESS, characteristic=BedCharacteristic.CONTROL_COMMAND.value,
+                       data=b"\x01\x02", response=False),
+            TraceEvent(0, TraceKind.NOTIFICATION, ADDRESS, characteristic=BedCharacteristic.CONTROL_READ.value,
+                       data=b"\x01\x02"),
+            TraceEvent(0, TraceKind.DISCONNECT, ADDRESS, expected=True),
+        ])
+
+    def test_string_table_is_bounded(self):
+        addresses = [f"AA:BB:CC:DD:EE:{index:02X}" for index in range(10)]
+        with SutaBleTraceRecorder(self.path, max_strings=4) as recorder:
+            for address in addresses:
+                recorder.advertisement(address, "bed", -60, "hci0")
+                recorder.write(address, BedCharacteristic.CONTROL_COMMAND.value, b"\x01", None)
+                self.assertLessEqual(len(recorder._strings), 5)
+            self.assertGreater(recorder.string_resets, 0)
+
+        events = [event for event in read_trace(self.path) if event.kind != TraceKind.SESSION]
+        self.assertEqual([event.address for event in events], [address for address in addresses for _ in range(2)])
+        self.assertEqual({event.name for event in events[::2]}, {"bed"})
+        self.assertEqual({event.adapter for event in events[::2]}, {"hci0"})
+        self.assertEqual({event.characteristic for event in events[1::2]}, {BedCharacteristic.CONTROL_COMMAND.value})
+
+    def test_sessions_append(self):
+        for _ in range(2):
+            with SutaBleTraceRecorder(self.path) as recorder:
+                recorder.connect(ADDRESS, None)
+
+        kinds = [event.kind for event in read_trace(self.path)]
+        self.assertEqual(kinds, [TraceKind.SESSION, TraceKind.CONNECT] * 2)
+        with open(self.path, "rb") as file:
+            self.assertEqual(file.read().count(MAGIC), 1)
+
+    def test_buffered_and_truncated(self):
+        recorder = SutaBleTraceRecorder(self.path)
+        recorder.connect(ADDRESS, None)
+        self.assertEqual(os.path.getsize(self.path), 0)
+        recorder.close()
+
+        # As if the process died while writing the last record
+        with open(self.path, "ab") as file:
+            file.write(b"\x00\x01")
+        self.assertEqual(len(list(read_trace(self.path))), 2)
+
+        with open(self.path, "wb") as file:
+            file.write(b"nonsense")
+        with self.assertRaises(TraceError):
+            list(read_trace(self.path))
+
+
+class TestReplay(unittest.IsolatedAsyncioTestCase):
+    """Tests for recording a controller and replaying the trace with `replay_trace`."""
+
+    async def test_record_and_replay(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.bin")
+
+            simulator = SutaBleSimulator()
+            simulator.add_bed(ADDRESS)
+            with SutaBleTraceRecorder(path) as recorder:
+                async with simulator.controller(recorder=recorder) as controller:
+                    bed = await controller.get_bed(timeout=1)
+                    await bed.raise_head()
+                    await bed.flat()
+                    await asyncio.sleep(0.01)
+                    simulator.disconnect(ADDRESS)
+
+            events = list(read_trace(path))
+            self.assertEqual({event.kind for event in events}, set(TraceKind) - {TraceKind.STRING, TraceKind.RESET_STRINGS})
+            self.assertEqual(
+                [event.data for event in events if event.kind == TraceKind.WRITE],
+                [COMMAND_FRAMES[BedCommands.HEAD_UP], COMMAND_FRAMES[BedCommands.FLAT]])
+
+            replayed = SutaBleSimulator()
+            replayed.add_bed(ADDRESS).advertising = False
+            async with replayed.controller() as controller:
+                stats = await replay_trace(controller, path, speed=None, simulator=replayed)
+
+        self.assertEqual(replayed.beds[ADDRESS].received, [BedCommands.HEAD_UP, BedCommands.FLAT])
+        self.assertEqual((stats.writes, stats.write_errors, stats.disconnects), (2, 0, 1))
+        self.assertGreaterEqual(stats.advertisements, 1)
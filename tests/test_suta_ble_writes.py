@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+"""Tests for how `BleSutaBed` writes to CONTROL_COMMAND."""
+
+
+import unittest
+
+from bleak import BleakError
+from bleak.backends.device import BLEDevice
+
+from suta_ble_bed.suta_ble_bed import BleSutaBed
+from suta_ble_bed.suta_ble_codec import COMMAND_FRAMES
+from suta_ble_bed.suta_ble_consts import BedCommands
+from suta_ble_bed.suta_ble_writes import WriteMode
+
+
+class FakeClient:
+
+    def __init__(self, mtu_size=23, without_response=True, packing=True):
+        self.is_connected = True
+        self.mtu_size = mtu_size
+        self.without_response = without_response
+        self.packing = packing
+        self.written = []
+
+    async def start_notify(self, characteristic, callback):
+        pass
+
+    async def write_gatt_char(self, characteristic, data, response=None):
+        if response is False and not self.without_response:
+            raise BleakError("Write without response not supported")
+        if len(data) > 5 and not self.packing:
+            raise BleakError("Invalid attribute value length")
+        self.written.append((bytes(data), response))
+
+
+class FakeController:
+
+    def __init__(self, client):
+        self.client = client
+
+    async def connect(self, bed):
+        return self.client
+
+    def _touch(self, bed):
+        pass
+
+
+class TestWriteModes(unittest.IsolatedAsyncioTestCase):
+    """Tests for `BleSutaBed.set_write_mode`."""
+
+    def make_bed(self, client):
+        return BleSutaBed(BLEDevice("AA:BB:CC:DD:EE:01", "bed", None), FakeController(client))
+
+    async def test_per_command_mode(self):
+        client = FakeClient()
+        bed = self.make_bed(client)
+        bed.set_write_mode(WriteMode.WITH_RESPONSE)
+        bed.set_write_mode(WriteMode.WITHOUT_RESPONSE, [BedCommands.HEAD_UP])
+
+        await bed.raise_head()
+        await bed.flat()
+
+        self.assertEqual([response for _, response in client.written], [False, True])
+        self.assertEqual(bed.write_stats[WriteMode.WITHOUT_RESPONSE].frames, 1)
+        self.assertEqual(bed.write_stats[WriteMode.WITH_RESPONSE].frames, 1)
+
+    async def test_falls_back_when_rejected(self):
+        client = FakeClient(without_response=False)
+        bed = self.make_bed(client)
+        bed.set_write_mode(WriteMode.WITHOUT_RESPONSE)
+
+        await bed.flat()
+        await bed.lounge()
+
+        self.assertEqual([response for _, response in client.written], [None, None])
+        self.assertIs(bed.write_mode_for(BedCommands.FLAT), WriteMode.AUTO)
+        self.assertEqual(bed.write_stats[WriteMode.WITHOUT_RESPONSE].errors, 1)
+
+    async def test_packed_up_to_mtu(self):
+        client = FakeClient(mtu_size=23)
+        bed = self.make_bed(client)
+        await bed._ensure_connection()
+        bed.pack_frames = True
+
+        await bed._commands.submit(BedCommands.FEET_UP)
+        futures = [bed._commands.submit(BedCommands.HEAD_UP) for _ in range(6)]
+        for future in futures:
+            self.assertTrue(await future)
+
+        # 20 bytes of payload fit four frames
+        self.assertEqual([len(data) for data, _ in client.written], [5, 20, 10])
+        self.assertEqual(b''.join(data for data, _ in client.written[1:]), COMMAND_FRAMES[BedCommands.HEAD_UP] * 6)
+        self.assertEqual(bed.write_stats[WriteMode.AUTO].frames, 7)
+
+    async def test_unpacked_when_rejected(self):
+        client = FakeClient(packing=False)
+        bed = self.make_bed(client)
+        await bed._ensure_connection()
+        bed.pack_frames = True
+
+        await bed._write_command(BedCommands.HEAD_DOWN, 3)
+
+        self.assertEqual([data for data, _ in client.written], [COMMAND_FRAMES[BedCommands.HEAD_DOWN]] * 3)
+        self.assertEqual(bed._frames_per_write(), 1)